@@ -0,0 +1,63 @@
+import argparse
+import time
+from datetime import datetime, timezone
+
+from config.settings import settings
+from core.ohlcv_archive import OHLCVArchive
+
+def parse_date(text):
+    """'2024-01-01' o '2024-01-01T12:00' (UTC) -> milisegundos."""
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+def format_ts(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+def main():
+    parser = argparse.ArgumentParser(description="Histórico local de velas (descarga paginada y reanudable)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    download = sub.add_parser("download", help="Descarga/completa el histórico de uno o más símbolos")
+    download.add_argument("symbols", nargs="+", help="Ej: SOLUSDT BTCUSDT")
+    download.add_argument("--timeframe", default=settings.TIMEFRAME)
+    download.add_argument("--since", required=True, help="Fecha inicial UTC (2024-01-01)")
+    download.add_argument("--until", help="Fecha final UTC (por defecto: última vela cerrada)")
+
+    info = sub.add_parser("info", help="Muestra el rango guardado")
+    info.add_argument("symbols", nargs="+")
+    info.add_argument("--timeframe", default=settings.TIMEFRAME)
+
+    args = parser.parse_args()
+
+    if args.command == "info":
+        for symbol in args.symbols:
+            archive = OHLCVArchive(symbol, args.timeframe)
+            if not len(archive):
+                print(f"{archive.symbol} {args.timeframe}: vacío")
+                continue
+            print(f"{archive.symbol} {args.timeframe}: {len(archive)} velas | "
+                  f"{format_ts(archive.first_timestamp)} -> {format_ts(archive.last_timestamp)} | {archive.path}")
+        return
+
+    import ccxt
+    from core.api_connector import exchange_config
+
+    exchange = ccxt.binance(exchange_config())
+    since = parse_date(args.since)
+    until = parse_date(args.until) if args.until else None
+
+    for symbol in args.symbols:
+        archive = OHLCVArchive(symbol, args.timeframe)
+        t0 = time.perf_counter()
+
+        def progress(archive, added):
+            print(f"   {archive.symbol}: +{added} velas (hasta {format_ts(archive.last_timestamp)})", flush=True)
+
+        added = archive.download(exchange, since, until, progress=progress)
+        print(f"✅ {archive.symbol} {args.timeframe}: +{added} velas en {time.perf_counter() - t0:.1f}s "
+              f"(total {len(archive)})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import time
+
+from config.settings import settings
+from core.backtest import load_ohlcv, run_backtest, DRY_RUN_BALANCE
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest vectorizado de Strategy + reglas de salida del dry-run")
+    parser.add_argument("data", help="Archivo OHLCV (.csv o .parquet) o carpeta del archivo local (database/ohlcv/SOLUSDT/1h)")
+    parser.add_argument("--mode", default=settings.STRATEGY_MODE,
+                        choices=["AUTO", "FORCE_TREND", "FORCE_RANGE"])
+    parser.add_argument("--balance", type=float, default=DRY_RUN_BALANCE, help="Capital inicial (USDT)")
+    parser.add_argument("--fee", type=float, default=0.0, help="Comisión por lado (ej. 0.0004)")
+    parser.add_argument("--slippage-bps", type=float, default=0.0, help="Deslizamiento por ejecución en bps (ej. 2)")
+    parser.add_argument("--close-only", action="store_true",
+                        help="SL/TP solo contra el cierre (sin mechas), como el dry-run antiguo")
+    parser.add_argument("--trades", help="CSV de salida con la lista de operaciones")
+    parser.add_argument("--equity", help="CSV de salida con la curva de capital")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    arrays = load_ohlcv(args.data)
+    t1 = time.perf_counter()
+    result = run_backtest(arrays, strategy_mode=args.mode, initial_balance=args.balance, fee_rate=args.fee,
+                          slippage=args.slippage_bps / 10000.0, intrabar=not args.close_only)
+    t2 = time.perf_counter()
+
+    stats = result.stats()
+    print(f"📊 BACKTEST {args.data} | Modo: {args.mode} | Velas: {len(arrays['close'])}")
+    print(f"Operaciones: {stats['trades']} | Win rate: {stats['win_rate']*100:.1f}%")
+    print(f"PnL: {stats['total_pnl']:.4f} USDT | Balance final: {stats['final_balance']:.2f} USDT")
+    print(f"Max Drawdown: {stats['max_drawdown']*100:.2f}% | Profit Factor: {stats['profit_factor']:.2f}")
+    print(f"⏱️ Carga: {t1 - t0:.2f}s | Simulación: {t2 - t1:.2f}s")
+
+    if args.trades:
+        result.trades_frame().to_csv(args.trades, index=False)
+    if args.equity:
+        result.equity_frame().to_csv(args.equity, index=False)
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,57 @@ class Settings:
     
     # TIMEFRAME 1H: El rey del Day Trading (menos ruido, señales claras)
     TIMEFRAME = "1h" 
+
+    # Velas que mantenemos en memoria (buffer circular por símbolo/timeframe)
+    CANDLE_HISTORY = 300
+
+    # --- MULTI-TIMEFRAME (un solo feed base) ---
+    # Timeframe que se descarga/streamea. TIMEFRAME y MTF_TIMEFRAMES se arman en memoria
+    # a partir de él, sin llamadas extra a la API. Vacío = el propio TIMEFRAME.
+    BASE_TIMEFRAME = os.getenv("BASE_TIMEFRAME") or None
+    BASE_HISTORY = 1500  # Velas base en memoria al remuestrear (máximo de Binance por petición)
+    # Timeframes mayores que la estrategia ve como filtro (ej: MTF_TIMEFRAMES="4h,1d")
+    MTF_TIMEFRAMES = [tf.strip() for tf in os.getenv("MTF_TIMEFRAMES", "").split(",") if tf.strip()]
+
+    # --- MULTI-SÍMBOLO (ESCÁNER) ---
+    # Símbolos extra a vigilar además de SYMBOL. Vacío = modo un solo símbolo.
+    # Se puede definir por entorno: WATCHLIST="BTCUSDT,ETHUSDT,BNBUSDT"
+    WATCHLIST = [s.strip().upper() for s in os.getenv("WATCHLIST", "").split(",") if s.strip()]
+    # Peticiones simultáneas máximas contra Binance
+    SCAN_CONCURRENCY = 10
+    # Presupuesto de peso por minuto (Binance Futures permite 2400; dejamos margen)
+    SCAN_WEIGHT_PER_MINUTE = 1200
+
+    # --- LÍMITES DE BINANCE (core/request_scheduler.py) ---
+    # Peso IP por minuto de Binance Futures y órdenes cada 10s por cuenta
+    RATE_LIMIT_WEIGHT_PER_MINUTE = 2400
+    RATE_LIMIT_ORDERS_10S = 300
+    # Hasta qué fracción del peso puede llegar cada carril (órdenes, cuenta, datos).
+    # Las órdenes no tienen techo de peso: lo que dejan los otros carriles es su reserva.
+    RATE_LIMIT_LANE_BUDGET = (1.0, 0.85, 0.70)
+    # Hilos por carril: las órdenes nunca esperan un hilo ocupado con velas
+    RATE_LIMIT_LANE_WORKERS = (2, 2, 4)
+    # Máximo que una orden espera por un límite antes de fallar (SL/TP no pueden quedar colgados)
+    RATE_LIMIT_ORDER_MAX_WAIT = 5
+    # Pausa ante un 418 (IP baneada) si Binance no manda Retry-After
+    RATE_LIMIT_BAN_SECONDS = 120
+
+    # --- FEED EN TIEMPO REAL (WEBSOCKET) ---
+    # ON: velas y mark price por WebSocket (decisiones sub-segundo). OFF: polling cada 60s.
+    MARKET_STREAM = os.getenv("MARKET_STREAM", "ON").upper() == "ON"
+    # Para pruebas: apuntar al replay local (ws://127.0.0.1:8765)
+    MARKET_STREAM_URL = os.getenv("MARKET_STREAM_URL")
+    # Cadencia de las consultas REST que no llegan por stream (balance, posiciones)
+    REST_POLL_SECONDS = 60
+    # User-data stream (LIVE): posiciones/órdenes en memoria en vez de fetch_positions
+    USER_DATA_STREAM = os.getenv("USER_DATA_STREAM", "ON").upper() == "ON"
+    # Reconciliación por REST de la caché de posiciones (por si se perdió un evento)
+    POSITION_RECONCILE_SECONDS = 300
+    # Saldo/margen/apalancamiento en memoria (core/account_cache.py). Con el user-data
+    # stream los fills y transferencias invalidan la foto: el TTL es solo un respaldo.
+    ACCOUNT_CACHE_TTL = 300
+    # Sin stream (ej. USER_DATA_STREAM=OFF) la única defensa es el TTL: corto
+    ACCOUNT_CACHE_TTL_NO_STREAM = 20
     
     # APALANCAMIENTO
     # 4x es el punto dulce para SL de ~2%. Riesgo controlado.
@@ -16,6 +67,8 @@ class Settings:
     
     # GESTIÓN DE RIESGO CAPITAL
     RISK_PER_TRADE = 0.05   # 2% de tu cuenta por operación
+    # Tope de capital (USDT) que usa esta instancia: None = todo el saldo libre de la cuenta
+    RISK_BUDGET = float(os.getenv("RISK_BUDGET")) if os.getenv("RISK_BUDGET") else None
     MAX_DAILY_LOSS = 0.1   # Circuit Breaker al 6% de pérdida diaria
     MIN_DAILY_LOSS_USD = 2.0
     # --- GESTIÓN DINÁMICA DE ESTRATEGIAS (SOLUCIÓN "SÁBANA CORTA") ---
@@ -40,9 +93,64 @@ class Settings:
     # Dejamos 0.5% de espacio
     TRAILING_STEP = 0.005     
 
+    # --- METADATOS DE MERCADO (step, tick, mínimos) ---
+    MARKET_CACHE_PATH = "database/markets.json"
+    MARKET_CACHE_MAX_AGE = 24 * 3600      # Caché en disco válida para arrancar sin exchangeInfo
+    MARKET_REFRESH_SECONDS = 6 * 3600     # Refresco periódico del índice en vivo
+    # Arranque rápido: mercados de ccxt + desfase de reloj del último arranque
+    EXCHANGE_SNAPSHOT_PATH = "database/exchange_snapshot.json"
+    EXCHANGE_SNAPSHOT_MAX_AGE = 6 * 3600  # Más viejo que esto: load_markets completo
+    # Colchón sobre el min notional de Binance (5 USDT -> orden mínima de 6 USDT)
+    MIN_NOTIONAL_MARGIN = 1.2
+
+    # --- DRY RUN (SIMULADOR DE EXCHANGE) ---
+    DRY_RUN_BALANCE = 20.0        # Saldo virtual inicial (USDT)
+    # ON: el dry-run opera contra un exchange simulado (mismo camino de órdenes que LIVE)
+    DRY_RUN_SIMULATOR = os.getenv("DRY_RUN_SIMULATOR", "ON").upper() == "ON"
+    SIM_FEE_RATE = 0.0004         # Comisión taker de Binance Futures
+    SIM_SLIPPAGE_BPS = 2.0        # Deslizamiento fijo por ejecución a mercado (0.02%)
+    SIM_RANGE_SLIPPAGE = 0.05     # + fracción del rango (high-low) de la vela actual
+    SIM_STATE_PATH = "database/simulator.json"
+
+    # --- HISTÓRICO LOCAL DE VELAS ---
+    # Velas cerradas en disco (formato columnar): el bot arranca sin pedir el histórico a la API
+    OHLCV_ARCHIVE = os.getenv("OHLCV_ARCHIVE", "ON").upper() == "ON"
+    OHLCV_ARCHIVE_PATH = "database/ohlcv"
+
+    # --- DIARIO PERSISTENTE (SQLite) ---
+    # Fills, PnL y posiciones en disco: un reinicio recupera el PnL del día y la posición dry-run
+    JOURNAL = os.getenv("JOURNAL", "ON").upper() == "ON"
+    JOURNAL_PATH = "database/journal.db"
+    JOURNAL_FLUSH_SECONDS = 1.0   # Ventana de agrupación del escritor en segundo plano
+    JOURNAL_BATCH_SIZE = 500      # Filas máximas por transacción
+
+    # --- MÉTRICAS (latencia por etapa) ---
+    # ON: endpoint /metrics estilo Prometheus (solo localhost) y comando /perf en Telegram
+    METRICS = os.getenv("METRICS", "ON").upper() == "ON"
+    METRICS_HOST = "127.0.0.1"
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+    METRICS_WINDOW = 1024  # Últimas muestras por etapa para percentiles
+
+    # --- KERNELS COMPILADOS (numba) ---
+    # Código máquina de indicadores y reglas en disco: no se recompila en cada arranque
+    NUMBA_CACHE_DIR = os.getenv("NUMBA_CACHE_DIR", "database/numba_cache")
+
+    # --- SUPERVISOR (varias instancias, un solo feed de mercado) ---
+    SUPERVISOR_CONFIG = "config/instances.json"
+    SUPERVISOR_STATE_DIR = "database/instances"  # Diario / simulador de cada instancia
+    FEED_POLL_SECONDS = 0.05        # Sondeo de la memoria compartida en cada instancia
+    INSTANCE_RESTART_BACKOFF = 5    # Segundos antes del primer reinicio (se duplica hasta 300)
+    INSTANCE_MAX_RESTARTS = 5       # Reinicios por hora antes de dejar la instancia apagada
+
     # --- ALERTAS ---
     ALERT_PROXIMITY_PCT = 0.003 
 
+    # === ESTRATEGIA (registro de core/strategy.py) ===
+    # "trend_range": Tendencia (EMA) / Rango (RSI) con histéresis de ADX (STRATEGY_MODE abajo)
+    STRATEGY = os.getenv("STRATEGY", "trend_range")
+    # Módulos extra que registran estrategias con @register_strategy (ej: STRATEGY_PLUGINS="strategies.breakout")
+    STRATEGY_PLUGINS = [m.strip() for m in os.getenv("STRATEGY_PLUGINS", "").split(",") if m.strip()]
+
     # === SELECTOR DE ESTRATEGIA MAESTRA ===
     # Opciones disponibles:
     # "AUTO"        -> Usa el ADX para cambiar entre Rango y Tendencia (Tu modo híbrido actual).
@@ -69,6 +177,13 @@ class Settings:
     RSI_LONG_THRESHOLD = 35  
     RSI_SHORT_THRESHOLD = 65 
 
+    # --- NOTIFICACIONES (Cola de Telegram) ---
+    TELEGRAM_QUEUE_SIZE = 200        # Mensajes máximos en memoria
+    TELEGRAM_DROP_POLICY = "oldest"  # Con la cola llena: "oldest" descarta el más viejo, "newest" el nuevo
+    TELEGRAM_COALESCE_SECONDS = 0.5  # Ventana para agrupar ráfagas en un solo mensaje
+    TELEGRAM_MIN_INTERVAL = 1.0      # Segundos mínimos entre mensajes al mismo chat
+    TELEGRAM_MAX_PER_MINUTE = 20     # Límite de Telegram para grupos
+
     # --- CREDENCIALES ---
     TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
     TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
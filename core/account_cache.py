@@ -0,0 +1,126 @@
+import threading
+import time
+
+from config.settings import settings
+from core.position_cache import normalize_symbol
+from utils.metrics import metrics
+
+
+def _num(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def account_from_ccxt(balance):
+    """Pasa un fetch_balance de ccxt (Binance Futures o el simulador) a lo que usa el sizing."""
+    usdt = balance.get('USDT') or {}
+    info = balance.get('info') or {}
+    leverage = {}
+    for p in info.get('positions') or ():
+        # /fapi/v2/account trae el apalancamiento de cada símbolo (la v3 no)
+        if p.get('symbol') and p.get('leverage'):
+            leverage[normalize_symbol(p['symbol'])] = int(_num(p['leverage'], 0)) or None
+    return {
+        'free': _num(usdt.get('free')),   # Margen disponible para abrir (lo que usa el sizing)
+        'leverage': {k: v for k, v in leverage.items() if v},
+        'updated_at': time.time(),
+    }
+
+
+class AccountCache:
+    """
+    Saldo libre (margen disponible) y apalancamiento por símbolo en memoria:
+    lo que usa RiskManager para dimensionar cada entrada.
+
+    Lectura con TTL: se pide fetch_balance (peso 5, la cuenta completa) solo si
+    la foto venció o algo la invalidó. Invalidan los eventos del user-data
+    stream que mueven el saldo (fills, funding, transferencias), las órdenes
+    propias y las reconexiones del stream. Con el stream conectado cualquier
+    cambio llega como evento y el TTL es solo un respaldo (ACCOUNT_CACHE_TTL);
+    sin él manda ACCOUNT_CACHE_TTL_NO_STREAM.
+    """
+
+    def __init__(self, exchange, ttl=None, ttl_no_stream=None):
+        self.exchange = exchange
+        self.ttl = ttl if ttl is not None else settings.ACCOUNT_CACHE_TTL
+        self.ttl_no_stream = ttl_no_stream if ttl_no_stream is not None else settings.ACCOUNT_CACHE_TTL_NO_STREAM
+        self.stream = None        # UserDataStream que la mantiene (lo asigna el motor)
+        self.hits = 0
+        self.misses = 0
+
+        self._snapshot = None
+        self._fetched_at = 0.0    # monotonic
+        self._version = 0         # Sube con cada invalidación
+        self._leverage = {}       # ACCOUNT_CONFIG_UPDATE: pisa al de la foto
+        self._lock = threading.Lock()
+
+    @property
+    def max_age(self):
+        if self.stream is not None and self.stream.connected:
+            return self.ttl
+        return self.ttl_no_stream
+
+    # --- LECTURA ---
+
+    def snapshot(self, max_age=None):
+        """Foto de la cuenta (account_from_ccxt). Solo va a la API si venció o se invalidó."""
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            snapshot, fetched_at = self._snapshot, self._fetched_at
+        if snapshot is not None and time.monotonic() - fetched_at < max_age:
+            self.hits += 1
+            return snapshot
+        return self.refresh()
+
+    def free(self, max_age=None):
+        return self.snapshot(max_age)['free']
+
+    def leverage(self, symbol, default=None):
+        """Apalancamiento del símbolo (evento > foto > `default` o settings.LEVERAGE). Sin API."""
+        key = normalize_symbol(symbol)
+        with self._lock:
+            if key in self._leverage:
+                return self._leverage[key]
+            snapshot = self._snapshot
+        if snapshot is not None and key in snapshot['leverage']:
+            return snapshot['leverage'][key]
+        return default or settings.LEVERAGE
+
+    def refresh(self):
+        """Pide la cuenta por REST. Si algo la invalida durante la petición, la foto nace vencida."""
+        self.misses += 1
+        version = self._version
+        with metrics.timer("fetch_balance"):
+            snapshot = account_from_ccxt(self.exchange.fetch_balance())
+        with self._lock:
+            self._snapshot = snapshot
+            self._fetched_at = time.monotonic() if version == self._version else float('-inf')
+        return snapshot
+
+    # --- INVALIDACIÓN ---
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._fetched_at = float('-inf')
+
+    def apply_event(self, event):
+        """Eventos del user-data stream que cambian saldo, margen o apalancamiento."""
+        kind = event.get('e')
+        if kind in ('ACCOUNT_UPDATE', 'MARGIN_CALL'):
+            # Fill, funding, comisión, depósito/transferencia (event['a']['m'] dice cuál)
+            self.invalidate()
+        elif kind == 'ORDER_TRADE_UPDATE' and event.get('o', {}).get('x') == 'TRADE':
+            # El margen en uso cambia con el fill (el ACCOUNT_UPDATE puede llegar después)
+            self.invalidate()
+        elif kind == 'ACCOUNT_CONFIG_UPDATE' and 'ac' in event:
+            config = event['ac']
+            with self._lock:
+                self._leverage[normalize_symbol(config['s'])] = int(config['l'])
+
+    def stats(self):
+        with self._lock:
+            age = time.monotonic() - self._fetched_at if self._snapshot is not None else None
+        return {'hits': self.hits, 'misses': self.misses, 'age': age}
@@ -1,30 +1,84 @@
-import ccxt
+import json
+import os
+import time
+
 from config.settings import settings
+from core.request_scheduler import scheduler
 
-class BinanceConnector:
-    def __init__(self):
-        self.exchange = self._connect()
-
-    def _connect(self):
-        # Configuración estándar para Binance Futures (Live)
-        config = {
-            'apiKey': settings.API_KEY,
-            'secret': settings.SECRET_KEY,
-            'enableRateLimit': True,
-            'options': {
-                'defaultType': 'future',  # Vital para operar en derivados
-                'adjustForTimeDifference': True,
-                # Optimizaciones para inicio rápido
-                'fetchCurrencies': False,
-                'fetchMarkets': ['linear'], # Filtra solo contratos USDT-Margined
-            }
+def exchange_config():
+    # Configuración estándar para Binance Futures (Live)
+    # Compartida por el cliente síncrono y el asíncrono (escáner multi-símbolo)
+    return {
+        'apiKey': settings.API_KEY,
+        'secret': settings.SECRET_KEY,
+        'enableRateLimit': True,
+        'options': {
+            'defaultType': 'future',  # Vital para operar en derivados
+            'adjustForTimeDifference': True,
+            # Optimizaciones para inicio rápido
+            'fetchCurrencies': False,
+            'fetchMarkets': ['linear'], # Filtra solo contratos USDT-Margined
         }
+    }
+
+def load_exchange_snapshot(path, max_age):
+    """Mercados + desfase de reloj guardados en el último arranque (None si no sirve)."""
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[API] ⚠️ Snapshot del exchange inválido, se ignora: {e}")
+        return None
+
+    if not snapshot.get('markets') or time.time() - snapshot.get('saved_at', 0) > max_age:
+        return None
+    return snapshot
+
+def save_exchange_snapshot(exchange, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    snapshot = {
+        'saved_at': time.time(),
+        'time_difference': exchange.options.get('timeDifference', 0),
+        'markets': exchange.markets,
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+class BinanceConnector:
+    def __init__(self, use_snapshot=True):
+        self.snapshot_path = getattr(settings, 'EXCHANGE_SNAPSHOT_PATH', 'database/exchange_snapshot.json')
+        self.snapshot_max_age = getattr(settings, 'EXCHANGE_SNAPSHOT_MAX_AGE', 6 * 3600)
+        # True si arrancamos con mercados del disco (hay que refrescarlos en segundo plano)
+        self.from_snapshot = False
+        # Todas las llamadas REST pasan por el planificador (peso de Binance, prioridad de órdenes)
+        self.exchange = scheduler.wrap(self._connect(use_snapshot))
+
+    def _connect(self, use_snapshot=True):
+        # ccxt tarda ~0.5s en importarse: solo lo pagamos cuando hace falta
+        import ccxt
+
+        config = exchange_config()
 
         print(f"[API] 🔌 Estableciendo conexión con Binance Futures...")
 
         # Instanciamos CCXT (Por defecto conecta a URLs de producción)
         exchange = ccxt.binance(config)
-        
+
+        # Arranque rápido: mercados y desfase de reloj del último arranque
+        snapshot = load_exchange_snapshot(self.snapshot_path, self.snapshot_max_age) if use_snapshot else None
+        if snapshot:
+            exchange.set_markets(list(snapshot['markets'].values()))
+            exchange.options['timeDifference'] = snapshot.get('time_difference', 0)
+            self.from_snapshot = True
+            print(f"[API] ⚡ Mercados desde snapshot ({len(exchange.markets)} símbolos)")
+            return exchange
+
         # Validamos la conexión cargando los mercados
         # Esto lanzará un error inmediato si las claves están mal o no hay internet
         try:
@@ -34,7 +88,25 @@ class BinanceConnector:
             print(f"[API] ❌ Error crítico de conexión: {e}")
             raise e
 
+        self._save_snapshot(exchange)
         return exchange
 
+    def _save_snapshot(self, exchange):
+        try:
+            save_exchange_snapshot(exchange, self.snapshot_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[API] ⚠️ No se pudo guardar el snapshot del exchange: {e}")
+
+    def refresh(self):
+        """
+        Recarga mercados y desfase de reloj y actualiza el snapshot.
+        Se llama en segundo plano cuando arrancamos desde snapshot.
+        """
+        self.exchange.load_markets(reload=True)
+        if self.exchange.options.get('adjustForTimeDifference'):
+            self.exchange.load_time_difference()
+        self.from_snapshot = False
+        self._save_snapshot(self.exchange)
+
     def get_exchange(self):
-        return self.exchange
\ No newline at end of file
+        return self.exchange
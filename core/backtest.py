@@ -0,0 +1,230 @@
+import numpy as np
+from config.settings import settings
+from core.strategy import create_strategy, BaseStrategy, LONG
+from core.risk_manager import calculate_position_size
+from core.ohlcv_archive import OHLCVArchive
+from core.simulator import slipped_price
+from core.exits import EXIT_SL, EXIT_TP, EXIT_END, EXIT_REASONS, find_exit_intrabar
+
+OHLCV = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+# Saldo virtual del dry-run (RiskManager._get_available_balance)
+DRY_RUN_BALANCE = settings.DRY_RUN_BALANCE
+
+
+def load_ohlcv(path):
+    """
+    Carga velas desde CSV o Parquet con columnas timestamp, open, high, low, close, volume,
+    o desde una carpeta del archivo local (database/ohlcv/<SÍMBOLO>/<timeframe>).
+    El timestamp puede venir en milisegundos o como fecha (se convierte a ms UTC).
+    Retorna dict columna -> array float64 ordenado por tiempo.
+    """
+    path = str(path)
+    if OHLCVArchive.is_archive(path):
+        # memmap de solo lectura: sin copia ni parseo
+        return OHLCVArchive.from_dir(path).columns()
+
+    import pandas as pd
+
+    if path.endswith(('.parquet', '.pq')):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    missing = [c for c in OHLCV if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas en {path}: {missing}")
+
+    ts = df['timestamp']
+    if not pd.api.types.is_numeric_dtype(ts):
+        ts = (pd.to_datetime(ts, utc=True) - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)
+
+    df = df.assign(timestamp=ts).sort_values('timestamp').drop_duplicates('timestamp', keep='last')
+    return {c: df[c].to_numpy(dtype=np.float64) for c in OHLCV}
+
+
+def find_exit(close, start, side, entry, sl, tp, params=None):
+    """
+    Busca la primera vela (desde `start`) en la que se cierra la posición
+    con las reglas del dry-run: primero el trailing (mueve el SL una vez que la
+    ganancia supera TRAILING_TRIGGER), luego SL y por último TP sobre el cierre.
+    Busca por bloques crecientes para no recorrer todo el histórico por operación.
+    Retorna (índice, motivo, sl_final).
+    """
+    p = params or settings
+    n = len(close)
+    if start >= n:
+        return n - 1, EXIT_END, sl
+
+    if side == LONG:
+        target_sl = entry * (1 + p.TRAILING_STEP)
+    else:
+        target_sl = entry * (1 - p.TRAILING_STEP)
+
+    j = start
+    chunk = 256
+    while j < n:
+        end = min(n, j + chunk)
+        c = close[j:end]
+
+        if side == LONG:
+            pnl = (c - entry) / entry
+        else:
+            pnl = (entry - c) / entry
+
+        # El trailing es permanente: una vez activado se queda
+        trailed = np.logical_or.accumulate(pnl >= p.TRAILING_TRIGGER)
+        moves = (sl < target_sl) if side == LONG else (sl > target_sl)
+        eff_sl = np.where(trailed & moves, target_sl, sl)
+
+        if side == LONG:
+            hit_sl = c <= eff_sl
+            hit_tp = c >= tp
+        else:
+            hit_sl = c >= eff_sl
+            hit_tp = c <= tp
+
+        hit = hit_sl | hit_tp
+        if hit.any():
+            k = int(np.argmax(hit))
+            return j + k, (EXIT_SL if hit_sl[k] else EXIT_TP), float(eff_sl[k])
+
+        sl = float(eff_sl[-1])
+        j = end
+        chunk = min(chunk * 2, 65536)
+
+    return n - 1, EXIT_END, sl
+
+
+class BacktestResult:
+    """Lista de operaciones (columnar) + curva de capital realizada por vela."""
+
+    def __init__(self, timestamps, trades, equity, initial_balance, regimes=("DEFAULT",)):
+        self.timestamps = timestamps
+        self.trades = trades
+        self.equity = equity
+        self.initial_balance = initial_balance
+        self.regimes = regimes  # Nombre de cada régimen (trades['regime'] es el índice)
+
+    def __len__(self):
+        return len(self.trades['pnl'])
+
+    def stats(self):
+        pnl = self.trades['pnl']
+        wins = pnl[pnl > 0]
+        losses = pnl[pnl <= 0]
+
+        peak = np.maximum.accumulate(self.equity) if len(self.equity) else self.equity
+        drawdown = (self.equity - peak) / peak if len(self.equity) else np.zeros(0)
+
+        gross_loss = -losses.sum()
+        return {
+            'trades': int(len(pnl)),
+            'win_rate': float(len(wins) / len(pnl)) if len(pnl) else 0.0,
+            'total_pnl': float(pnl.sum()),
+            'final_balance': float(self.equity[-1]) if len(self.equity) else self.initial_balance,
+            'max_drawdown': float(drawdown.min()) if len(drawdown) else 0.0,
+            'profit_factor': float(wins.sum() / gross_loss) if gross_loss > 0 else float('inf') if len(wins) else 0.0,
+        }
+
+    def trades_frame(self):
+        import pandas as pd
+        t = self.trades
+        df = pd.DataFrame(t)
+        df['entry_time'] = pd.to_datetime(self.timestamps[t['entry_idx']], unit='ms', utc=True)
+        df['exit_time'] = pd.to_datetime(self.timestamps[t['exit_idx']], unit='ms', utc=True)
+        df['side'] = np.where(t['side'] == LONG, 'LONG', 'SHORT')
+        df['strategy'] = np.asarray(self.regimes)[t['regime']]
+        df['reason'] = np.asarray(EXIT_REASONS)[t['reason']]
+        return df
+
+    def equity_frame(self):
+        import pandas as pd
+        return pd.DataFrame({
+            'time': pd.to_datetime(self.timestamps, unit='ms', utc=True),
+            'equity': self.equity,
+        })
+
+
+def run_backtest(arrays, params=None, strategy_mode=None, initial_balance=DRY_RUN_BALANCE,
+                 fee_rate=0.0, indicators=None, signals=None, min_notional=None, slippage=0.0,
+                 intrabar=True, strategy=None):
+    """
+    Reproduce la estrategia + las reglas de salida del dry-run sobre el histórico.
+    Las entradas se ejecutan al cierre de la vela con señal; el tamaño sale de
+    calculate_position_size (igual que RiskManager) con el capital acumulado.
+    `strategy`: nombre en el registro o instancia (por defecto settings.STRATEGY).
+    `indicators` / `signals` (BatchSignals) permiten reutilizar lo ya calculado (optimizador).
+    `min_notional`: orden mínima del símbolo (MarketIndex); None = estándar de Binance.
+    `fee_rate` / `slippage` (fracción) siguen el mismo modelo de ejecución que el simulador.
+    `intrabar`: SL/TP/trailing sobre el recorrido open/high/low/close de cada vela
+    (las mechas cuentan); False = solo contra el cierre, como el dry-run antiguo.
+    """
+    p = params or settings
+    close = np.asarray(arrays['close'], dtype=np.float64)
+    n = len(close)
+    if intrabar:
+        open_ = np.asarray(arrays['open'], dtype=np.float64)
+        high = np.asarray(arrays['high'], dtype=np.float64)
+        low = np.asarray(arrays['low'], dtype=np.float64)
+
+    if signals is None:
+        if not isinstance(strategy, BaseStrategy):
+            strategy = create_strategy(strategy, params)
+        if indicators is None:
+            indicators = strategy.compute(arrays)
+        signals = strategy.evaluate(indicators, strategy_mode)
+    signal = signals.side
+
+    entries = np.flatnonzero(signal)
+    cols = {k: [] for k in ('entry_idx', 'exit_idx', 'side', 'regime', 'entry_price',
+                            'exit_price', 'qty', 'sl', 'tp', 'pnl', 'reason')}
+    balance = initial_balance
+
+    pos = 0
+    while pos < len(entries):
+        i = int(entries[pos])
+        side = int(signal[i])
+        regime = int(signals.regime[i])
+        sl_pct, tp_pct = float(signals.sl_pct[i]), float(signals.tp_pct[i])
+
+        size_usdt = calculate_position_size(balance, sl_pct, p, min_notional)
+        if size_usdt is None:
+            break  # Sin capital para la orden mínima: el bot ya no podría operar
+
+        entry = slipped_price('buy' if side == LONG else 'sell', close[i], slippage)
+        qty = size_usdt / entry
+        if side == LONG:
+            sl = entry * (1 - sl_pct); tp = entry * (1 + tp_pct)
+        else:
+            sl = entry * (1 + sl_pct); tp = entry * (1 - tp_pct)
+
+        if intrabar:
+            j, reason, level, _ = find_exit_intrabar(open_, high, low, close, i + 1, side, entry, sl, tp, p)
+        else:
+            j, reason, _ = find_exit(close, i + 1, side, entry, sl, tp, p)
+            level = close[j]
+        exit_price = slipped_price('sell' if side == LONG else 'buy', level, slippage)
+
+        pnl = (exit_price - entry) * qty * side - fee_rate * qty * (entry + exit_price)
+        balance += pnl
+
+        for key, value in (('entry_idx', i), ('exit_idx', j), ('side', side), ('regime', regime),
+                           ('entry_price', entry), ('exit_price', exit_price), ('qty', qty),
+                           ('sl', sl), ('tp', tp), ('pnl', pnl), ('reason', reason)):
+            cols[key].append(value)
+
+        # Siguiente señal estrictamente después de la vela de cierre
+        pos = int(np.searchsorted(entries, j, side='right'))
+
+    dtypes = {'entry_idx': np.int64, 'exit_idx': np.int64, 'side': np.int8,
+              'regime': np.int8, 'reason': np.int8}
+    trades = {k: np.asarray(v, dtype=dtypes.get(k, np.float64)) for k, v in cols.items()}
+
+    pnl_by_bar = np.zeros(n)
+    np.add.at(pnl_by_bar, trades['exit_idx'], trades['pnl'])
+    equity = initial_balance + np.cumsum(pnl_by_bar)
+
+    timestamps = np.asarray(arrays['timestamp'], dtype=np.int64)
+    return BacktestResult(timestamps, trades, equity, initial_balance, signals.regimes)
@@ -0,0 +1,185 @@
+import numpy as np
+from config.settings import settings
+
+# Mismo orden de columnas que devuelve ccxt.fetch_ohlcv
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+_TF_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'M': 2592000}
+
+def timeframe_to_ms(timeframe):
+    """Convierte '1m', '1h', '4h', '1d'... a milisegundos (igual que ccxt.parse_timeframe)."""
+    amount, unit = int(timeframe[:-1]), timeframe[-1]
+    if unit not in _TF_UNITS:
+        raise ValueError(f"Timeframe no soportado: {timeframe}")
+    return amount * _TF_UNITS[unit] * 1000
+
+
+class CandleStore:
+    """
+    Buffer circular de velas para un símbolo/timeframe, respaldado por NumPy.
+
+    Se siembra UNA vez con el histórico y luego solo pide las velas desde el
+    último timestamp guardado, reemplazando la vela que aún se está formando.
+    Cada vela se escribe dos veces (posición i e i + capacidad), así la ventana
+    ordenada siempre es un slice contiguo: las lecturas no copian memoria.
+    """
+
+    def __init__(self, symbol, timeframe, capacity=None):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+        self.capacity = int(capacity or getattr(settings, 'CANDLE_HISTORY', 300))
+
+        self._data = np.zeros((len(COLUMNS), 2 * self.capacity), dtype=np.float64)
+        self._start = 0   # Índice físico de la vela más antigua
+        self._size = 0
+
+        # Contadores monótonos para que los consumidores sepan qué cambió
+        self.total = 0      # Velas nuevas agregadas desde el inicio
+        self.revision = 0   # Cualquier cambio (vela nueva o vela viva actualizada)
+        self.generation = 0 # Se incrementa cada vez que el buffer se vacía/resiembra
+
+    def __len__(self):
+        return self._size
+
+    # --- LECTURA (Vistas sin copia) ---
+
+    def _window(self):
+        return self._data[:, self._start:self._start + self._size]
+
+    def column(self, name):
+        return self._window()[COLUMNS.index(name)]
+
+    def arrays(self):
+        """Retorna dict columna -> vista NumPy ordenada (más antigua primero)."""
+        window = self._window()
+        return {name: window[i] for i, name in enumerate(COLUMNS)}
+
+    def tail(self, n):
+        """Vista (6, n) con las últimas n velas."""
+        n = min(n, self._size)
+        end = self._start + self._size
+        return self._data[:, end - n:end]
+
+    @property
+    def last_timestamp(self):
+        if not self._size:
+            return None
+        return int(self._data[TS, self._start + self._size - 1])
+
+    @property
+    def last_close(self):
+        if not self._size:
+            return None
+        return float(self._data[CLOSE, self._start + self._size - 1])
+
+    def to_frame(self):
+        """DataFrame con copia propia de los datos (para código que lo muta)."""
+        import pandas as pd
+        return pd.DataFrame({name: col.copy() for name, col in self.arrays().items()})
+
+    # --- ESCRITURA ---
+
+    def ingest(self, bars):
+        """
+        Incorpora velas [ts, o, h, l, c, v] ordenadas por tiempo.
+        - ts == último guardado: reemplaza la vela viva.
+        - ts > último guardado: se agrega al final.
+        - ts anterior: se ignora (ya la tenemos).
+        Retorna la cantidad de velas NUEVAS agregadas.
+        """
+        if bars is None or len(bars) == 0:
+            return 0
+
+        block = np.asarray(bars, dtype=np.float64).reshape(-1, len(COLUMNS))
+        last_ts = self.last_timestamp
+
+        if last_ts is not None:
+            block = block[block[:, TS] >= last_ts]
+            if len(block) and block[0, TS] == last_ts:
+                self._write(self._start + self._size - 1, block[0])
+                block = block[1:]
+                self.revision += 1
+
+        if len(block):
+            self._append(block)
+            self.revision += 1
+
+        return len(block)
+
+    def _write(self, pos, row):
+        pos %= self.capacity
+        self._data[:, pos] = row
+        self._data[:, pos + self.capacity] = row
+
+    def _append(self, block):
+        cap = self.capacity
+        added = len(block)
+        self.total += added
+
+        if added >= cap:
+            # El bloque llena todo el buffer: reiniciamos la ventana
+            block = block[-cap:]
+            self._data[:, :cap] = block.T
+            self._data[:, cap:] = block.T
+            self._start, self._size = 0, cap
+            return
+
+        first = (self._start + self._size) % cap
+        for i in range(added):
+            self._write(first + i, block[i])
+
+        overflow = max(0, self._size + added - cap)
+        self._size += added - overflow
+        self._start = (self._start + overflow) % cap
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+        self.revision += 1
+        self.generation += 1
+
+    # --- SINCRONIZACIÓN CON EL EXCHANGE ---
+
+    def next_request(self, now_ms):
+        """
+        Parámetros (since, limit) para la próxima descarga.
+        since=None significa que hay que (re)sembrar el buffer completo.
+        """
+        last_ts = self.last_timestamp
+        if last_ts is None:
+            return None, self.capacity
+
+        # Velas transcurridas desde la última guardada (+1 por la vela viva)
+        pending = int((now_ms - last_ts) // self.timeframe_ms) + 2
+        if pending > self.capacity:
+            # Hueco más grande que el buffer: es más barato resembrar
+            return None, self.capacity
+
+        return last_ts, max(pending, 2)
+
+    def seed(self, exchange):
+        bars = exchange.fetch_ohlcv(self.symbol, self.timeframe, limit=self.capacity)
+        self.clear()
+        return self.ingest(bars)
+
+    def fetch(self, exchange):
+        """
+        Solo descarga lo pendiente, SIN tocar el buffer (se puede llamar desde otro hilo).
+        Retorna (velas, resembrar) para pasarlo a apply() en el hilo dueño del buffer.
+        """
+        since, limit = self.next_request(exchange.milliseconds())
+        if since is None:
+            return exchange.fetch_ohlcv(self.symbol, self.timeframe, limit=self.capacity), True
+        return exchange.fetch_ohlcv(self.symbol, self.timeframe, since=since, limit=limit), False
+
+    def apply(self, fetched):
+        bars, reseed = fetched
+        if reseed:
+            self.clear()
+        return self.ingest(bars)
+
+    def update(self, exchange):
+        """Descarga solo las velas pendientes y las incorpora. Retorna velas nuevas."""
+        return self.apply(self.fetch(exchange))
@@ -0,0 +1,947 @@
+import asyncio
+import os
+import sys
+import time
+
+from config.settings import settings
+from core.api_connector import BinanceConnector
+from core.candle_store import CandleStore, TS, OPEN, HIGH, LOW
+from core.request_scheduler import ORDER, ACCOUNT, DATA, scheduler
+from core.resampler import Resampler
+from core.strategy import create_strategy
+from core.risk_manager import RiskManager
+from core.account_cache import AccountCache
+from core.execution import ExecutionEngine
+from core.scanner import MarketScanner
+from core.market_stream import MarketStream
+from core.market_index import load_market_index
+from core.position_cache import PositionCache, UserDataStream, fill_from_event, normalize_symbol
+from core.journal import TradeJournal, utc_day
+from core.ohlcv_archive import OHLCVArchive
+from core.simulator import SimulatedExchange, STOP_MARKET, TAKE_PROFIT_MARKET
+from core.exits import ExitTracker, EXIT_REASONS, bar_path, tick_path
+from core.shared_state import bot_state
+from utils.telegram_bot import send_message, flush_messages
+from utils.startup_timer import StartupTimer
+from utils.metrics import metrics, start_metrics_server
+
+# Pausa tras cerrar una posición en dry-run antes de volver a entrar
+POST_CLOSE_COOLDOWN = 300
+
+
+def _publish(queue, item):
+    """Cola de 'último valor': si el consumidor va atrasado, descartamos el dato viejo."""
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(item)
+
+
+class TradingEngine:
+    """
+    Núcleo asíncrono orientado a eventos (reemplaza el while de run_bot).
+
+    Cada responsabilidad es una tarea independiente y se comunican por colas:
+
+        market_data --(precio)--> signals ----(ENTRY)----> order_manager
+                    --(precio)--> positions --(TRAIL)----^
+        todas --(texto)--> cola de Telegram (hilo propio, utils.telegram_bot)
+
+    Nada bloquea el event loop: las llamadas a ccxt corren en hilos (los del
+    carril del planificador de peticiones: las órdenes tienen hilos propios y
+    no esperan detrás de las lecturas) y las pausas son timestamps, no time.sleep().
+    """
+
+    def __init__(self, timer=None, feed=None):
+        self.timer = timer or StartupTimer()
+        # Instancia del supervisor: las velas llegan por memoria compartida (SharedFeedReader)
+        self.feed = feed
+        self.connector = None
+        self.exchange = None
+        self.markets = None
+        self.journal = None
+        # Dry-run con simulador: mismas órdenes/posiciones que LIVE contra un exchange local
+        self.sim = None
+        self.trading_exchange = None
+        self.exchange_driven = settings.IS_LIVE or settings.DRY_RUN_SIMULATOR
+        self.risk_manager = None
+        self.execution_engine = None
+
+        # Feed base: el único timeframe que se descarga/streamea. TIMEFRAME y
+        # MTF_TIMEFRAMES se arman en memoria a partir de él (Resampler)
+        base_timeframe = settings.BASE_TIMEFRAME or settings.TIMEFRAME
+        resampled = base_timeframe != settings.TIMEFRAME
+        self.base = CandleStore(settings.SYMBOL, base_timeframe,
+                                settings.BASE_HISTORY if resampled else settings.CANDLE_HISTORY)
+        self.strategy = create_strategy()
+
+        # Modo multi-símbolo: SYMBOL sigue siendo el único que opera; el resto genera alertas
+        self.scanner = None
+        self.last_scan_alerts = {}
+        if settings.WATCHLIST:
+            symbols = settings.WATCHLIST if resampled else [settings.SYMBOL] + settings.WATCHLIST
+            self.scanner = MarketScanner(symbols, settings.TIMEFRAME)
+            if not resampled:
+                self.base = self.scanner.stores[settings.SYMBOL]
+                self.strategy = self.scanner.strategies[settings.SYMBOL]
+
+        self.resampler = Resampler(self.base, [settings.TIMEFRAME] + settings.MTF_TIMEFRAMES)
+        self.candles = self.resampler[settings.TIMEFRAME]  # Serie de la estrategia
+        self.frames = {tf: self.resampler[tf] for tf in settings.MTF_TIMEFRAMES}
+
+        # Velas cerradas en disco: arranque en caliente y base para investigación
+        self.archive = None
+        if settings.OHLCV_ARCHIVE:
+            self.archive = OHLCVArchive(settings.SYMBOL, base_timeframe)
+        self._archived_total = 0
+
+        self.stream = None
+        if settings.MARKET_STREAM and self.feed is None:
+            self.stream = MarketStream([settings.SYMBOL], base_timeframe)
+
+        # LIVE: posiciones en memoria alimentadas por el user-data stream
+        self.position_cache = None
+        self.user_stream = None
+        # Saldo/margen en memoria (la crea _setup sobre el exchange con el que se opera)
+        self.account = None
+        if settings.IS_LIVE and settings.USER_DATA_STREAM:
+            self.position_cache = PositionCache()
+
+        # Estado de trading (solo lo tocan tareas del event loop: no hacen falta locks)
+        self.position_data = None
+        self.dry_run_position = None
+        self.in_position = False
+        self.active_sl_price = 0.0
+        self.active_tp_price = 0.0
+        self.tp_alert_sent = False
+        self.sl_alert_sent = False
+        self.last_regime = "INICIANDO..."
+        self.cooldown_until = 0.0
+        self.order_pending = False
+        self.trail_pending = False
+        # LIVE sin user-data stream: los fills de cierre se leen por REST desde aquí (ms)
+        self._trades_since = int(time.time() * 1000)
+        # Fills que reducen la posición hasta que quede en 0 (un cierre = un aviso)
+        self._closing = None
+        self._path_state = None  # (ts, high, low, precio) de la última lectura de la vela viva
+        # Día UTC del PnL diario y día en que el circuit breaker ya saltó (pausa hasta las 00:00 UTC)
+        self.pnl_day = utc_day()
+        self.halted_day = None
+
+        self._published_at = 0.0  # perf_counter del último precio publicado (latencia tick -> señal)
+        self.metrics_server = None
+
+        self._tasks = []
+        self._stopped = None
+
+    # --- UTILIDADES ---
+
+    def notify(self, text):
+        """Encola un mensaje para Telegram (nunca bloquea a quien lo llama)."""
+        send_message(text)
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def _guard(self, name, coro):
+        """Si una tarea revienta, apagamos todo de forma ordenada (como el except de antes)."""
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"CRITICAL ERROR ({name}): {e}")
+            self.notify(f"🚨 <b>ERROR CRÍTICO:</b> {str(e)}")
+            self.stop()
+
+    # --- ARRANQUE ---
+
+    async def _setup(self):
+        print("🚀 Inicializando componentes...")
+        timer = self.timer
+        if self.archive is not None:
+            with timer.phase("archivo"):
+                warmed = self.archive.warm(self.base)
+            if warmed:
+                print(f"📚 {warmed} velas cargadas del histórico local")
+            self._archived_total = self.base.total
+
+        self.connector = await asyncio.to_thread(timer.timed("exchange", BinanceConnector))
+        self.exchange = self.connector.get_exchange()
+        self.trading_exchange = self.exchange
+
+        if not settings.IS_LIVE and settings.DRY_RUN_SIMULATOR:
+            self.sim = SimulatedExchange(self.exchange)
+            if self.sim.load(settings.SIM_STATE_PATH):
+                print(f"[SIM] ♻️ Estado del simulador recuperado (saldo {self.sim.wallet:.2f} USDT)")
+            loop = asyncio.get_running_loop()
+            self.sim.add_listener(lambda fill: loop.call_soon_threadsafe(self._on_fill, fill))
+            self.trading_exchange = self.sim
+        self.account = AccountCache(self.trading_exchange)
+        # Riesgo y ejecución ya: el saldo inicial sale del mismo RiskManager (markets llega abajo)
+        self.execution_engine = ExecutionEngine(self.trading_exchange, self.position_cache)
+        self.risk_manager = RiskManager(self.trading_exchange, None, self.execution_engine, self.account)
+
+        # Lo que queda del arranque es independiente entre sí: va en paralelo
+        async def load_positions():
+            # Una sola carga por REST; después mandan los eventos del stream
+            if self.position_cache is None:
+                return
+            try:
+                await asyncio.to_thread(timer.timed("posiciones", self.position_cache.load),
+                                        self.exchange, [settings.SYMBOL])
+            except Exception as e:
+                print(f"[EXEC ERROR] No se pudo cargar posiciones iniciales: {e}")
+
+        async def load_balance():
+            # Intento inicial de obtener balance (puede fallar, no importa)
+            try:
+                return await asyncio.to_thread(timer.timed("balance", self.risk_manager._get_available_balance))
+            except Exception:
+                return 0.0
+
+        def open_journal():
+            journal = TradeJournal(settings.JOURNAL_PATH, "LIVE" if settings.IS_LIVE else "DRY RUN",
+                                   settings.JOURNAL_FLUSH_SECONDS, settings.JOURNAL_BATCH_SIZE)
+            return journal, journal.recover(settings.SYMBOL)
+
+        async def load_journal():
+            if not settings.JOURNAL:
+                return None, None
+            try:
+                return await asyncio.to_thread(timer.timed("diario", open_journal))
+            except Exception as e:
+                print(f"[JOURNAL] ⚠️ Diario no disponible (se sigue sin persistencia): {e}")
+                return None, None
+
+        async def load_frames():
+            # Histórico de los timeframes derivados: una sola vez, después salen del feed base
+            if not self.resampler.aggregators:
+                return
+            try:
+                self.resampler.apply_seed(await asyncio.to_thread(
+                    timer.timed("timeframes", self.resampler.seed), self.exchange))
+            except Exception as e:
+                print(f"[MTF] ⚠️ Sin histórico de timeframes derivados (se arman solo con el feed base): {e}")
+
+        def load_kernels():
+            # numba y el código compilado se cargan aquí, en paralelo: el primer análisis no los paga
+            from core import kernels
+            kernels.warmup()
+
+        self.markets, _, bot_state.balance_total, (self.journal, recovered), _, _ = await asyncio.gather(
+            asyncio.to_thread(timer.timed("mercados", load_market_index), self.exchange),
+            load_positions(),
+            load_balance(),
+            load_journal(),
+            load_frames(),
+            asyncio.to_thread(timer.timed("kernels", load_kernels)),
+        )
+        if recovered:
+            self._restore(recovered)
+        self.markets_refreshed_at = time.monotonic()
+        self.risk_manager.markets = self.markets
+
+        if self.position_cache is not None:
+            self.user_stream = UserDataStream(self.exchange, self.position_cache, [settings.SYMBOL],
+                                              account=self.account)
+            # Con el stream conectado los eventos invalidan el saldo: TTL largo
+            self.account.stream = self.user_stream
+            # Un fill/cambio de posición despierta al monitor de posiciones al instante
+            loop = asyncio.get_running_loop()
+            self.position_cache.add_listener(
+                lambda event: loop.call_soon_threadsafe(self._on_stream_event, event)
+            )
+
+        # Estado inicial
+        bot_state.mode = "LIVE" if settings.IS_LIVE else "DRY RUN"
+
+        # Cargamos el modo por defecto desde settings a la memoria dinámica
+        bot_state.strategy_mode = settings.STRATEGY_MODE
+        bot_state.publish()
+
+        if self.scanner:
+            print(f"📡 Escáner multi-símbolo activo: {len(self.scanner.symbols)} símbolos")
+
+        startup_msg = (f"🤖 <b>Protocol Zero-Emotion Started</b>\n"
+                       f"Service PID: {os.getpid()}\n"
+                       f"Mode: <b>{bot_state.mode}</b>\n"
+                       f"Timeframe: <b>{settings.TIMEFRAME}</b>\n"
+                       f"Listener: ACTIVO ✅")
+        print(startup_msg)
+        sys.stdout.flush()
+        self.notify(startup_msg)
+
+    def _restore(self, recovered):
+        # PnL del día: el circuit breaker ya no se resetea con un reinicio
+        bot_state.daily_pnl = recovered['daily_pnl']
+        self.pnl_day = recovered['day']
+
+        position = recovered['position']
+        if position and not self.exchange_driven:
+            # En LIVE manda Binance (y el simulador guarda su propio estado);
+            # en el dry-run clásico la posición solo existe en el diario
+            self.dry_run_position = position
+            self.in_position = True
+            self.active_sl_price = position['sl']
+            self.active_tp_price = position['tp']
+            print(f"[JOURNAL] ♻️ Posición dry-run recuperada: {position['side']} @ {position['entry']}")
+
+        if recovered['daily_pnl']:
+            print(f"[JOURNAL] ♻️ PnL del día recuperado: {recovered['daily_pnl']:.4f} USDT")
+        if self._circuit_breaker_tripped():
+            # Sin esto, un reinicio con el breaker activo se apagaría en bucle (restart: always)
+            self.halted_day = self.pnl_day
+            self.notify(f"⛔ <b>Circuit breaker activo</b> ({bot_state.daily_pnl:.2f} USDT hoy): "
+                        f"sin nuevas entradas hasta las 00:00 UTC")
+
+    def _journal_position(self, position):
+        if self.journal:
+            self.journal.record_position(settings.SYMBOL, position)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._data_ready = asyncio.Event()
+        self._refresh_account = asyncio.Event()
+
+        self.orders = asyncio.Queue()
+        self.signal_ticks = asyncio.Queue(maxsize=1)
+        self.position_ticks = asyncio.Queue(maxsize=1)
+
+        if settings.METRICS:
+            self._register_gauges()
+            self.metrics_server = start_metrics_server()
+
+        try:
+            # El WebSocket conecta mientras se inicializa el resto (acumula hasta el primer drain)
+            if self.stream:
+                self.stream.add_listener(lambda: loop.call_soon_threadsafe(self._data_ready.set))
+                self._tasks.append(asyncio.create_task(self._guard("stream", self.stream.run())))
+
+            await self._setup()
+
+            if self.connector.from_snapshot and self.feed is None:
+                # Bajo el supervisor el snapshot lo acaba de renovar el proceso padre
+                self._tasks.append(asyncio.create_task(self._refresh_exchange()))
+            if self.user_stream:
+                self._tasks.append(asyncio.create_task(self._guard("user_stream", self.user_stream.run())))
+
+            for name, coro in (("market_data", self._market_data()),
+                               ("signals", self._signals()),
+                               ("positions", self._positions()),
+                               ("account", self._account()),
+                               ("orders", self._order_manager()),
+                               ("watchdog", self._watchdog())):
+                self._tasks.append(asyncio.create_task(self._guard(name, coro)))
+
+            await self._stopped.wait()
+        finally:
+            await self._shutdown()
+
+    def _register_gauges(self):
+        # Se leen recién al exportar: no cuestan nada en el ciclo
+        metrics.register_gauge("bot_last_price", "Último precio de SYMBOL.", lambda: bot_state.snapshot.last_price)
+        metrics.register_gauge("bot_in_position", "1 si hay posición abierta.", lambda: int(bot_state.snapshot.in_position))
+        metrics.register_gauge("bot_daily_pnl_usdt", "PnL del día UTC.", lambda: bot_state.snapshot.daily_pnl)
+        metrics.register_gauge("bot_balance_usdt", "Saldo de la cuenta.", lambda: bot_state.snapshot.balance_total)
+        metrics.register_gauge("bot_state_version", "Versión de la última foto de estado publicada.", lambda: bot_state.snapshot.version)
+        metrics.register_gauge("bot_orders_queued", "Pedidos de órdenes pendientes.", lambda: self.orders.qsize())
+        metrics.register_gauge("bot_rate_limit_used_weight", "Peso de Binance usado en el minuto (IP).",
+                               lambda: scheduler.stats()['used_weight'])
+        metrics.register_gauge("bot_rate_limit_banned_seconds", "Segundos de pausa por 429/418.",
+                               lambda: scheduler.stats()['banned_for'])
+        metrics.register_gauge("bot_rate_limit_coalesced", "Lecturas agrupadas con una idéntica en vuelo.",
+                               lambda: scheduler.coalesced)
+        metrics.register_gauge("bot_account_cache_hits", "Lecturas de saldo servidas desde memoria.",
+                               lambda: self.account.hits if self.account else 0)
+        metrics.register_gauge("bot_uptime_seconds", "Segundos desde el arranque.", lambda: time.time() - metrics.started_at)
+
+    async def _refresh_exchange(self):
+        # Arrancamos con el snapshot: lo renovamos sin frenar el arranque
+        try:
+            await asyncio.to_thread(self.connector.refresh)
+        except Exception as e:
+            print(f"[API] ⚠️ No se pudo refrescar mercados/reloj: {e}")
+
+    async def _shutdown(self):
+        if self.stream:
+            self.stream.stop()
+        if self.user_stream:
+            self.user_stream.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.scanner:
+            await self.scanner.aclose()
+        if self.journal:
+            await asyncio.to_thread(self.journal.close, 5)
+        if self.sim is not None:
+            await asyncio.to_thread(self._save_sim)
+
+        if self.metrics_server is not None:
+            await asyncio.to_thread(self.metrics_server.shutdown)
+
+        # Damos tiempo a que salgan los mensajes pendientes
+        await asyncio.to_thread(flush_messages, 10)
+
+    # --- TAREAS ---
+
+    async def _watchdog(self):
+        """/stop desde Telegram cambia bot_state.running en otro hilo."""
+        while bot_state.running:
+            await asyncio.sleep(1)
+        self.stop()
+
+    async def _market_data(self):
+        last_rest_poll = 0.0
+        while True:
+            if self.feed is not None:
+                # El supervisor ya descargó y publicó: solo esperamos el cambio de secuencia
+                await self.feed.wait(settings.REST_POLL_SECONDS)
+            elif self.stream:
+                # Despertamos con cada vela/precio nuevo o, como mucho, cada REST_POLL_SECONDS
+                try:
+                    await asyncio.wait_for(self._data_ready.wait(), timeout=settings.REST_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._data_ready.clear()
+
+            rest_due = not self.stream or (time.monotonic() - last_rest_poll) >= settings.REST_POLL_SECONDS
+            if rest_due:
+                last_rest_poll = time.monotonic()
+
+            try:
+                if self.feed is not None:
+                    self.feed.sync(self.base)
+                    if self.feed.mark_price:
+                        bot_state.mark_price = self.feed.mark_price
+                elif self.stream:
+                    update = self.stream.drain()
+                    if update.backfill or not len(self.base):
+                        # Semilla / relleno de huecos por REST (la descarga va a un hilo,
+                        # la escritura del buffer se hace aquí en el event loop)
+                        self.base.apply(await self._fetch_candles())
+                    self.base.ingest(update.klines.get(settings.SYMBOL))
+                    if settings.SYMBOL in update.mark_prices:
+                        bot_state.mark_price = update.mark_prices[settings.SYMBOL]
+
+                if self.scanner and rest_due:
+                    self._scan_alerts(await self.scanner.scan_async())
+                    if settings.SYMBOL in self.scanner.errors:
+                        raise self.scanner.errors[settings.SYMBOL]
+                if not self.stream and self.feed is None and not self._scanner_feeds_base:
+                    self.base.apply(await self._fetch_candles())
+
+                # Timeframes derivados: solo las velas base nuevas o revisadas
+                self.resampler.sync()
+                if self.resampler.pending_seed and rest_due:
+                    # Hueco en el feed base (resiembra): cada timeframe derivado recupera su histórico
+                    self.resampler.apply_seed(await scheduler.run(DATA, self.resampler.seed, self.exchange))
+            except Exception as e:
+                print(f"Error fetching data: {e}")
+                await asyncio.sleep(10)
+                continue
+
+            if not len(self.candles):
+                await asyncio.sleep(10)
+                continue
+
+            if self.archive is not None and self.base.total != self._archived_total:
+                # Cerró al menos una vela: la pasamos al histórico (unas decenas de bytes)
+                self._archived_total = self.base.total
+                try:
+                    self.archive.archive_closed(self.base)
+                except (OSError, ValueError) as e:
+                    print(f"[ARCHIVE] ⚠️ No se pudo guardar velas: {e}")
+
+            current_price = self.candles.last_close
+            bot_state.last_price = current_price
+            self._published_at = time.perf_counter()
+            _publish(self.signal_ticks, current_price)
+            _publish(self.position_ticks, current_price)
+
+            if self.timer.ready():
+                # Primer precio en las colas: desde aquí el bot ya puede operar
+                print(self.timer.report())
+
+            sys.stdout.flush()
+            if not self.stream and self.feed is None:
+                await asyncio.sleep(60)
+
+    @property
+    def _scanner_feeds_base(self):
+        # Sin remuestreo el escáner ya descarga las velas de SYMBOL
+        return self.scanner is not None and settings.SYMBOL in self.scanner.stores
+
+    async def _fetch_candles(self):
+        fetch = metrics.timed("fetch", self.base.fetch)
+        if self.timer.ready_at is None:
+            fetch = self.timer.timed("velas", fetch)
+        return await scheduler.run(DATA, fetch, self.exchange)
+
+    def _scan_alerts(self, scan_results):
+        # Alertas del watchlist (una sola vez por vela y señal)
+        for sym, analysis in scan_results.items():
+            if sym == settings.SYMBOL or not analysis.signal:
+                continue
+            alert_key = (self.scanner.stores[sym].last_timestamp, analysis.signal.side)
+            if self.last_scan_alerts.get(sym) != alert_key:
+                self.last_scan_alerts[sym] = alert_key
+                self.notify(f"📡 <b>Señal en {sym}</b>: {analysis.signal.side} ({analysis.label})")
+
+    async def _signals(self):
+        while True:
+            current_price = await self.signal_ticks.get()
+
+            # Análisis (O(1): solo procesa velas nuevas o la vela viva)
+            analysis = self.strategy.analyze(self.candles, self.frames)
+
+            # Telemetría
+            bot_state.strategy_name = analysis.label
+            bot_state.rsi = analysis.values.get('RSI', bot_state.rsi)
+            bot_state.adx = analysis.values.get('ADX', bot_state.adx)
+            bot_state.publish()
+
+            # Detección Cambio Estrategia
+            if analysis.regime != self.last_regime:
+                self.notify(f"🔄 <b>Cambio de Estrategia</b>: {self.last_regime} -> <b>{analysis.regime}</b>")
+                self.last_regime = analysis.regime
+            metrics.observe("tick_to_signal", time.perf_counter() - self._published_at)
+
+            # --- EXECUTION (Entrada) ---
+            signal = analysis.signal
+            if not signal or self.in_position or self.order_pending:
+                continue
+            if time.monotonic() < self.cooldown_until:
+                continue
+            if self.halted_day == self.pnl_day:
+                continue
+
+            print(f"SIGNAL: {signal.side} | SL: {signal.sl_pct} | TP: {signal.tp_pct}")
+            self.order_pending = True
+            self.orders.put_nowait({'kind': 'ENTRY', 'signal': signal.side, 'price': current_price,
+                                    'sl_pct': signal.sl_pct, 'tp_pct': signal.tp_pct, 'reason': signal.reason})
+
+    async def _positions(self):
+        while True:
+            current_price = await self.position_ticks.get()
+            t0 = time.perf_counter()
+            path = self._price_path(current_price)
+
+            if self.sim is not None:
+                # El simulador ejecuta los SL/TP que toque el recorrido antes del monitoreo
+                bar = self.candles.tail(1)
+                bar_range = float(bar[HIGH, 0] - bar[LOW, 0])
+                for price, gap in path:
+                    self.sim.on_price(settings.SYMBOL, price, bar_range=bar_range, gap=gap)
+
+            if self.exchange_driven:
+                self._monitor_live(current_price)
+            else:
+                self._monitor_dry_run(current_price, path)
+
+            self._check_proximity(current_price)
+            # Posición, PnL y precio de la misma pasada salen juntos hacia los lectores
+            bot_state.publish()
+            metrics.observe("positions", time.perf_counter() - t0)
+
+    def _price_path(self, price):
+        """
+        Recorrido del precio desde la lectura anterior como [(precio, gap)]:
+        los nuevos máximos/mínimos de la vela viva cuentan aunque el tick se
+        haya perdido (la cola de posiciones solo guarda el último precio).
+        """
+        if not len(self.candles):
+            return [(price, False)]
+        bar = self.candles.tail(1)[:, 0]
+        ts, high, low = bar[TS], bar[HIGH], bar[LOW]
+        seen = self._path_state
+        self._path_state = (ts, high, low, price)
+
+        if seen is None:
+            return [(price, False)]
+        prev_ts, prev_high, prev_low, prev_price = seen
+        if ts != prev_ts:
+            # Vela nueva: su recorrido desde la apertura (la apertura puede ser un salto)
+            points = bar_path(bar[OPEN], high, low, price).tolist()
+            return [(p, k == 0) for k, p in enumerate(points)]
+        points = tick_path(prev_price, high if high > prev_high else None,
+                           low if low < prev_low else None, price)
+        return [(p, False) for p in points]
+
+    def _on_account_event(self):
+        # Reevaluamos la posición con el último precio conocido
+        if len(self.candles):
+            _publish(self.position_ticks, self.candles.last_close)
+
+    def _on_stream_event(self, event):
+        # Fills del user-data stream (SL/TP ejecutados por el exchange incluidos): diario y PnL del día
+        fill = fill_from_event(event)
+        if fill is not None and normalize_symbol(fill['symbol']) == normalize_symbol(settings.SYMBOL):
+            self._on_fill(fill)
+        else:
+            # El ACCOUNT_UPDATE con la posición en 0 puede llegar después del fill
+            self._settle_close(self._position_amount())
+            self._on_account_event()
+
+    def _position_amount(self, fill=None):
+        """Posición tras el fill: la del simulador o la del PositionCache. None si no se sabe."""
+        if fill is not None and fill['position'] is not None:
+            return fill['position']
+        if self.position_cache is not None and self.position_cache.ready:
+            position = self.position_cache.get(settings.SYMBOL)
+            return float(position['amt']) if position else 0.0
+        return None
+
+    def _on_fill(self, fill):
+        """
+        Ejecución (entrada, SL o TP) del simulador o del user-data stream (LIVE):
+        PnL del día y diario. Los fills que reducen la posición se acumulan y el
+        cierre se avisa una sola vez, cuando la posición queda en 0.
+        """
+        net = fill['realized_pnl'] - fill['fee']
+        bot_state.daily_pnl += net
+
+        if fill['reason'] in (STOP_MARKET, TAKE_PROFIT_MARKET) or fill['realized_pnl']:
+            close_signal = {STOP_MARKET: "STOP LOSS", TAKE_PROFIT_MARKET: "TAKE PROFIT"}.get(fill['reason'], fill['reason'])
+            if self.journal:
+                self.journal.record_pnl(settings.SYMBOL, net, close_signal)
+            closing = self._closing or {'qty': 0.0, 'notional': 0.0, 'net': 0.0}
+            closing['qty'] += fill['qty']
+            closing['notional'] += fill['qty'] * fill['price']
+            closing['net'] += net
+            closing.update(side=fill['side'], price=fill['price'], signal=close_signal,
+                           order_id=fill['order']['id'])
+            self._closing = closing
+        elif self.journal and net:
+            self.journal.record_pnl(settings.SYMBOL, net, "COMISION")
+
+        self._settle_close(self._position_amount(fill))
+        bot_state.publish()
+        if self.sim is not None:
+            asyncio.get_running_loop().run_in_executor(None, self._save_sim)
+        self.account.invalidate()
+        self._refresh_account.set()
+        self._on_account_event()
+
+    def _settle_close(self, amount):
+        """Con la posición ya en 0: registra el cierre acumulado, avisa y arranca el enfriamiento."""
+        closing = self._closing
+        if closing is None or amount is None or amount != 0:
+            return
+        self._closing = None
+        price = closing['notional'] / closing['qty'] if closing['qty'] else closing['price']
+        if self.journal:
+            self.journal.record_fill(settings.SYMBOL, 'CLOSE', closing['side'], closing['qty'], price,
+                                     closing['signal'], closing['order_id'])
+
+        net = closing['net']
+        emoji = "✅" if net > 0 else "❌"
+        self.notify(f"{emoji} <b>Posición CERRADA</b> ({closing['signal']})\n"
+                    f"PnL: <b>{net:.4f} USDT</b> (comisiones incluidas)\n"
+                    f"Cierre: {price:.4f}")
+        self.active_sl_price = 0.0; self.active_tp_price = 0.0
+        # Mismo enfriamiento que el dry-run clásico
+        self.cooldown_until = time.monotonic() + POST_CLOSE_COOLDOWN
+        bot_state.publish()
+
+    async def _record_rest_fills(self):
+        """Fills desde el último leído (fetch_my_trades): PnL realizado y comisión al diario."""
+        try:
+            trades = await scheduler.run(ACCOUNT, self.trading_exchange.fetch_my_trades,
+                                         settings.SYMBOL, self._trades_since)
+        except Exception as e:
+            print(f"[JOURNAL] ⚠️ No se pudieron leer los fills del cierre: {e}")
+            return
+        for t in trades:
+            if t['timestamp'] < self._trades_since:
+                continue
+            self._trades_since = t['timestamp'] + 1
+            fee = t.get('fee') or {}
+            self._on_fill({'symbol': t['symbol'], 'order': {'id': str(t.get('order'))}, 'side': t['side'],
+                           'qty': float(t['amount']), 'price': float(t['price']),
+                           'fee': float(fee.get('cost') or 0) if fee.get('currency') in (None, 'USDT') else 0.0,
+                           'realized_pnl': float(t.get('info', {}).get('realizedPnl') or 0),
+                           'reason': "CIERRE", 'position': None, 'timestamp': t['timestamp']})
+        # Se llama con la posición ya en 0 (la vio el monitor)
+        self._settle_close(0.0)
+
+    def _save_sim(self):
+        try:
+            self.sim.save(settings.SIM_STATE_PATH)
+        except OSError as e:
+            print(f"[SIM] ⚠️ No se pudo guardar el estado del simulador: {e}")
+
+    def _monitor_live(self, current_price):
+        if self.position_cache is not None and self.position_cache.ready:
+            self.position_data = self.position_cache.get(settings.SYMBOL)
+        elif self.sim is not None:
+            self.position_data = self.execution_engine.get_position_details(settings.SYMBOL)
+        position_data = self.position_data
+        if not (position_data and float(position_data['amt']) != 0):
+            if self.in_position:
+                self._journal_position(None)
+                if self.sim is None and self.position_cache is None:
+                    # Sin stream ni simulador nadie nos avisó del SL/TP: lo leemos del exchange
+                    asyncio.get_running_loop().create_task(self._record_rest_fills())
+            self.in_position = False
+            bot_state.in_position = False
+            return
+
+        if not self.in_position:
+            self._journal_position(dict(position_data))
+        self.in_position = True
+        qty = float(position_data['amt'])
+        entry_price = float(position_data['entryPrice'])
+        side = 'buy' if qty > 0 else 'sell'
+
+        bot_state.in_position = True
+        bot_state.pos_type = "LONG" if side == 'buy' else "SHORT"
+        bot_state.entry_price = entry_price
+        pnl_pct_real = (current_price - entry_price) / entry_price if side == 'buy' else (entry_price - current_price) / entry_price
+        bot_state.current_pnl_pct = pnl_pct_real
+
+        if self.active_tp_price == 0:
+            tp_factor = (1 + settings.TAKE_PROFIT_PCT) if side == 'buy' else (1 - settings.TAKE_PROFIT_PCT)
+            sl_factor = (1 - settings.STOP_LOSS_PCT) if side == 'buy' else (1 + settings.STOP_LOSS_PCT)
+            self.active_tp_price = entry_price * tp_factor
+            self.active_sl_price = entry_price * sl_factor
+
+        # TRAILING STOP (LIVE)
+        if self.trail_pending or pnl_pct_real < settings.TRAILING_TRIGGER:
+            return
+
+        new_sl_price = 0.0
+        if side == 'buy':
+            target_sl = entry_price * (1 + settings.TRAILING_STEP)
+            if target_sl > entry_price and target_sl > self.active_sl_price: new_sl_price = target_sl
+        else:
+            target_sl = entry_price * (1 - settings.TRAILING_STEP)
+            if target_sl < entry_price and target_sl < self.active_sl_price: new_sl_price = target_sl
+
+        if new_sl_price:
+            self.trail_pending = True
+            self.orders.put_nowait({'kind': 'TRAIL', 'new_sl': new_sl_price, 'side': side,
+                                    'qty': abs(qty)})
+
+    def _monitor_dry_run(self, current_price, path=None):
+        position = self.dry_run_position
+        if not position:
+            self.in_position = False
+            bot_state.in_position = False
+            return
+
+        self.in_position = True
+        entry = position['entry']
+        sl = position['sl']
+        tp = position['tp']
+        side = position['side']
+        qty_held = position.get('qty', 0.0)
+
+        self.active_sl_price = sl
+        self.active_tp_price = tp
+
+        bot_state.in_position = True
+        bot_state.pos_type = "LONG" if side == 'buy' else "SHORT"
+        bot_state.entry_price = entry
+        pnl_pct_sim = (current_price - entry) / entry if side == 'buy' else (entry - current_price) / entry
+        bot_state.current_pnl_pct = pnl_pct_sim
+
+        # Trailing Stop y cierre punto a punto sobre el recorrido (las mechas cuentan)
+        tracker = ExitTracker(side, entry, sl, tp)
+        close_signal = None
+        for price, gap in path or [(current_price, False)]:
+            for event, value in tracker.update(price, gap):
+                if event == 'TRAIL':
+                    position['sl'] = value
+                    self.active_sl_price = value
+                    self._journal_position(position)
+                    self.notify(f"🛡️ <b>SL ACTUALIZADO</b> a <code>{value:.2f}</code> (Trailing)")
+                else:
+                    close_signal = EXIT_REASONS[event]
+                    close_price = value
+            if close_signal:
+                break
+
+        if not close_signal:
+            return
+
+        price_diff = (close_price - entry) if side == 'buy' else (entry - close_price)
+        realized_pnl = price_diff * qty_held
+        bot_state.daily_pnl += realized_pnl
+        if self.journal:
+            self.journal.record_fill(settings.SYMBOL, 'CLOSE', 'sell' if side == 'buy' else 'buy',
+                                     qty_held, close_price, close_signal)
+            self.journal.record_pnl(settings.SYMBOL, realized_pnl, close_signal)
+            self.journal.record_position(settings.SYMBOL, None)
+
+        emoji = "✅" if realized_pnl > 0 else "❌"
+        self.notify(f"{emoji} <b>Posición CERRADA</b> ({close_signal})\n"
+                    f"PnL: <b>{realized_pnl:.4f} USDT</b>\n"
+                    f"Cierre: {close_price}")
+
+        self.dry_run_position = None
+        self.in_position = False
+        bot_state.in_position = False
+        self.active_sl_price = 0.0; self.active_tp_price = 0.0
+        self.tp_alert_sent = False; self.sl_alert_sent = False
+
+        # Enfriamiento sin congelar nada: solo bloquea nuevas entradas
+        self.cooldown_until = time.monotonic() + POST_CLOSE_COOLDOWN
+        # El circuit breaker se revisa ya mismo con el nuevo PnL
+        self._refresh_account.set()
+
+    def _check_proximity(self, current_price):
+        # --- ALERTAS DE PROXIMIDAD ---
+        if self.in_position and self.active_tp_price > 0 and self.active_sl_price > 0:
+            dist_tp = abs(self.active_tp_price - current_price) / current_price
+            dist_sl = abs(current_price - self.active_sl_price) / current_price
+
+            if dist_tp <= settings.ALERT_PROXIMITY_PCT and not self.tp_alert_sent:
+                self.notify(f"🚀 <b>Cerca del TP</b> ({dist_tp*100:.2f}%)")
+                self.tp_alert_sent = True
+
+            if dist_sl <= settings.ALERT_PROXIMITY_PCT and not self.sl_alert_sent:
+                self.notify(f"⚠️ <b>Cerca del SL</b> ({dist_sl*100:.2f}%)")
+                self.sl_alert_sent = True
+        else:
+            self.tp_alert_sent = False; self.sl_alert_sent = False
+
+    def _circuit_breaker_tripped(self):
+        # --- GESTIÓN DE RIESGO PROFESIONAL ---
+        # El límite es el MAYOR entre el % del saldo y el piso mínimo en USD:
+        # con $20 -> $2.0 | con $1000 -> $100 | con $0 (error de API) -> $2.0 (evita el apagado)
+        percentage_limit = bot_state.balance_total * settings.MAX_DAILY_LOSS
+        min_usd_floor = getattr(settings, 'MIN_DAILY_LOSS_USD', 1.0)
+        final_limit_usd = max(percentage_limit, min_usd_floor)
+
+        # Nota: daily_pnl suele ser negativo cuando pierdes, por eso comparamos con negativo
+        return bot_state.daily_pnl <= (final_limit_usd * -1)
+
+    async def _account(self):
+        while True:
+            day = utc_day()
+            if day != self.pnl_day:
+                # Nuevo día UTC: el PnL diario (y la pausa del circuit breaker) empiezan de cero
+                self.pnl_day = day
+                self.halted_day = None
+                bot_state.daily_pnl = 0.0
+
+            if self.halted_day != self.pnl_day and self._circuit_breaker_tripped():
+                stop_msg = f"⛔ BOT DETENIDO: Límite de pérdida diaria alcanzado ({bot_state.daily_pnl:.2f} USDT)"
+                print(stop_msg)
+                self.notify(stop_msg)
+                self.stop()
+                return
+
+            if time.monotonic() - self.markets_refreshed_at >= settings.MARKET_REFRESH_SECONDS:
+                # Cambios de step/tick/mínimos de Binance (raros, pero ocurren)
+                self.markets_refreshed_at = time.monotonic()
+                try:
+                    await scheduler.run(DATA, self.markets.refresh, self.exchange)
+                    await asyncio.to_thread(self.markets.save, settings.MARKET_CACHE_PATH)
+                except Exception as e:
+                    print(f"[MARKETS] ⚠️ No se pudo refrescar el índice: {e}")
+
+            if self.exchange_driven:
+                # Balance (límite dinámico) y posición con la cadencia REST
+                try:
+                    bot_state.balance_total = await scheduler.run(ACCOUNT, self.risk_manager._get_available_balance)
+                except Exception:
+                    pass
+                if self.position_cache is None or not self.position_cache.ready:
+                    self.position_data = await scheduler.run(ACCOUNT, self.execution_engine.get_position_details, settings.SYMBOL)
+            bot_state.publish()
+
+            try:
+                await asyncio.wait_for(self._refresh_account.wait(), timeout=settings.REST_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_account.clear()
+
+    async def _order_manager(self):
+        while True:
+            request = await self.orders.get()
+            try:
+                if request['kind'] == 'ENTRY':
+                    await self._execute_entry(request)
+                elif request['kind'] == 'TRAIL':
+                    await self._execute_trailing(request)
+            finally:
+                if request['kind'] == 'ENTRY':
+                    self.order_pending = False
+                else:
+                    self.trail_pending = False
+                if self.sim is not None:
+                    await asyncio.to_thread(self._save_sim)
+
+    async def _execute_entry(self, request):
+        signal = request['signal']
+        current_price = request['price']
+        dynamic_sl = request['sl_pct']
+        dynamic_tp = request['tp_pct']
+
+        if self.sim is not None and normalize_symbol(settings.SYMBOL) not in self.sim.last_price:
+            # Señal antes del primer tick del monitor: el simulador necesita un precio
+            self.sim.on_price(settings.SYMBOL, current_price)
+
+        # Carril de órdenes: balance, orden y SL/TP no esperan detrás de las lecturas de datos
+        order_result = await scheduler.run(
+            ORDER, self.risk_manager.calculate_and_execute, signal, current_price, dynamic_sl, dynamic_tp
+        )
+        if not order_result:
+            return
+
+        exec_price = float(order_result.get('average', current_price))
+        quantity = float(order_result.get('amount', 0))
+        if self.journal:
+            self.journal.record_fill(settings.SYMBOL, 'ENTRY', 'buy' if signal == 'LONG' else 'sell',
+                                     quantity, exec_price, request.get('reason'), order_result.get('id'))
+
+        if signal == 'LONG':
+            sl_price = exec_price * (1 - dynamic_sl)
+            tp_price = exec_price * (1 + dynamic_tp)
+            side_emoji = "🟢"
+        else:
+            sl_price = exec_price * (1 + dynamic_sl)
+            tp_price = exec_price * (1 - dynamic_tp)
+            side_emoji = "🔴"
+
+        self.active_sl_price = sl_price
+        self.active_tp_price = tp_price
+
+        self.notify(f"{side_emoji} <b>ORDEN EJECUTADA</b>\n"
+                    f"Entrada: ${exec_price:,.2f}\n"
+                    f"SL: ${sl_price:,.2f} | TP: ${tp_price:,.2f}")
+
+        if self.exchange_driven:
+            # Leemos la posición nueva antes de liberar order_pending (evita doble entrada).
+            # Con caché reconciliamos por REST: el evento del stream puede llegar después.
+            if self.user_stream:
+                await self.user_stream.reconcile()
+            self.position_data = await scheduler.run(ORDER, self.execution_engine.get_position_details, settings.SYMBOL)
+            self.in_position = bool(self.position_data and float(self.position_data['amt']) != 0)
+            if self.in_position:
+                self._journal_position(dict(self.position_data))
+        else:
+            self.dry_run_position = {
+                'entry': exec_price, 'sl': sl_price, 'tp': tp_price,
+                'side': 'buy' if signal == 'LONG' else 'sell', 'qty': quantity
+            }
+            self.in_position = True
+            self._journal_position(self.dry_run_position)
+
+    async def _execute_trailing(self, request):
+        new_sl_price = request['new_sl']
+        if settings.SYMBOL in self.markets:
+            new_sl_price = self.markets.round_price(settings.SYMBOL, new_sl_price)
+        success = await scheduler.run(
+            ORDER, self.execution_engine.update_trailing_stop, settings.SYMBOL, new_sl_price, request['side'],
+            request.get('qty')
+        )
+        if success:
+            self.active_sl_price = new_sl_price
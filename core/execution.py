@@ -1,10 +1,19 @@
 import os
 from config.settings import settings
 from utils.telegram_bot import send_message
+from core.position_cache import normalize_symbol, position_from_ccxt
+from core.order_manager import OrderManager
+from utils.metrics import metrics
 
 class ExecutionEngine:
-    def __init__(self, exchange):
+    def __init__(self, exchange, position_cache=None):
         self.exchange = exchange
+        # Si hay caché (user-data stream) las lecturas de posición no van a la API
+        self.position_cache = position_cache
+        # LIVE o dry-run sobre el simulador: las órdenes pasan por el exchange
+        self.routes_orders = settings.IS_LIVE or getattr(exchange, 'simulated', False)
+        # Envío de órdenes (batch SL/TP, reemplazo de SL sin ventana, RTT)
+        self.order_manager = OrderManager(exchange, position_cache)
     
     def place_entry_order(self, symbol, side, quantity, price=None):
         """
@@ -13,7 +22,7 @@ class ExecutionEngine:
         print(f"--- ORDER REQUEST ({settings.TRADING_MODE}) ---")
         print(f"Side: {side} | Qty: {quantity} | Symbol: {symbol}")
 
-        if not settings.IS_LIVE:
+        if not self.routes_orders:
             return {
                 'id': f'sim_{os.urandom(4).hex()}',
                 'status': 'closed',
@@ -24,13 +33,8 @@ class ExecutionEngine:
             }
 
         try:
-            order = self.exchange.create_order(
-                symbol=symbol,
-                type='market',
-                side=side.lower(),
-                amount=quantity
-            )
-            print(f"✅ Order Executed: {order['id']}")
+            order = self.order_manager.place_entry(symbol, side.lower(), quantity)
+            print(f"✅ Order Executed: {order['id']} ({self.order_manager.last_rtt * 1000:.0f} ms)")
             return order
         except Exception as e:
             msg = f"❌ EXECUTION ERROR: {str(e)}"
@@ -40,44 +44,26 @@ class ExecutionEngine:
 
     def place_oco_orders(self, symbol, side, quantity, entry_price, sl_price, tp_price):
         """
-        Coloca Stop Loss y Take Profit iniciales.
+        Coloca Stop Loss y Take Profit iniciales en una sola ida y vuelta.
         """
-        if not settings.IS_LIVE:
+        if not self.routes_orders:
             return
 
         try:
-            close_side = 'sell' if side == 'buy' else 'buy'
-            
-            # 1. STOP LOSS
-            sl_params = {'stopPrice': sl_price, 'closePosition': True}
-            self.exchange.create_order(
-                symbol=symbol,
-                type='STOP_MARKET',
-                side=close_side,
-                amount=None,
-                price=None,
-                params=sl_params
-            )
-            print(f"🛡️ Stop Loss puesto en: {sl_price}")
-
-            # 2. TAKE PROFIT
-            tp_params = {'stopPrice': tp_price, 'closePosition': True}
-            self.exchange.create_order(
-                symbol=symbol,
-                type='TAKE_PROFIT_MARKET',
-                side=close_side,
-                amount=None,
-                price=None,
-                params=tp_params
-            )
-            print(f"💰 Take Profit puesto en: {tp_price}")
-            
+            placed, error = self.order_manager.place_protection(symbol, side, sl_price, tp_price)
         except Exception as e:
-            print(f"⚠️ Error colocando OCO (SL/TP): {e}")
-            send_message(f"⚠️ <b>Advertencia SL/TP:</b>\n{str(e)}")
+            placed, error = {}, e
+
+        if placed.get('SL'):
+            print(f"🛡️ Stop Loss puesto en: {sl_price} ({placed['SL']['rtt'] * 1000:.0f} ms)")
+        if placed.get('TP'):
+            print(f"💰 Take Profit puesto en: {tp_price} ({placed['TP']['rtt'] * 1000:.0f} ms)")
+        if error:
+            print(f"⚠️ Error colocando OCO (SL/TP): {error}")
+            send_message(f"⚠️ <b>Advertencia SL/TP:</b>\n{str(error)}")
 
     def check_active_position(self, symbol):
-        if not settings.IS_LIVE:
+        if not self.routes_orders:
             return False
         try:
             pos = self.get_position_details(symbol)
@@ -91,52 +77,25 @@ class ExecutionEngine:
         """
         Obtiene los detalles de la posición actual con NORMALIZACIÓN AGRESIVA.
         Resuelve el problema de 'SOLUSDT' vs 'SOL/USDT:USDT'.
+        Con PositionCache activo es una lectura en memoria (O(1), sin peso de API).
         """
-        if not settings.IS_LIVE:
+        if not self.routes_orders:
             return None
 
+        if self.position_cache is not None and self.position_cache.ready:
+            return self.position_cache.get(symbol)
+
         try:
-            # Pedimos TODO a Binance
-            all_positions = self.exchange.fetch_positions()
-            target_position = None
-
-            # --- FUNCIÓN DE LIMPIEZA (FILTRO NUCLEAR) ---
-            # Convierte "SOL/USDT:USDT" -> "SOLUSDT"
-            # Convierte "SOL/USDT" -> "SOLUSDT"
-            def clean_symbol(s):
-                if not s: return ""
-                return s.replace("/", "").split(":")[0]
-            # --------------------------------------------
-
-            # Limpiamos el símbolo que buscamos (el de settings)
-            target_clean = clean_symbol(symbol)
-
-            for p in all_positions:
-                api_symbol = p['symbol']
-                api_clean = clean_symbol(api_symbol)
-                
-                # Extraemos cantidad de forma segura
-                raw_amt = p.get('contracts') or p.get('amount') or p.get('info', {}).get('positionAmt', 0)
-                amt = float(raw_amt)
-                
-                # Debug solo si encontramos dinero real (para no llenar el log)
-                if amt != 0:
-                    print(f"🔎 REVISANDO: API='{api_symbol}' (Clean: {api_clean}) vs TARGET='{symbol}' (Clean: {target_clean})")
+            # Sin caché: pedimos TODO a Binance y buscamos la nuestra
+            target_clean = normalize_symbol(symbol)
 
+            with metrics.timer("fetch_positions"):
+                positions = self.exchange.fetch_positions()
+
+            for p in positions:
                 # COMPARACIÓN: Si los nombres limpios son iguales, ES LA NUESTRA
-                if target_clean == api_clean:
-                    target_position = p
-                    break
-            
-            if target_position:
-                raw_amt = target_position.get('contracts') or target_position.get('amount') or target_position.get('info', {}).get('positionAmt', 0)
-                entry_price = target_position.get('entryPrice') or target_position.get('info', {}).get('entryPrice', 0)
-                
-                return {
-                    'symbol': target_position['symbol'], # Devolvemos el símbolo real de Binance
-                    'amt': float(raw_amt),
-                    'entryPrice': float(entry_price)
-                }
+                if normalize_symbol(p['symbol']) == target_clean:
+                    return position_from_ccxt(p)
             
             return None
 
@@ -144,29 +103,14 @@ class ExecutionEngine:
             print(f"[EXEC ERROR] No se pudo leer posición: {e}")
             return None
 
-    def update_trailing_stop(self, symbol, new_sl_price, side):
+    def update_trailing_stop(self, symbol, new_sl_price, side, quantity=None):
         """
-        Actualiza el SL en Binance y NOTIFICA a Telegram.
+        Mueve el SL en Binance (el nuevo entra antes de cancelar el viejo; el TP
+        queda intacto) y NOTIFICA a Telegram.
         """
         try:
-            self.exchange.cancel_all_orders(symbol)
-            
-            sl_side = 'sell' if side == 'buy' else 'buy'
-            
-            params = {
-                'stopPrice': new_sl_price,
-                'closePosition': True 
-            }
-            
-            self.exchange.create_order(
-                symbol=symbol,
-                type='STOP_MARKET',
-                side=sl_side,
-                amount=None, 
-                price=None,
-                params=params
-            )
-            
+            self.order_manager.replace_stop(symbol, new_sl_price, side, quantity)
+
             print(f"[EXEC] SL actualizado exitosamente a {new_sl_price}")
             
             msg = (f"🛡️ <b>TRAILING STOP ACTIVADO</b>\n"
@@ -180,4 +124,4 @@ class ExecutionEngine:
         except Exception as e:
             print(f"[EXEC ERROR] Fallo al actualizar SL: {e}")
             send_message(f"⚠️ <b>Error Trailing Stop:</b> {str(e)}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,138 @@
+import numpy as np
+from config.settings import settings
+from core.strategy import LONG, SHORT
+
+# Motivos de cierre (mismas etiquetas que el dry-run)
+EXIT_SL, EXIT_TP, EXIT_END = 0, 1, 2
+EXIT_REASONS = ("STOP LOSS", "TAKE PROFIT", "FIN DE DATOS")
+
+# Puntos por vela en el recorrido intrabar: open, extremo 1, extremo 2, close
+PATH_POINTS = 4
+
+
+def bar_path(open_, high, low, close):
+    """
+    Recorrido determinista de una vela (escalares o arrays):
+    vela alcista O -> L -> H -> C, vela bajista O -> H -> L -> C.
+    Es la convención habitual sin datos de trades: el extremo del lado
+    contrario al cierre ocurrió primero.
+    Retorna array (4, ...) con los puntos en orden.
+    """
+    bullish = np.asarray(close) >= np.asarray(open_)
+    first = np.where(bullish, low, high)
+    second = np.where(bullish, high, low)
+    return np.stack([np.broadcast_to(open_, first.shape), first, second,
+                     np.broadcast_to(close, first.shape)]).astype(np.float64)
+
+def tick_path(prev_price, high_delta, low_delta, price):
+    """
+    Puntos visitados entre dos lecturas de la vela viva. Si el máximo subió o
+    el mínimo bajó desde la lectura anterior, el precio pasó por ahí; el orden
+    sigue la misma regla que bar_path según hacia dónde terminó el precio.
+    `high_delta` / `low_delta` son el nuevo máximo/mínimo o None si no cambió.
+    """
+    if price >= prev_price:
+        extremes = [low_delta, high_delta]
+    else:
+        extremes = [high_delta, low_delta]
+    return [p for p in extremes if p is not None] + [price]
+
+
+class ExitTracker:
+    """
+    Reglas de salida del dry-run evaluadas punto a punto (ticks, aggTrades o
+    el recorrido intrabar de cada vela): primero el trailing (mueve el SL una
+    sola vez al superar TRAILING_TRIGGER), luego SL y por último TP.
+    Es la versión incremental de find_exit_intrabar: mismas reglas, mismo orden.
+    """
+
+    def __init__(self, side, entry, sl, tp, params=None):
+        p = params or settings
+        self.side = LONG if side in (LONG, 'buy', 'LONG') else SHORT
+        self.entry = entry
+        self.sl = sl
+        self.tp = tp
+        self.trigger = p.TRAILING_TRIGGER
+        if self.side == LONG:
+            self.target_sl = entry * (1 + p.TRAILING_STEP)
+        else:
+            self.target_sl = entry * (1 - p.TRAILING_STEP)
+
+    def update(self, price, gap=False):
+        """
+        Procesa un punto del recorrido. `gap=True` si el precio saltó hasta aquí
+        (apertura de vela): la ejecución es al precio del punto, no al nivel.
+        Retorna lista de eventos: ('TRAIL', nuevo_sl), (EXIT_SL | EXIT_TP, precio).
+        """
+        events = []
+        side = self.side
+        pnl = (price - self.entry) / self.entry * side
+
+        if pnl >= self.trigger and (self.sl - self.target_sl) * side < 0:
+            self.sl = self.target_sl
+            events.append(('TRAIL', self.sl))
+
+        if (price - self.sl) * side <= 0:
+            events.append((EXIT_SL, price if gap else self.sl))
+        elif (price - self.tp) * side >= 0:
+            events.append((EXIT_TP, price if gap else self.tp))
+        return events
+
+    def update_bar(self, open_, high, low, close):
+        """Recorre una vela completa. Se detiene en el primer cierre."""
+        events = []
+        for k, price in enumerate(bar_path(open_, high, low, close).tolist()):
+            step = self.update(price, gap=(k == 0))
+            events.extend(step)
+            if step and step[-1][0] != 'TRAIL':
+                break
+        return events
+
+
+def find_exit_intrabar(open_, high, low, close, start, side, entry, sl, tp, params=None):
+    """
+    Versión vectorizada de ExitTracker sobre arrays de velas: aplana el recorrido
+    intrabar (4 puntos por vela) y busca por bloques crecientes el primer punto
+    que cierra la posición. Retorna (índice_vela, motivo, precio_salida, sl_final).
+    """
+    p = params or settings
+    n = len(close)
+    if start >= n:
+        return n - 1, EXIT_END, float(close[n - 1]), sl
+
+    if side == LONG:
+        target_sl = entry * (1 + p.TRAILING_STEP)
+    else:
+        target_sl = entry * (1 - p.TRAILING_STEP)
+    moves = (sl < target_sl) if side == LONG else (sl > target_sl)
+
+    j = start
+    chunk = 64
+    trailed_before = False
+    while j < n:
+        end = min(n, j + chunk)
+        # (4, m) -> orden temporal: vela por vela, punto por punto
+        points = bar_path(open_[j:end], high[j:end], low[j:end], close[j:end]).T.ravel()
+
+        pnl = (points - entry) / entry * side
+        trailed = np.logical_or.accumulate(pnl >= p.TRAILING_TRIGGER) | trailed_before
+        eff_sl = np.where(trailed & moves, target_sl, sl)
+
+        hit_sl = (points - eff_sl) * side <= 0
+        hit_tp = (points - tp) * side >= 0
+        hit = hit_sl | hit_tp
+        if hit.any():
+            k = int(np.argmax(hit))
+            bar = j + k // PATH_POINTS
+            gap = k % PATH_POINTS == 0
+            if hit_sl[k]:
+                price = points[k] if gap else eff_sl[k]
+                return bar, EXIT_SL, float(price), float(eff_sl[k])
+            price = points[k] if gap else tp
+            return bar, EXIT_TP, float(price), float(eff_sl[k])
+
+        trailed_before = bool(trailed[-1])
+        j = end
+        chunk = min(chunk * 2, 16384)
+
+    return n - 1, EXIT_END, float(close[n - 1]), float(target_sl if trailed_before and moves else sl)
@@ -0,0 +1,439 @@
+import math
+import sys
+import numpy as np
+from config.settings import settings
+
+NAN = float('nan')
+EPSILON = sys.float_info.epsilon
+
+
+def alpha_from_span(span):
+    # Misma conversión que pandas: span -> center of mass -> alpha
+    com = (span - 1) / 2.0
+    return 1.0 / (1.0 + com)
+
+def alpha_from_alpha(alpha):
+    # pandas guarda alpha como center of mass y lo vuelve a convertir (ida y vuelta)
+    com = 1.0 / alpha - 1.0
+    return 1.0 / (1.0 + com)
+
+def _div(a, b):
+    """División con la semántica de float64 de pandas (sin ZeroDivisionError)."""
+    if b == 0.0:
+        if a != a or a == 0.0:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+def _seed_mean(values):
+    """Semilla presma de pandas_ta: x.iloc[0:length].mean() (ignora NaN, suma por pares de NumPy)."""
+    x = np.asarray(values, dtype=np.float64)
+    valid = x == x
+    return _div(float(np.where(valid, x, 0.0).sum()), float(valid.sum()))
+
+
+class EwmMean:
+    """
+    Réplica paso a paso de pandas Series.ewm(...).mean() con ignore_na=False.
+    Sigue la misma recurrencia (y el mismo orden de operaciones) que el kernel
+    de pandas, así que el resultado es idéntico bit a bit.
+    """
+    __slots__ = ('alpha', 'adjust', 'min_periods', 'weighted', 'old_wt', 'nobs')
+
+    def __init__(self, alpha, adjust=True, min_periods=0):
+        self.alpha = alpha
+        self.adjust = adjust
+        self.min_periods = max(int(min_periods), 1)
+        self.reset()
+
+    def reset(self):
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def state(self):
+        return (self.weighted, self.old_wt, self.nobs)
+
+    def restore(self, state):
+        self.weighted, self.old_wt, self.nobs = state
+
+    def state_array(self):
+        """Estado en el formato de los kernels ([weighted, old_wt, nobs])."""
+        return np.array([self.weighted, self.old_wt, float(self.nobs)])
+
+    def restore_array(self, state):
+        self.weighted, self.old_wt, self.nobs = float(state[0]), float(state[1]), int(state[2])
+
+    def feed(self, x):
+        """Procesa un array completo con el kernel compilado (mismo resultado que update())."""
+        from core import kernels  # numba: se carga al primer uso, no al importar
+        state = self.state_array()
+        out = kernels.ewm_mean(kernels.contiguous(x), self.alpha, self.adjust, self.min_periods, state)
+        self.restore_array(state)
+        return out
+
+    def update(self, x):
+        is_observation = x == x
+        self.nobs += is_observation
+        weighted = self.weighted
+
+        if weighted == weighted:
+            self.old_wt *= (1.0 - self.alpha)
+            if is_observation:
+                new_wt = 1.0 if self.adjust else self.alpha
+                if weighted != x:
+                    weighted = self.old_wt * weighted + new_wt * x
+                    weighted /= (self.old_wt + new_wt)
+                if self.adjust:
+                    self.old_wt += new_wt
+                else:
+                    self.old_wt = 1.0
+        elif is_observation:
+            weighted = x
+
+        self.weighted = weighted
+        return weighted if self.nobs >= self.min_periods else NAN
+
+
+class EMA:
+    """EMA de pandas_ta (presma=True): se siembra con la SMA de las primeras `length` velas."""
+
+    def __init__(self, length):
+        self.length = length
+        self._ewm = EwmMean(alpha_from_span(length), adjust=False)
+        self._seed = []
+
+    def reset(self):
+        self._ewm.reset()
+        self._seed = []
+
+    def state(self):
+        return (tuple(self._seed) if self._seed is not None else None, self._ewm.state())
+
+    def restore(self, state):
+        seed, ewm_state = state
+        self._seed = list(seed) if seed is not None else None
+        self._ewm.restore(ewm_state)
+
+    def update(self, close):
+        if self._seed is None:
+            return self._ewm.update(close)
+
+        self._seed.append(close)
+        if len(self._seed) < self.length:
+            return NAN
+
+        sma = _seed_mean(self._seed)
+        self._seed = None
+        return self._ewm.update(sma)
+
+    def feed(self, close):
+        if self._seed is None:
+            return self._ewm.feed(close)
+        from core import kernels
+        x, seed = kernels.sma_seed(close, self.length, self._seed)
+        self._seed = list(seed) if seed is not None else None
+        return self._ewm.feed(x)
+
+
+class RSI:
+    """
+    RSI de Wilder tal como lo calcula pandas_ta 0.4.x: RMA de subidas y bajadas,
+    ewm(alpha=1/length, adjust=False) sin min_periods.
+    """
+
+    def __init__(self, length, scalar=100.0):
+        self.scalar = scalar
+        alpha = alpha_from_alpha(1.0 / length)
+        self._pos = EwmMean(alpha, adjust=False)
+        self._neg = EwmMean(alpha, adjust=False)
+        self._prev_close = None
+
+    def reset(self):
+        self._pos.reset()
+        self._neg.reset()
+        self._prev_close = None
+
+    def state(self):
+        return (self._prev_close, self._pos.state(), self._neg.state())
+
+    def restore(self, state):
+        self._prev_close, pos, neg = state
+        self._pos.restore(pos)
+        self._neg.restore(neg)
+
+    def update(self, close):
+        diff = NAN if self._prev_close is None else close - self._prev_close
+        self._prev_close = close
+
+        positive = 0.0 if diff < 0 else diff
+        negative = 0.0 if diff > 0 else diff
+
+        positive_avg = self._pos.update(positive)
+        negative_avg = self._neg.update(negative)
+        return _div(self.scalar * positive_avg, positive_avg + abs(negative_avg))
+
+    def feed(self, close):
+        from core import kernels
+        prev = np.array([NAN if self._prev_close is None else self._prev_close])
+        pos, neg = self._pos.state_array(), self._neg.state_array()
+        out = kernels.rsi(kernels.contiguous(close), self._pos.alpha, self.scalar, prev, pos, neg)
+        self._prev_close = float(prev[0]) if prev[0] == prev[0] else None
+        self._pos.restore_array(pos)
+        self._neg.restore_array(neg)
+        return out
+
+
+class ADX:
+    """
+    ADX de pandas_ta 0.4.x (ATR, +DM y -DM suavizados con RMA adjust=False).
+    El ATR se siembra como la EMA (presma): NaN hasta `length` rangos verdaderos
+    y en esa vela su media. Retorna (ADX, DMP, DMN).
+    """
+
+    def __init__(self, length, scalar=100.0):
+        self.length = length
+        self.scalar = scalar
+        alpha = alpha_from_alpha(1.0 / length)
+        self._atr = EwmMean(alpha, adjust=False)
+        self._dmp = EwmMean(alpha, adjust=False)
+        self._dmn = EwmMean(alpha, adjust=False)
+        self._adx = EwmMean(alpha, adjust=False)
+        self._prev = None
+        self._tr_seed = []
+
+    def _parts(self):
+        return (self._atr, self._dmp, self._dmn, self._adx)
+
+    def reset(self):
+        for part in self._parts():
+            part.reset()
+        self._prev = None
+        self._tr_seed = []
+
+    def state(self):
+        seed = tuple(self._tr_seed) if self._tr_seed is not None else None
+        return (self._prev, seed) + tuple(part.state() for part in self._parts())
+
+    def restore(self, state):
+        self._prev, seed = state[0], state[1]
+        self._tr_seed = list(seed) if seed is not None else None
+        for part, part_state in zip(self._parts(), state[2:]):
+            part.restore(part_state)
+
+    def _update_atr(self, true_range):
+        if self._tr_seed is None:
+            return self._atr.update(true_range)
+        self._tr_seed.append(true_range)
+        if len(self._tr_seed) < self.length:
+            return NAN
+        sma = _seed_mean(self._tr_seed)
+        self._tr_seed = None
+        return self._atr.update(sma)
+
+    def update(self, high, low, close):
+        if self._prev is None:
+            true_range = up = dn = NAN
+        else:
+            prev_high, prev_low, prev_close = self._prev
+            high_low = high - low
+            if high_low == 0:
+                high_low += EPSILON
+            true_range = max(abs(high_low), abs(high - prev_close), abs(prev_close - low))
+            up = high - prev_high
+            dn = prev_low - low
+        self._prev = (high, low, close)
+
+        pos = up if (up > dn and up > 0) else up * 0.0
+        neg = dn if (dn > up and dn > 0) else dn * 0.0
+        if abs(pos) < EPSILON: pos = 0.0
+        if abs(neg) < EPSILON: neg = 0.0
+
+        atr = self._update_atr(true_range)
+        k = _div(self.scalar, atr)
+        dmp = k * self._dmp.update(pos)
+        dmn = k * self._dmn.update(neg)
+        dx = _div(self.scalar * abs(dmp - dmn), dmp + dmn)
+        return self._adx.update(dx), dmp, dmn
+
+    def feed(self, high, low, close):
+        from core import kernels
+        prev = np.array(self._prev if self._prev is not None else (NAN, NAN, NAN), dtype=np.float64)
+        true_range, pos, neg = kernels.directional_movement(
+            kernels.contiguous(high), kernels.contiguous(low), kernels.contiguous(close), prev)
+        self._prev = tuple(prev.tolist()) if prev[2] == prev[2] else None
+        if self._tr_seed is not None:
+            true_range, seed = kernels.sma_seed(true_range, self.length, self._tr_seed)
+            self._tr_seed = list(seed) if seed is not None else None
+
+        state = np.ascontiguousarray([part.state_array() for part in self._parts()])
+        result = kernels.adx(true_range, pos, neg, self._atr.alpha, self.scalar, state)
+        for part, part_state in zip(self._parts(), state):
+            part.restore_array(part_state)
+        return result
+
+
+class IndicatorEngine:
+    """
+    Motor incremental de indicadores para Strategy.
+
+    Cada vela nueva cuesta O(1). Si llega una revisión de la vela viva (mismo
+    timestamp) se restaura el estado previo a esa vela y se recalcula solo ella.
+    Los valores coinciden con pandas_ta calculado desde la primera vela sembrada.
+    """
+
+    KEYS = ('close', 'ADX', 'EMA_FAST', 'EMA_SLOW', 'RSI', 'EMA_FILTER')
+
+    # Desde cuántas velas pendientes conviene sembrar con los kernels compilados
+    BULK_MIN = 32
+
+    def __init__(self, params=None):
+        p = params or settings
+        self.adx = ADX(getattr(p, 'ADX_PERIOD', 14))
+        self.ema_fast = EMA(p.EMA_FAST)
+        self.ema_slow = EMA(p.EMA_SLOW)
+        self.rsi = RSI(p.RSI_LENGTH)
+        self.ema_filter = EMA(p.RSI_EMA_FILTER)
+        self.reset()
+
+    def _parts(self):
+        return (self.adx, self.ema_fast, self.ema_slow, self.rsi, self.ema_filter)
+
+    def reset(self):
+        for part in self._parts():
+            part.reset()
+        self.last_ts = None
+        self.values = None        # Última vela (viva)
+        self.prev_values = None   # Vela anterior
+        self._committed = None
+        self._generation = None
+        self._seen_total = 0
+
+    @property
+    def ready(self):
+        """Equivalente a tener 2 filas tras el dropna() de la versión pandas."""
+        if self.values is None or self.prev_values is None:
+            return False
+        return all(v == v for v in self.values.values()) and \
+               all(v == v for v in self.prev_values.values())
+
+    def update(self, ts, high, low, close):
+        if self.last_ts is not None and ts < self.last_ts:
+            return self.values
+
+        if ts == self.last_ts:
+            # Revisión de la vela viva: volvemos al estado anterior a ella
+            self._restore(self._committed)
+        else:
+            self.prev_values = self.values
+            self._committed = self._snapshot()
+
+        adx, _, _ = self.adx.update(high, low, close)
+        self.values = {
+            'close': close,
+            'ADX': adx,
+            'EMA_FAST': self.ema_fast.update(close),
+            'EMA_SLOW': self.ema_slow.update(close),
+            'RSI': self.rsi.update(close),
+            'EMA_FILTER': self.ema_filter.update(close),
+        }
+        self.last_ts = ts
+        return self.values
+
+    def sync(self, candles):
+        """Alimenta solo las velas nuevas o revisadas de un CandleStore."""
+        if candles.generation != self._generation:
+            # El buffer se resembró (hueco grande): recalculamos la ventana completa
+            self.reset()
+            self._generation = candles.generation
+
+        if self.last_ts is None:
+            pending = len(candles)
+        else:
+            pending = min(candles.total - self._seen_total + 1, len(candles))
+
+        bars = candles.tail(pending)
+        if self.last_ts is None and pending >= self.BULK_MIN:
+            # Arranque en frío: todo menos la vela viva de una vez con los kernels
+            self.feed(bars[:, :-1])
+            bars = bars[:, -1:]
+
+        ts, _, high, low, close, _ = bars.tolist()
+        for i in range(len(ts)):
+            self.update(ts[i], high[i], low[i], close[i])
+
+        self._seen_total = candles.total
+        return self.values
+
+    def feed(self, bars):
+        """
+        Procesa velas ya cerradas (columnas del CandleStore) con los kernels y deja
+        el estado listo para seguir con update(). Mismo resultado que llamarlo vela a vela.
+        """
+        ts, _, high, low, close, _ = bars
+        if not len(ts) or (self.last_ts is not None and ts[0] <= self.last_ts):
+            return self.values
+
+        adx, _, _ = self.adx.feed(high, low, close)
+        columns = {
+            'close': close,
+            'ADX': adx,
+            'EMA_FAST': self.ema_fast.feed(close),
+            'EMA_SLOW': self.ema_slow.feed(close),
+            'RSI': self.rsi.feed(close),
+            'EMA_FILTER': self.ema_filter.feed(close),
+        }
+        if len(ts) > 1:
+            self.prev_values = {key: float(values[-2]) for key, values in columns.items()}
+        else:
+            self.prev_values = self.values
+        self.values = {key: float(values[-1]) for key, values in columns.items()}
+        self.last_ts = float(ts[-1])
+        return self.values
+
+    def _snapshot(self):
+        return tuple(part.state() for part in self._parts())
+
+    def _restore(self, snapshot):
+        for part, state in zip(self._parts(), snapshot):
+            part.restore(state)
+
+
+# --- VERSIÓN VECTORIZADA (Histórico completo: backtest / optimizador) ---
+# Los mismos kernels compilados que siembran IndicatorEngine: idéntico a pandas_ta.
+
+def ema_array(close, length):
+    from core import kernels
+    x, _ = kernels.sma_seed(close, length)
+    return kernels.ewm_mean(x, alpha_from_span(length), False, 1, kernels.new_state())
+
+def rsi_array(close, length, scalar=100.0):
+    from core import kernels
+    return kernels.rsi(kernels.contiguous(close), alpha_from_alpha(1.0 / length), scalar,
+                       np.full(1, NAN), kernels.new_state(), kernels.new_state())
+
+def adx_array(high, low, close, length, scalar=100.0):
+    from core import kernels
+    true_range, pos, neg = kernels.directional_movement(
+        kernels.contiguous(high), kernels.contiguous(low), kernels.contiguous(close), np.full(3, NAN))
+    true_range, _ = kernels.sma_seed(true_range, length)
+    adx, _, _ = kernels.adx(true_range, pos, neg, alpha_from_alpha(1.0 / length), scalar, kernels.new_state(4))
+    return adx
+
+def compute_indicators(arrays, params=None):
+    """
+    Calcula de una vez todas las columnas que usa Strategy sobre arrays OHLCV.
+    Retorna dict con las mismas claves que IndicatorEngine.values.
+    """
+    from core import kernels
+
+    p = params or settings
+    close = kernels.contiguous(arrays['close'])
+    return {
+        'close': close,
+        'ADX': adx_array(arrays['high'], arrays['low'], close, getattr(p, 'ADX_PERIOD', 14)),
+        'EMA_FAST': ema_array(close, p.EMA_FAST),
+        'EMA_SLOW': ema_array(close, p.EMA_SLOW),
+        'RSI': rsi_array(close, p.RSI_LENGTH),
+        'EMA_FILTER': ema_array(close, p.RSI_EMA_FILTER),
+    }
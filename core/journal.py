@@ -0,0 +1,192 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def utc_day(ts=None):
+    """Día UTC (YYYY-MM-DD) al que pertenece un timestamp: la unidad del PnL diario."""
+    moment = datetime.fromtimestamp(ts if ts is not None else time.time(), tz=timezone.utc)
+    return moment.strftime("%Y-%m-%d")
+
+
+class TradeJournal:
+    """
+    Diario persistente de fills, PnL realizado y snapshots de posición (SQLite).
+
+    - record_*() nunca bloquean: encolan la fila y vuelven.
+    - Un hilo escritor agrupa lo pendiente en una sola transacción cada
+      `flush_seconds` (o al llegar a `batch_size` filas).
+    - SQLite en modo WAL: los lectores (recover, /comandos) no frenan al escritor.
+    - recover() reconstruye el PnL del día y la última posición al arrancar.
+    """
+
+    def __init__(self, path, mode, flush_seconds=1.0, batch_size=500):
+        # SQLAlchemy tarda ~0.3s en importarse: solo si el diario está activo
+        import sqlalchemy as sa
+
+        self._sa = sa
+        self.path = path
+        self.mode = mode
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.engine = sa.create_engine(f"sqlite:///{path}")
+
+        @sa.event.listens_for(self.engine, "connect")
+        def _pragmas(dbapi_connection, _record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")  # Seguro con WAL, sin fsync por commit
+            cursor.close()
+
+        metadata = sa.MetaData()
+        self.fills = sa.Table(
+            "fills", metadata,
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("ts", sa.Float, nullable=False),
+            sa.Column("mode", sa.String(10), nullable=False),
+            sa.Column("symbol", sa.String(30), nullable=False),
+            sa.Column("kind", sa.String(10), nullable=False),   # ENTRY / CLOSE
+            sa.Column("side", sa.String(4), nullable=False),    # buy / sell
+            sa.Column("qty", sa.Float, nullable=False),
+            sa.Column("price", sa.Float, nullable=False),
+            sa.Column("reason", sa.String(40)),
+            sa.Column("order_id", sa.String(64)),
+        )
+        self.pnl = sa.Table(
+            "pnl", metadata,
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("ts", sa.Float, nullable=False),
+            sa.Column("day", sa.String(10), nullable=False, index=True),
+            sa.Column("mode", sa.String(10), nullable=False),
+            sa.Column("symbol", sa.String(30), nullable=False),
+            sa.Column("amount", sa.Float, nullable=False),
+            sa.Column("reason", sa.String(40)),
+        )
+        self.positions = sa.Table(
+            "positions", metadata,
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("ts", sa.Float, nullable=False),
+            sa.Column("mode", sa.String(10), nullable=False, index=True),
+            sa.Column("symbol", sa.String(30), nullable=False),
+            sa.Column("state", sa.Text),  # JSON de la posición; NULL = sin posición
+        )
+        metadata.create_all(self.engine)
+
+        self._queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    # --- PRODUCTORES (cualquier hilo / event loop) ---
+
+    def record_fill(self, symbol, kind, side, qty, price, reason=None, order_id=None):
+        self._queue.put((self.fills, {
+            'ts': time.time(), 'mode': self.mode, 'symbol': symbol, 'kind': kind,
+            'side': side, 'qty': float(qty), 'price': float(price),
+            'reason': reason, 'order_id': str(order_id) if order_id is not None else None,
+        }))
+
+    def record_pnl(self, symbol, amount, reason=None):
+        now = time.time()
+        self._queue.put((self.pnl, {
+            'ts': now, 'day': utc_day(now), 'mode': self.mode, 'symbol': symbol,
+            'amount': float(amount), 'reason': reason,
+        }))
+
+    def record_position(self, symbol, position):
+        self._queue.put((self.positions, {
+            'ts': time.time(), 'mode': self.mode, 'symbol': symbol,
+            'state': json.dumps(position) if position else None,
+        }))
+
+    # --- ESCRITOR ---
+
+    def _take_batch(self):
+        """Bloquea hasta tener algo y luego junta lo que llegue durante flush_seconds."""
+        try:
+            first = self._queue.get(timeout=self.flush_seconds)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        rows = {}
+        for table, row in batch:
+            rows.setdefault(table, []).append(row)
+        # Una transacción por lote (un solo commit/WAL append para todo)
+        with self.engine.begin() as conn:
+            for table, table_rows in rows.items():
+                conn.execute(table.insert(), table_rows)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"[JOURNAL] ❌ Error escribiendo {len(batch)} registros: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout=5):
+        """Espera a que lo encolado quede en disco. Retorna True si lo logró a tiempo."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=5):
+        flushed = self.flush(timeout)
+        self._stopping.set()
+        self._thread.join(timeout=self.flush_seconds + 1)
+        self.engine.dispose()
+        return flushed
+
+    # --- RECUPERACIÓN ---
+
+    def recover(self, symbol, day=None):
+        """
+        Estado a restaurar tras un reinicio:
+        PnL realizado del día (UTC) y la última posición registrada, ambos de `symbol`.
+        """
+        sa = self._sa
+        day = day or utc_day()
+        with self.engine.connect() as conn:
+            daily_pnl = conn.execute(
+                sa.select(sa.func.coalesce(sa.func.sum(self.pnl.c.amount), 0.0))
+                .where(self.pnl.c.mode == self.mode, self.pnl.c.symbol == symbol, self.pnl.c.day == day)
+            ).scalar()
+            state = conn.execute(
+                sa.select(self.positions.c.state)
+                .where(self.positions.c.mode == self.mode, self.positions.c.symbol == symbol)
+                .order_by(self.positions.c.id.desc())
+                .limit(1)
+            ).scalar()
+        return {
+            'day': day,
+            'daily_pnl': float(daily_pnl or 0.0),
+            'position': json.loads(state) if state else None,
+        }
@@ -0,0 +1,287 @@
+"""
+Kernels compilados (numba, modo nopython) de los indicadores y de las reglas
+de Strategy sobre arrays float64 contiguos.
+
+Los usan las dos rutas: la vectorizada (backtest / optimizador, todo el
+histórico de una vez) y la en vivo (siembra de IndicatorEngine y decisión de
+cada vela). Siguen la misma recurrencia y el mismo orden de operaciones que
+las clases incrementales de core.indicators: el resultado es idéntico bit a bit.
+
+Cada kernel recibe su estado (array float64 que se actualiza en el lugar), así
+que se puede continuar un cálculo donde quedó. Compilación anticipada: firmas
+explícitas + cache=True, el código máquina queda en NUMBA_CACHE_DIR y los
+siguientes arranques lo cargan sin recompilar (`python -m core.kernels` lo genera).
+"""
+import os
+import time
+
+import numpy as np
+from config.settings import settings
+# Modos de Strategy y códigos de señal (numba los toma como constantes)
+from core.signal_codes import MODE_AUTO, MODE_TREND, MODE_RANGE, LONG, SHORT
+
+if settings.NUMBA_CACHE_DIR:
+    # numba lee la variable al importarse
+    os.environ.setdefault("NUMBA_CACHE_DIR", os.path.abspath(settings.NUMBA_CACHE_DIR))
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    # Sin numba los kernels corren como Python puro (mismo resultado, mucho más lentos)
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+
+# Estado de un EwmMean: [weighted, old_wt, nobs]
+EWM_STATE = 3
+
+# error_model='numpy': x / 0.0 da inf/nan como en pandas (no ZeroDivisionError)
+_JIT = dict(nogil=True, cache=True, error_model='numpy')
+
+# Entradas que el kernel solo lee: aceptan arrays de solo lectura (los memmap
+# del OHLCVArchive) sin copiarlos; un array normal se convierte solo
+_IN = "Array(float64, 1, 'C', readonly=True)"
+_IN2 = "Array(float64, 2, 'C', readonly=True)"
+
+
+@njit(f"float64[::1]({_IN}, float64, boolean, int64, float64[::1])", **_JIT)
+def ewm_mean(x, alpha, adjust, min_periods, state):
+    """pandas Series.ewm(...).mean() (ignore_na=False) continuando desde `state`."""
+    n = x.shape[0]
+    out = np.empty(n)
+    weighted, old_wt, nobs = state[0], state[1], state[2]
+    new_wt = 1.0 if adjust else alpha
+
+    for i in range(n):
+        value = x[i]
+        is_observation = value == value
+        if is_observation:
+            nobs += 1.0
+
+        if weighted == weighted:
+            old_wt *= (1.0 - alpha)
+            if is_observation:
+                if weighted != value:
+                    weighted = old_wt * weighted + new_wt * value
+                    weighted /= (old_wt + new_wt)
+                if adjust:
+                    old_wt += new_wt
+                else:
+                    old_wt = 1.0
+        elif is_observation:
+            weighted = value
+
+        out[i] = weighted if nobs >= min_periods else np.nan
+
+    state[0], state[1], state[2] = weighted, old_wt, nobs
+    return out
+
+
+@njit(f"float64[::1]({_IN}, float64, float64, float64[::1], float64[::1], float64[::1])", **_JIT)
+def rsi(close, alpha, scalar, prev_close, pos_state, neg_state):
+    """RSI de Wilder (pandas_ta 0.4.x, RMA adjust=False). `prev_close[0]` es NaN si no hay vela previa."""
+    n = close.shape[0]
+    positive = np.empty(n)
+    negative = np.empty(n)
+    prev = prev_close[0]
+
+    for i in range(n):
+        diff = close[i] - prev
+        prev = close[i]
+        positive[i] = 0.0 if diff < 0 else diff
+        negative[i] = 0.0 if diff > 0 else diff
+    prev_close[0] = prev
+
+    positive_avg = ewm_mean(positive, alpha, False, 1, pos_state)
+    negative_avg = ewm_mean(negative, alpha, False, 1, neg_state)
+    out = np.empty(n)
+    for i in range(n):
+        out[i] = (scalar * positive_avg[i]) / (positive_avg[i] + abs(negative_avg[i]))
+    return out
+
+
+@njit(f"UniTuple(float64[::1], 3)({_IN}, {_IN}, {_IN}, float64[::1])", **_JIT)
+def directional_movement(high, low, close, prev):
+    """
+    Rango verdadero, +DM y -DM de cada vela (entradas del ADX de pandas_ta).
+    `prev` = [high, low, close] de la vela previa (NaN si no hay); se actualiza.
+    """
+    n = close.shape[0]
+    eps = np.finfo(np.float64).eps
+    true_range = np.empty(n)
+    pos = np.empty(n)
+    neg = np.empty(n)
+    prev_high, prev_low, prev_close = prev[0], prev[1], prev[2]
+
+    for i in range(n):
+        h, l, c = high[i], low[i], close[i]
+        if prev_close != prev_close:
+            tr = up = dn = np.nan
+        else:
+            high_low = h - l
+            if high_low == 0:
+                high_low += eps
+            tr = max(abs(high_low), abs(h - prev_close), abs(prev_close - l))
+            up = h - prev_high
+            dn = prev_low - l
+        prev_high, prev_low, prev_close = h, l, c
+
+        p = up if (up > dn and up > 0) else up * 0.0
+        m = dn if (dn > up and dn > 0) else dn * 0.0
+        if abs(p) < eps:
+            p = 0.0
+        if abs(m) < eps:
+            m = 0.0
+        true_range[i], pos[i], neg[i] = tr, p, m
+    prev[0], prev[1], prev[2] = prev_high, prev_low, prev_close
+    return true_range, pos, neg
+
+
+@njit(f"UniTuple(float64[::1], 3)({_IN}, {_IN}, {_IN}, float64, float64, float64[:, ::1])", **_JIT)
+def adx(true_range, pos, neg, alpha, scalar, state):
+    """
+    ADX de pandas_ta 0.4.x (RMA adjust=False). Retorna (ADX, DMP, DMN).
+    `true_range` ya sembrado con su SMA (sma_seed, presma del ATR);
+    `state` = estados EWM de ATR, +DM, -DM y ADX (una fila cada uno).
+    """
+    n = true_range.shape[0]
+    atr = ewm_mean(true_range, alpha, False, 1, state[0])
+    pos_avg = ewm_mean(pos, alpha, False, 1, state[1])
+    neg_avg = ewm_mean(neg, alpha, False, 1, state[2])
+
+    dmp = np.empty(n)
+    dmn = np.empty(n)
+    dx = np.empty(n)
+    for i in range(n):
+        k = scalar / atr[i]
+        dmp[i] = k * pos_avg[i]
+        dmn[i] = k * neg_avg[i]
+        dx[i] = (scalar * abs(dmp[i] - dmn[i])) / (dmp[i] + dmn[i])
+    return ewm_mean(dx, alpha, False, 1, state[3]), dmp, dmn
+
+
+@njit("boolean(int64, boolean, float64, float64)", **_JIT)
+def regime(mode, trend, adx_value, threshold):
+    """Histéresis TREND/RANGE: entra a TREND con ADX >= umbral, vuelve a RANGE bajo umbral - 2."""
+    if mode == MODE_TREND:
+        return True
+    if mode == MODE_RANGE:
+        return False
+    if adx_value >= threshold:
+        return True
+    if adx_value < (threshold - 2):
+        return False
+    return trend  # Zona muerta: mantiene el modo anterior
+
+
+@njit("int8(boolean, float64, float64, float64, float64, float64, float64, float64, float64, float64)", **_JIT)
+def rule(trend, close, fast, slow, prev_fast, prev_slow, rsi_value, ema_filter, rsi_long, rsi_short):
+    """Regla de la estrategia activa para una vela: cruce de EMAs (TREND) o RSI + filtro EMA (RANGE)."""
+    if trend:
+        if prev_fast <= prev_slow and fast > slow:
+            return LONG
+        if prev_fast >= prev_slow and fast < slow:
+            return SHORT
+        return 0
+    if rsi_value < rsi_long and close > ema_filter:
+        return LONG
+    if rsi_value > rsi_short and close < ema_filter:
+        return SHORT
+    return 0
+
+
+@njit(f"Tuple((int8[::1], boolean[::1]))({_IN}, {_IN}, {_IN}, {_IN}, {_IN}, {_IN}, int64, float64, float64, float64)", **_JIT)
+def signals(close, adx_values, fast, slow, rsi_values, ema_filter, mode, threshold, rsi_long, rsi_short):
+    """
+    Señal (1 LONG, -1 SHORT, 0 nada) y modo (True = TREND) de cada vela.
+    Una vela se evalúa solo si ella y la anterior tienen todos los indicadores
+    (equivalente a dropna() + mínimo 2 filas). Antes de eso el modo es RANGE.
+    """
+    n = close.shape[0]
+    signal = np.zeros(n, dtype=np.int8)
+    is_trend = np.zeros(n, dtype=np.bool_)
+    trend = mode == MODE_TREND
+    prev_valid = False
+
+    for i in range(n):
+        valid = not (np.isnan(adx_values[i]) or np.isnan(fast[i]) or np.isnan(slow[i])
+                     or np.isnan(rsi_values[i]) or np.isnan(ema_filter[i]))
+        ready = valid and prev_valid
+        prev_valid = valid
+
+        if ready:
+            trend = regime(mode, trend, adx_values[i], threshold)
+            signal[i] = rule(trend, close[i], fast[i], slow[i], fast[i - 1], slow[i - 1],
+                             rsi_values[i], ema_filter[i], rsi_long, rsi_short)
+        is_trend[i] = trend
+    return signal, is_trend
+
+
+@njit(f"Tuple((int8[:, ::1], boolean[:, ::1]))({_IN2}, {_IN2}, {_IN2}, {_IN2}, {_IN2}, {_IN2}, int64, float64, float64, float64)", **_JIT)
+def signals_2d(close, adx_values, fast, slow, rsi_values, ema_filter, mode, threshold, rsi_long, rsi_short):
+    """signals() para (símbolos, velas): cada fila es un símbolo, todo en una sola llamada compilada."""
+    rows, n = close.shape
+    signal = np.zeros((rows, n), dtype=np.int8)
+    is_trend = np.zeros((rows, n), dtype=np.bool_)
+    for r in range(rows):
+        row_signal, row_trend = signals(close[r], adx_values[r], fast[r], slow[r], rsi_values[r],
+                                        ema_filter[r], mode, threshold, rsi_long, rsi_short)
+        signal[r] = row_signal
+        is_trend[r] = row_trend
+    return signal, is_trend
+
+
+# --- Envoltorios (Python) ---
+
+def contiguous(values):
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+def new_state(rows=None):
+    """Estado EWM vacío (weighted=NaN, old_wt=1, nobs=0)."""
+    state = np.array([np.nan, 1.0, 0.0]) if rows is None else np.tile([np.nan, 1.0, 0.0], (rows, 1))
+    return np.ascontiguousarray(state)
+
+def sma_seed(values, length, seed=()):
+    """
+    Entrada del EWM sembrado de pandas_ta (presma=True, la EMA y el ATR): NaN hasta
+    completar `length` valores y en esa posición su media. Retorna (x, valores de
+    siembra pendientes o None).
+    """
+    values = contiguous(values)
+    missing = length - len(seed)
+    if len(values) < missing:
+        return np.full(len(values), np.nan), tuple(seed) + tuple(values.tolist())
+
+    x = values.copy()
+    x[:missing - 1] = np.nan
+    # Igual que x.iloc[0:length].mean(): ignora NaN, suma por pares de NumPy
+    window = np.concatenate([np.asarray(seed, dtype=np.float64), values[:missing]])
+    valid = window == window
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x[missing - 1] = np.where(valid, window, 0.0).sum() / np.float64(valid.sum())
+    return x, None
+
+
+def warmup():
+    """Compila (o carga del cache) todos los kernels. Retorna segundos."""
+    t0 = time.perf_counter()
+    x = np.linspace(100.0, 101.0, 64)
+    ewm_mean(x, 0.1, True, 1, new_state())
+    rsi(x, 0.1, 100.0, np.full(1, np.nan), new_state(), new_state())
+    tr, pos, neg = directional_movement(x + 1.0, x - 1.0, x, np.full(3, np.nan))
+    a, _, _ = adx(tr, pos, neg, 0.1, 100.0, new_state(4))
+    signals(x, a, x, x, x, x, MODE_AUTO, 20.0, 35.0, 65.0)
+    m = np.ascontiguousarray(np.stack([x, x]))
+    signals_2d(m, np.ascontiguousarray(np.stack([a, a])), m, m, m, m, MODE_AUTO, 20.0, 35.0, 65.0)
+    return time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    where = os.environ.get("NUMBA_CACHE_DIR", "__pycache__")
+    if HAS_NUMBA:
+        print(f"[KERNELS] ✅ Kernels listos en {warmup():.2f}s (cache: {where})")
+    else:
+        print("[KERNELS] ⚠️ numba no está instalado: se usa la versión en Python puro.")
@@ -0,0 +1,227 @@
+import json
+import math
+import os
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from config.settings import settings
+from core.position_cache import normalize_symbol
+
+# Min notional estándar de Binance USDⓈ-M (solo si no hay metadatos del símbolo)
+DEFAULT_MIN_NOTIONAL = 5.0
+
+# Columnas de MarketIndex.data (una fila por símbolo)
+FIELDS = ('step', 'tick', 'min_qty', 'max_qty', 'market_max_qty', 'min_notional')
+STEP, TICK, MIN_QTY, MAX_QTY, MARKET_MAX_QTY, MIN_NOTIONAL = range(len(FIELDS))
+
+# Margen para errores de coma flotante al dividir por el step (0.3 / 0.1 = 2.9999...)
+_EPS = 1e-9
+
+
+def _decimals(value):
+    """Decimales de un step/tick tal como lo publica Binance ("0.01000000" -> 2)."""
+    exponent = Decimal(str(value)).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+
+def floor_to_step(values, steps):
+    """Versión vectorizada: trunca cada cantidad a su step (arrays de igual forma)."""
+    values = np.asarray(values, dtype=np.float64)
+    steps = np.asarray(steps, dtype=np.float64)
+    return np.floor(values / steps + _EPS) * steps
+
+
+def _row_from_filters(info):
+    """Fila de FIELDS a partir de un símbolo de /fapi/v1/exchangeInfo."""
+    filters = {f.get('filterType'): f for f in info.get('filters', [])}
+    lot = filters.get('LOT_SIZE', {})
+    market_lot = filters.get('MARKET_LOT_SIZE', {})
+    price = filters.get('PRICE_FILTER', {})
+    notional = filters.get('MIN_NOTIONAL', {})
+
+    step = lot.get('stepSize') or '1'
+    tick = price.get('tickSize') or '0.01'
+    max_qty = float(lot.get('maxQty') or 'inf')
+    return (
+        step,
+        tick,
+        float(lot.get('minQty') or 0),
+        max_qty,
+        float(market_lot.get('maxQty') or max_qty),
+        float(notional.get('notional') or notional.get('minNotional') or DEFAULT_MIN_NOTIONAL),
+    )
+
+
+class MarketIndex:
+    """
+    Metadatos de mercado precalculados (step, tick, min/max qty y min notional).
+
+    Una fila por símbolo en un array float64 compacto + un dict símbolo -> fila,
+    así redondear una orden es aritmética pura: sin load_markets ni
+    amount_to_precision de ccxt en el camino de la orden. Se persiste en disco
+    para que un reinicio no tenga que pedir exchangeInfo.
+    """
+
+    def __init__(self, rows=None, fetched_at=0.0):
+        self._lock = threading.Lock()
+        self._set(rows or {}, fetched_at)
+
+    def _set(self, rows, fetched_at):
+        symbols = list(rows)
+        data = np.empty((len(symbols), len(FIELDS)), dtype=np.float64)
+        qty_decimals = np.empty(len(symbols), dtype=np.int8)
+        price_decimals = np.empty(len(symbols), dtype=np.int8)
+        for i, symbol in enumerate(symbols):
+            step, tick, *rest = rows[symbol]
+            data[i] = (float(step), float(tick), *rest)
+            qty_decimals[i] = _decimals(step)
+            price_decimals[i] = _decimals(tick)
+
+        # Una sola asignación: un lector nunca ve mezcla de índice viejo y nuevo
+        self._state = ({s: i for i, s in enumerate(symbols)}, data, qty_decimals, price_decimals)
+        self._rows = rows
+        self.fetched_at = fetched_at
+
+    # --- CONSULTA ---
+
+    @property
+    def symbols(self):
+        return list(self._state[0])
+
+    @property
+    def data(self):
+        return self._state[1]
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def __contains__(self, symbol):
+        return normalize_symbol(symbol) in self._state[0]
+
+    def row(self, symbol):
+        """Metadatos del símbolo como dict (None si no está en el índice)."""
+        index, data, _, _ = self._state
+        i = index.get(normalize_symbol(symbol))
+        if i is None:
+            return None
+        return dict(zip(FIELDS, data[i].tolist()))
+
+    def min_notional(self, symbol):
+        index, data, _, _ = self._state
+        i = index.get(normalize_symbol(symbol))
+        return DEFAULT_MIN_NOTIONAL if i is None else float(data[i, MIN_NOTIONAL])
+
+    def min_order_notional(self, symbol, margin=None):
+        """Min notional con colchón para que el precio al llenar no nos deje por debajo."""
+        if margin is None:
+            margin = getattr(settings, 'MIN_NOTIONAL_MARGIN', 1.2)
+        return self.min_notional(symbol) * margin
+
+    def fresh(self, max_age):
+        return len(self) > 0 and time.time() - self.fetched_at < max_age
+
+    # --- REDONDEO ---
+
+    def floor_quantity(self, symbol, quantity, market=True):
+        """
+        Trunca la cantidad al stepSize y la limita al máximo permitido
+        (MARKET_LOT_SIZE para órdenes a mercado). Retorna 0.0 si queda por
+        debajo de minQty. KeyError si el símbolo no está en el índice.
+        """
+        index, data, qty_decimals, _ = self._state
+        i = index[normalize_symbol(symbol)]
+        row = data[i]
+        step = row[STEP]
+        qty = math.floor(quantity / step + _EPS) * step
+        qty = min(qty, row[MARKET_MAX_QTY] if market else row[MAX_QTY])
+        qty = round(qty, int(qty_decimals[i]))
+        return qty if qty >= row[MIN_QTY] else 0.0
+
+    def round_price(self, symbol, price):
+        """Redondea al tickSize más cercano (como price_to_precision)."""
+        index, data, _, price_decimals = self._state
+        i = index[normalize_symbol(symbol)]
+        tick = data[i, TICK]
+        return round(round(price / tick) * tick, int(price_decimals[i]))
+
+    # --- CONSTRUCCIÓN / REFRESCO ---
+
+    @staticmethod
+    def _rows_from_exchange(exchange, reuse_markets=False):
+        # Al construir, si ccxt ya cargó los mercados reutilizamos su 'info' (sin otra
+        # petición). Esa copia no se actualiza sola: un refresco siempre pide exchangeInfo
+        if reuse_markets and exchange.markets:
+            infos = [m.get('info', {}) for m in exchange.markets.values()]
+        else:
+            infos = exchange.fapiPublicGetExchangeInfo().get('symbols', [])
+
+        rows = {}
+        for info in infos:
+            if not info.get('symbol') or not info.get('filters'):
+                continue
+            rows[normalize_symbol(info['symbol'])] = _row_from_filters(info)
+        return rows
+
+    def refresh(self, exchange, reuse_markets=False):
+        """Vuelve a pedir los metadatos (exchangeInfo) y reemplaza el índice completo."""
+        rows = self._rows_from_exchange(exchange, reuse_markets)
+        with self._lock:
+            self._set(rows, time.time())
+        return self
+
+    @classmethod
+    def from_exchange(cls, exchange):
+        return cls().refresh(exchange, reuse_markets=True)
+
+    # --- CACHÉ EN DISCO ---
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'fetched_at': self.fetched_at, 'fields': FIELDS, 'rows': self._rows}, f)
+        os.replace(tmp, path)  # Escritura atómica: nunca queda un JSON a medias
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            payload = json.load(f)
+        if tuple(payload.get('fields', ())) != FIELDS:
+            raise ValueError(f"Formato de caché de mercados desconocido: {path}")
+        rows = {s: tuple(r) for s, r in payload['rows'].items()}
+        return cls(rows, payload.get('fetched_at', 0.0))
+
+
+def load_market_index(exchange=None, path=None, max_age=None):
+    """
+    Índice desde la caché en disco si es reciente; si no, desde el exchange
+    (y se guarda para el próximo arranque). Sin exchange devuelve lo que haya
+    en disco aunque esté viejo (backtest), o un índice vacío.
+    """
+    path = path or getattr(settings, 'MARKET_CACHE_PATH', 'database/markets.json')
+    max_age = max_age if max_age is not None else getattr(settings, 'MARKET_CACHE_MAX_AGE', 86400)
+
+    cached = None
+    try:
+        cached = MarketIndex.load(path)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[MARKETS] ⚠️ Caché de mercados inválida, se ignora: {e}")
+
+    if cached is not None and (exchange is None or cached.fresh(max_age)):
+        return cached
+    if exchange is None:
+        return MarketIndex()
+
+    index = MarketIndex.from_exchange(exchange)
+    try:
+        index.save(path)
+    except OSError as e:
+        print(f"[MARKETS] ⚠️ No se pudo guardar la caché de mercados: {e}")
+    return index
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import threading
+import time
+
+from config.settings import settings
+from core.candle_store import timeframe_to_ms
+
+BINANCE_FUTURES_WS = "wss://fstream.binance.com"
+
+
+class StreamUpdate:
+    """Lo acumulado por el stream desde el último drain()."""
+    __slots__ = ('klines', 'mark_prices', 'backfill')
+
+    def __init__(self, klines, mark_prices, backfill):
+        self.klines = klines            # símbolo -> [[ts, o, h, l, c, v], ...]
+        self.mark_prices = mark_prices  # símbolo -> último mark price
+        self.backfill = backfill        # True si hubo reconexión o hueco: pedir REST
+
+
+class MarketStream:
+    """
+    Feed de Binance Futures por WebSocket (kline + markPrice@1s).
+
+    Corre en su propio hilo/event loop y solo acumula datos; el bucle principal
+    los recoge con drain() y los incorpora al CandleStore en su propio hilo,
+    así no hay escrituras concurrentes. Tras cada (re)conexión o salto de velas
+    marca `backfill` para que el consumidor rellene el hueco por REST.
+    """
+
+    def __init__(self, symbols, timeframe=None, base_url=None):
+        self.symbols = [s.upper() for s in symbols]
+        self.timeframe = timeframe or settings.TIMEFRAME
+        self.timeframe_ms = timeframe_to_ms(self.timeframe)
+        self.base_url = (base_url or getattr(settings, 'MARKET_STREAM_URL', None) or BINANCE_FUTURES_WS).rstrip('/')
+
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._klines = {}
+        self._marks = {}
+        self._last_kline_ts = {}
+        self._backfill = False
+        self._listeners = []
+
+        self.connected = False
+        self.connections = 0
+        self.last_message_at = 0.0
+
+        self._stopping = False
+        self._thread = None
+        self._loop = None
+        self._task = None
+
+    @property
+    def url(self):
+        streams = []
+        for symbol in self.symbols:
+            s = symbol.lower()
+            streams.append(f"{s}@kline_{self.timeframe}")
+            streams.append(f"{s}@markPrice@1s")
+        return f"{self.base_url}/stream?streams={'/'.join(streams)}"
+
+    # --- CONSUMIDOR (Hilo principal) ---
+
+    def add_listener(self, callback):
+        """
+        `callback()` se invoca (desde el hilo del stream) cada vez que hay datos nuevos.
+        Permite despertar a un event loop externo sin hacer polling.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self):
+        self._event.set()
+        for callback in self._listeners:
+            callback()
+
+    def wait(self, timeout):
+        """Bloquea hasta que llegue algo nuevo o pase `timeout`. Retorna True si hay datos."""
+        return self._event.wait(timeout)
+
+    def drain(self):
+        with self._lock:
+            update = StreamUpdate(self._klines, self._marks, self._backfill)
+            self._klines = {}
+            self._marks = {}
+            self._backfill = False
+            self._event.clear()
+        return update
+
+    # --- PRODUCTOR (Hilo del WebSocket) ---
+
+    def _handle(self, raw):
+        payload = json.loads(raw)
+        data = payload.get('data', payload)
+        event = data.get('e')
+
+        with self._lock:
+            if event == 'kline':
+                k = data['k']
+                symbol = data['s']
+                bar = [float(k['t']), float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])]
+
+                # Si saltamos más de una vela (mensajes perdidos) pedimos backfill
+                last_ts = self._last_kline_ts.get(symbol)
+                if last_ts is not None and bar[0] - last_ts > self.timeframe_ms:
+                    self._backfill = True
+                self._last_kline_ts[symbol] = bar[0]
+
+                pending = self._klines.setdefault(symbol, [])
+                if pending and pending[-1][0] == bar[0]:
+                    pending[-1] = bar  # Solo nos importa el último estado de la vela viva
+                else:
+                    pending.append(bar)
+
+            elif event == 'markPriceUpdate':
+                self._marks[data['s']] = float(data['p'])
+            else:
+                return
+
+            self.last_message_at = time.time()
+            self._notify()
+
+    async def run(self):
+        """Conecta y reconecta para siempre (backoff exponencial hasta 30s)."""
+        import aiohttp
+
+        delay = 1
+        async with aiohttp.ClientSession() as session:
+            while not self._stopping:
+                try:
+                    async with session.ws_connect(self.url, heartbeat=30, receive_timeout=90) as ws:
+                        self.connected = True
+                        self.connections += 1
+                        delay = 1
+                        # Lo que pasó mientras no estábamos conectados se rellena por REST
+                        with self._lock:
+                            self._backfill = True
+                            self._notify()
+                        print(f"[WS] 🔌 Conectado a {self.base_url} ({len(self.symbols)} símbolos)")
+
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                try:
+                                    self._handle(msg.data)
+                                except (ValueError, KeyError) as e:
+                                    print(f"[WS] Mensaje inválido ignorado: {e}")
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"[WS] ⚠️ Conexión perdida: {e}")
+
+                self.connected = False
+                if self._stopping:
+                    break
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    # --- CICLO DE VIDA ---
+
+    def start(self):
+        """
+        Arranca el stream en un hilo daemon con su propio event loop.
+        (Si ya hay un event loop, basta con crear una tarea con run()).
+        """
+        if self._thread:
+            return
+
+        def _runner():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._task = self._loop.create_task(self.run())
+            try:
+                self._loop.run_until_complete(self._task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._loop.close()
+
+        self._thread = threading.Thread(target=_runner, name="market-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        if self._loop and self._task:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
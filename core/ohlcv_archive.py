@@ -0,0 +1,194 @@
+import json
+import os
+import time
+
+import numpy as np
+from config.settings import settings
+from core.candle_store import COLUMNS, TS, timeframe_to_ms
+
+# Máximo de velas por petición de /fapi/v1/klines
+PAGE_LIMIT = 1500
+
+_META = "meta.json"
+
+
+class OHLCVArchive:
+    """
+    Histórico local de velas CERRADAS para un símbolo/timeframe.
+
+    Formato columnar y append-only: un archivo float64 crudo por columna
+    (timestamp.f64, open.f64, ...) más meta.json con la cantidad de filas
+    confirmadas. Primero se escriben las columnas y después el meta (atómico),
+    así un corte a mitad de escritura solo deja bytes sobrantes que se ignoran.
+
+    Las lecturas son np.memmap de solo lectura: sin copia hacia indicadores,
+    backtest u optimizador, aunque el histórico no entre en RAM.
+    """
+
+    def __init__(self, symbol, timeframe, root=None):
+        self.symbol = symbol.replace("/", "").split(":")[0].upper()
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+        self.root = root or getattr(settings, 'OHLCV_ARCHIVE_PATH', 'database/ohlcv')
+        self.path = os.path.join(self.root, self.symbol, timeframe)
+
+        self._rows = self._read_meta()
+        self._maps = None  # Cache de memmaps (se invalida al agregar filas)
+
+    @classmethod
+    def from_dir(cls, path):
+        """Abre un archivo a partir de su carpeta (<root>/<SÍMBOLO>/<timeframe>)."""
+        path = os.path.normpath(path)
+        root, timeframe = os.path.split(path)
+        root, symbol = os.path.split(root)
+        return cls(symbol, timeframe, root)
+
+    @staticmethod
+    def is_archive(path):
+        return os.path.isfile(os.path.join(path, _META))
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.f64")
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.path, _META)) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return 0
+        if meta.get('timeframe', self.timeframe) != self.timeframe:
+            raise ValueError(f"{self.path}: timeframe {meta['timeframe']} != {self.timeframe}")
+        return int(meta.get('rows', 0))
+
+    def _write_meta(self, rows):
+        tmp = os.path.join(self.path, f"{_META}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump({'symbol': self.symbol, 'timeframe': self.timeframe,
+                       'columns': COLUMNS, 'rows': rows, 'updated_at': time.time()}, f)
+        os.replace(tmp, os.path.join(self.path, _META))
+
+    # --- LECTURA ---
+
+    def __len__(self):
+        return self._rows
+
+    def columns(self):
+        """dict columna -> np.memmap de solo lectura (más antigua primero)."""
+        if self._maps is None:
+            if not self._rows:
+                return {name: np.empty(0, dtype=np.float64) for name in COLUMNS}
+            self._maps = {name: np.memmap(self._column_path(name), dtype=np.float64,
+                                          mode='r', shape=(self._rows,))
+                          for name in COLUMNS}
+        return self._maps
+
+    @property
+    def first_timestamp(self):
+        return int(self.columns()['timestamp'][0]) if self._rows else None
+
+    @property
+    def last_timestamp(self):
+        return int(self.columns()['timestamp'][-1]) if self._rows else None
+
+    def range(self, start_ms=None, end_ms=None):
+        """
+        Velas con start_ms <= timestamp < end_ms (búsqueda binaria sobre el índice).
+        Retorna dict columna -> vista del memmap (sin copia).
+        """
+        cols = self.columns()
+        ts = cols['timestamp']
+        lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side='left'))
+        hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, side='left'))
+        return {name: col[lo:hi] for name, col in cols.items()}
+
+    def tail(self, n):
+        cols = self.columns()
+        n = min(n, self._rows)
+        return {name: col[self._rows - n:] for name, col in cols.items()}
+
+    # --- ESCRITURA (solo agregar al final) ---
+
+    def append(self, bars):
+        """
+        Agrega velas cerradas [ts, o, h, l, c, v]. Las que no son posteriores a la
+        última guardada se ignoran (descargas repetidas o solapadas no duplican).
+        Retorna cuántas se agregaron.
+        """
+        if bars is None or len(bars) == 0:
+            return 0
+        block = np.asarray(bars, dtype=np.float64).reshape(-1, len(COLUMNS))
+        last_ts = self.last_timestamp
+        if last_ts is not None:
+            block = block[block[:, TS] > last_ts]
+        if not len(block):
+            return 0
+        if np.any(np.diff(block[:, TS]) <= 0):
+            raise ValueError(f"{self.symbol} {self.timeframe}: velas desordenadas o repetidas")
+
+        os.makedirs(self.path, exist_ok=True)
+        offset = self._rows * 8
+        for i, name in enumerate(COLUMNS):
+            with open(self._column_path(name), 'r+b' if os.path.exists(self._column_path(name)) else 'wb') as f:
+                # Descartamos bytes de una escritura previa que no llegó a confirmarse
+                f.truncate(offset)
+                f.seek(offset)
+                f.write(np.ascontiguousarray(block[:, i]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._rows += len(block)
+        self._write_meta(self._rows)
+        self._maps = None
+        return len(block)
+
+    # --- DESCARGA MASIVA ---
+
+    def download(self, exchange, since_ms, until_ms=None, limit=PAGE_LIMIT, progress=None):
+        """
+        Descarga paginada desde `since_ms` (o desde donde quedó: es reanudable)
+        hasta `until_ms` o la última vela cerrada. Cada página se confirma en
+        disco antes de pedir la siguiente. Retorna velas agregadas.
+        """
+        now_ms = exchange.milliseconds()
+        # Solo velas cerradas: la vela viva cambiaría después de archivada
+        closed_before = now_ms - now_ms % self.timeframe_ms
+        end = min(until_ms, closed_before) if until_ms is not None else closed_before
+
+        cursor = since_ms
+        if self.last_timestamp is not None:
+            cursor = max(cursor, self.last_timestamp + self.timeframe_ms)
+
+        added = 0
+        while cursor < end:
+            bars = exchange.fetch_ohlcv(self.symbol, self.timeframe, since=int(cursor), limit=limit)
+            bars = [b for b in bars if cursor <= b[0] < end]
+            if not bars:
+                break
+            added += self.append(bars)
+            cursor = bars[-1][0] + self.timeframe_ms
+            if progress:
+                progress(self, added)
+        return added
+
+    # --- INTEGRACIÓN CON EL BOT EN VIVO ---
+
+    def archive_closed(self, store):
+        """Guarda las velas ya cerradas del CandleStore (todas menos la viva)."""
+        if len(store) < 2:
+            return 0
+        closed = store.tail(len(store))[:, :-1]
+        last_ts = self.last_timestamp
+        if last_ts is not None:
+            closed = closed[:, closed[TS] > last_ts]
+        return self.append(closed.T)
+
+    def warm(self, store):
+        """
+        Siembra el CandleStore con las últimas velas del archivo (sin llamar a la API).
+        Luego store.next_request() solo pide lo que falta desde la última archivada.
+        """
+        if not self._rows:
+            return 0
+        tail = self.tail(store.capacity)
+        store.clear()
+        return store.ingest(np.column_stack([tail[name] for name in COLUMNS]))
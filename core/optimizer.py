@@ -0,0 +1,184 @@
+import csv
+import itertools
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+from config.settings import settings
+from core.backtest import OHLCV, run_backtest, DRY_RUN_BALANCE
+from core.indicators import ema_array, rsi_array, adx_array
+from core.strategy import TrendRangeStrategy
+
+# Parámetros que cambian las señales (el resto solo afecta a las salidas/tamaño)
+SIGNAL_PARAMS = ('ADX_PERIOD', 'ADX_THRESHOLD', 'EMA_FAST', 'EMA_SLOW', 'RSI_LENGTH',
+                 'RSI_EMA_FILTER', 'RSI_LONG_THRESHOLD', 'RSI_SHORT_THRESHOLD')
+# BatchSignals también trae el SL/TP de cada señal
+SIGNAL_PARAMS += ('TREND_SL', 'TREND_TP', 'RANGE_SL', 'RANGE_TP')
+
+
+class ParamSet:
+    """Settings con algunos valores sobrescritos (picklable para el pool de procesos)."""
+
+    def __init__(self, overrides):
+        self.overrides = dict(overrides)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        overrides = self.__dict__.get('overrides', {})
+        if name in overrides:
+            return overrides[name]
+        return getattr(settings, name)
+
+
+# --- ESPACIO DE BÚSQUEDA ---
+
+def parse_values(spec):
+    """'5,9,12' -> [5, 9, 12] | '10:30:5' -> [10, 15, 20, 25, 30] (incluye el final)."""
+    def num(x):
+        return float(x) if any(c in x for c in '.eE') else int(x)
+
+    if ':' in spec:
+        start, stop, step = (num(x) for x in spec.split(':'))
+        count = int(math.floor((stop - start) / step + 1e-9)) + 1
+        return [round(start + i * step, 10) for i in range(count)]
+    return [num(x) for x in spec.split(',') if x.strip()]
+
+def grid(space):
+    """Todas las combinaciones del espacio {PARAM: [valores]}."""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+
+def random_sample(space, n, seed=None):
+    """n combinaciones distintas al azar (sin repetir) del mismo espacio."""
+    total = math.prod(len(v) for v in space.values())
+    if n >= total:
+        return grid(space)
+    rng = random.Random(seed)
+    names = list(space)
+    picked = set()
+    while len(picked) < n:
+        picked.add(tuple(rng.randrange(len(space[name])) for name in names))
+    return [{name: space[name][i] for name, i in zip(names, combo)} for combo in sorted(picked)]
+
+def validate_space(space):
+    unknown = [name for name in space if not hasattr(settings, name)]
+    if unknown:
+        raise ValueError(f"Parámetros desconocidos en Settings: {unknown}")
+
+
+# --- WORKERS (Memoria compartida + caché de indicadores) ---
+
+_worker = {}
+
+def _init_worker(shm_name, shape, strategy_mode, initial_balance, fee_rate):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)  # Vista: no se copia
+    _worker.clear()
+    _worker.update({
+        'shm': shm,  # Mantener la referencia viva mientras exista el proceso
+        'arrays': {name: data[i] for i, name in enumerate(OHLCV)},
+        'mode': strategy_mode,
+        'balance': initial_balance,
+        'fee': fee_rate,
+        'columns': {},   # ('EMA', 21) -> array (una EMA sirve para todos los RSI, etc.)
+        'signals': {},   # tupla de SIGNAL_PARAMS -> BatchSignals
+    })
+
+def _column(kind, length):
+    cache = _worker['columns']
+    key = (kind, length)
+    if key not in cache:
+        a = _worker['arrays']
+        if kind == 'EMA':
+            cache[key] = ema_array(a['close'], length)
+        elif kind == 'RSI':
+            cache[key] = rsi_array(a['close'], length)
+        else:
+            cache[key] = adx_array(a['high'], a['low'], a['close'], length)
+    return cache[key]
+
+def _signals(p):
+    key = tuple(getattr(p, name) for name in SIGNAL_PARAMS)
+    cache = _worker['signals']
+    if key not in cache:
+        ind = {
+            'close': _worker['arrays']['close'],
+            'ADX': _column('ADX', p.ADX_PERIOD),
+            'EMA_FAST': _column('EMA', p.EMA_FAST),
+            'EMA_SLOW': _column('EMA', p.EMA_SLOW),
+            'RSI': _column('RSI', p.RSI_LENGTH),
+            'EMA_FILTER': _column('EMA', p.RSI_EMA_FILTER),
+        }
+        if len(cache) > 256:
+            cache.clear()
+        cache[key] = TrendRangeStrategy(p).evaluate(ind, _worker['mode'])
+    return cache[key]
+
+def _evaluate_chunk(combos):
+    results = []
+    for combo in combos:
+        p = ParamSet(combo)
+        result = run_backtest(_worker['arrays'], params=p, strategy_mode=_worker['mode'],
+                              initial_balance=_worker['balance'], fee_rate=_worker['fee'],
+                              signals=_signals(p))
+        results.append((combo, result.stats()))
+    return results
+
+
+# --- ORQUESTADOR ---
+
+def _locality_key(combo):
+    # Ordenamos para que cada bloque comparta longitudes de indicadores (más aciertos de caché)
+    p = ParamSet(combo)
+    return tuple(getattr(p, name) for name in SIGNAL_PARAMS)
+
+def optimize(arrays, combos, strategy_mode=None, workers=None, initial_balance=DRY_RUN_BALANCE,
+             fee_rate=0.0, sort_by='total_pnl', progress=None):
+    """
+    Evalúa cada combinación con el backtest en un pool de procesos.
+    Las velas se publican una sola vez en memoria compartida.
+    Retorna lista de (combo, stats) ordenada de mejor a peor según `sort_by`.
+    """
+    workers = workers or os.cpu_count() or 1
+    data = np.ascontiguousarray(np.vstack([np.asarray(arrays[c], dtype=np.float64) for c in OHLCV]))
+
+    combos = sorted(combos, key=_locality_key)
+    chunk_size = max(1, math.ceil(len(combos) / (workers * 4)))
+    chunks = [combos[i:i + chunk_size] for i in range(0, len(combos), chunk_size)]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    try:
+        np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)[:] = data
+        del data
+
+        results = []
+        initargs = (shm.name, (len(OHLCV), len(arrays['close'])), strategy_mode, initial_balance, fee_rate)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            futures = [pool.submit(_evaluate_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                results.extend(future.result())
+                if progress:
+                    progress(len(results), len(combos))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # En drawdown "mejor" es el menos negativo; en el resto, el mayor
+    results.sort(key=lambda r: r[1][sort_by], reverse=True)
+    return results
+
+def write_results(results, path):
+    """Tabla CSV ranqueada: rank, parámetros, métricas."""
+    if not results:
+        return
+    param_names = list(results[0][0])
+    stat_names = list(results[0][1])
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank'] + param_names + stat_names)
+        for rank, (combo, stats) in enumerate(results, start=1):
+            writer.writerow([rank] + [combo[n] for n in param_names] + [stats[n] for n in stat_names])
@@ -0,0 +1,211 @@
+import collections
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import metrics
+
+# Prefijo de nuestros clientOrderId (Binance: máx. 36 caracteres [.A-Za-z0-9:/_-])
+CLIENT_PREFIX = "pz"
+
+STOP_MARKET = 'STOP_MARKET'
+TAKE_PROFIT_MARKET = 'TAKE_PROFIT_MARKET'
+
+
+def new_client_id(tag):
+    """ID propio por orden: permite reconocerla en el user-data stream y en reintentos."""
+    return f"{CLIENT_PREFIX}-{tag.lower()}-{int(time.time() * 1000) % 10**10}-{os.urandom(3).hex()}"
+
+
+class OrderManager:
+    """
+    Envío de órdenes con la menor ventana posible sin protección.
+
+    - SL y TP salen juntos en un solo batch (POST /fapi/v1/batchOrders vía
+      create_orders); si el exchange no lo soporta, en paralelo en dos hilos.
+    - El trailing REEMPLAZA el SL: primero crea el nuevo y después cancela el
+      viejo (por id), así la posición nunca queda sin stop y el TP no se toca.
+    - Cada orden lleva clientOrderId propio y se mide su ida y vuelta (RTT).
+    """
+
+    def __init__(self, exchange, position_cache=None, max_latencies=500):
+        self.exchange = exchange
+        self.position_cache = position_cache
+        self.orders = {}        # clientOrderId -> registro de la orden
+        self.protection = {}    # símbolo -> {'SL': clientOrderId, 'TP': clientOrderId}
+        self.latencies = collections.deque(maxlen=max_latencies)  # (acción, segundos)
+        self.last_rtt = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="orders")
+
+    # --- REGISTRO / LATENCIA ---
+
+    def _timed(self, action, func, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            rtt = time.perf_counter() - t0
+            with self._lock:
+                self.latencies.append((action, rtt))
+            self.last_rtt = rtt
+            metrics.observe(f"order_{action.lower()}", rtt)
+
+    def _track(self, client_id, symbol, kind, request, order, rtt):
+        record = {
+            'clientOrderId': client_id,
+            'id': str(order.get('id')) if order and order.get('id') is not None else None,
+            'symbol': symbol,
+            'kind': kind,
+            'type': request['type'],
+            'side': request['side'],
+            'stopPrice': request['params'].get('stopPrice'),
+            'status': (order or {}).get('status') or ('open' if order else 'rejected'),
+            'rtt': rtt,
+            'sent_at': time.time(),
+        }
+        with self._lock:
+            self.orders[client_id] = record
+        return record
+
+    def latency_stats(self, action=None):
+        """Percentiles de RTT (segundos) de las últimas órdenes."""
+        with self._lock:
+            samples = sorted(rtt for name, rtt in self.latencies if action is None or name == action)
+        if not samples:
+            return {'count': 0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+
+        def pct(q):
+            return samples[min(len(samples) - 1, int(q * len(samples)))]
+        return {'count': len(samples), 'p50': pct(0.5), 'p95': pct(0.95), 'max': samples[-1]}
+
+    # --- ÓRDENES ---
+
+    def _request(self, symbol, kind, order_type, side, amount=None, params=None):
+        client_id = new_client_id(kind)
+        params = dict(params or {})
+        params['newClientOrderId'] = client_id
+        return client_id, {'symbol': symbol, 'type': order_type, 'side': side,
+                           'amount': amount, 'price': None, 'params': params}
+
+    def _create(self, symbol, kind, request):
+        """Una orden suelta. Retorna (orden, rtt)."""
+        t0 = time.perf_counter()
+        order = self._timed(kind, self.exchange.create_order, symbol, request['type'],
+                            request['side'], request['amount'], request['price'], request['params'])
+        return order, time.perf_counter() - t0
+
+    def place_entry(self, symbol, side, quantity):
+        client_id, request = self._request(symbol, 'ENTRY', 'market', side, quantity)
+        order, rtt = self._create(symbol, 'ENTRY', request)
+        self._track(client_id, symbol, 'ENTRY', request, order, rtt)
+        return order
+
+    def _protection_request(self, symbol, kind, close_side, stop_price, quantity=None):
+        order_type = STOP_MARKET if kind == 'SL' else TAKE_PROFIT_MARKET
+        if quantity:
+            # Con cantidad explícita puede convivir con otro stop (necesario para reemplazar)
+            params = {'stopPrice': stop_price, 'reduceOnly': True}
+        else:
+            params = {'stopPrice': stop_price, 'closePosition': True}
+        return self._request(symbol, kind, order_type, close_side, quantity, params)
+
+    def _submit(self, symbol, kinds, requests):
+        """
+        Envía varias órdenes en una sola ida y vuelta (batch) o en paralelo.
+        Retorna dict tipo -> orden (None si falló) y el error del primer fallo.
+        """
+        results = {}
+        errors = []
+        if getattr(self.exchange, 'has', {}).get('createOrders'):
+            t0 = time.perf_counter()
+            try:
+                orders = self._timed('BATCH', self.exchange.create_orders,
+                                     [r for _, r in requests])
+            except Exception as e:
+                orders = [None] * len(requests)
+                errors.append(e)
+            rtt = time.perf_counter() - t0
+            for kind, (client_id, request), order in zip(kinds, requests, orders):
+                # Binance devuelve el error de cada orden dentro del batch
+                if order and order.get('id') is None:
+                    errors.append(Exception(order.get('info', {}).get('msg', 'orden rechazada en batch')))
+                    order = None
+                results[kind] = self._track(client_id, symbol, kind, request, order, rtt) if order else None
+        else:
+            futures = [(kind, client_id, request, self._pool.submit(self._create, symbol, kind, request))
+                       for kind, (client_id, request) in zip(kinds, requests)]
+            for kind, client_id, request, future in futures:
+                try:
+                    order, rtt = future.result()
+                    results[kind] = self._track(client_id, symbol, kind, request, order, rtt)
+                except Exception as e:
+                    results[kind] = None
+                    errors.append(e)
+
+        with self._lock:
+            book = self.protection.setdefault(symbol, {})
+            for kind, record in results.items():
+                if record:
+                    book[kind] = record['clientOrderId']
+        return results, (errors[0] if errors else None)
+
+    def place_protection(self, symbol, side, sl_price, tp_price):
+        """SL + TP de cierre total tras una entrada `side`, en una sola ida y vuelta."""
+        close_side = 'sell' if side == 'buy' else 'buy'
+        kinds = ('SL', 'TP')
+        requests = [self._protection_request(symbol, 'SL', close_side, sl_price),
+                    self._protection_request(symbol, 'TP', close_side, tp_price)]
+        return self._submit(symbol, kinds, requests)
+
+    def _current_stop(self, symbol):
+        """(id, clientOrderId) del SL vigente: primero lo que enviamos, si no el libro abierto."""
+        with self._lock:
+            client_id = self.protection.get(symbol, {}).get('SL')
+            record = self.orders.get(client_id) if client_id else None
+        if record and record['id']:
+            return record['id'], client_id
+
+        if self.position_cache is not None and self.position_cache.ready:
+            open_orders = self.position_cache.open_orders(symbol)
+        else:
+            open_orders = self._timed('FETCH_OPEN', self.exchange.fetch_open_orders, symbol)
+        for o in open_orders:
+            order_type = (o.get('type') or (o.get('info') or {}).get('type') or '').upper()
+            if order_type == STOP_MARKET:
+                return str(o['id']), o.get('clientOrderId')
+        return None, None
+
+    def replace_stop(self, symbol, new_sl_price, side, quantity=None):
+        """
+        Mueve el SL de una posición `side` a `new_sl_price` sin quedar desprotegido:
+        crea el nuevo stop (reduceOnly con la cantidad) y recién entonces cancela el anterior.
+        Sin cantidad conocida cae a cancelar + crear (closePosition), como antes.
+        """
+        close_side = 'sell' if side == 'buy' else 'buy'
+        old_id, old_client_id = self._current_stop(symbol)
+
+        if not quantity and old_id:
+            self._timed('CANCEL', self.exchange.cancel_order, old_id, symbol)
+            old_id = None
+
+        client_id, request = self._protection_request(symbol, 'SL', close_side, new_sl_price, quantity)
+        order, rtt = self._create(symbol, 'SL', request)
+        self._track(client_id, symbol, 'SL', request, order, rtt)
+        with self._lock:
+            self.protection.setdefault(symbol, {})['SL'] = client_id
+
+        if old_id:
+            try:
+                self._timed('CANCEL', self.exchange.cancel_order, old_id, symbol)
+                with self._lock:
+                    if old_client_id in self.orders:
+                        self.orders[old_client_id]['status'] = 'canceled'
+            except Exception as e:
+                # El stop viejo ya pudo ejecutarse o cancelarse: el nuevo queda vigente
+                print(f"[ORDERS] ⚠️ No se pudo cancelar el SL anterior {old_id}: {e}")
+        return order
+
+    def close(self):
+        self._pool.shutdown(wait=False)
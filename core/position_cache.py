@@ -0,0 +1,275 @@
+import asyncio
+import json
+import threading
+import time
+
+from config.settings import settings
+
+BINANCE_FUTURES_WS = "wss://fstream.binance.com"
+
+# Estados de orden que ya no están vivas en el libro
+_CLOSED_ORDER_STATUS = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH')
+
+
+def normalize_symbol(s):
+    """
+    --- FUNCIÓN DE LIMPIEZA (FILTRO NUCLEAR) ---
+    Convierte "SOL/USDT:USDT" -> "SOLUSDT"
+    Convierte "SOL/USDT" -> "SOLUSDT"
+    """
+    if not s: return ""
+    return s.replace("/", "").split(":")[0].upper()
+
+
+def position_from_ccxt(p):
+    """Pasa una posición de ccxt.fetch_positions al formato de get_position_details."""
+    raw_amt = p.get('contracts') or p.get('amount') or p.get('info', {}).get('positionAmt', 0)
+    amt = float(raw_amt or 0)
+    # ccxt devuelve 'contracts' siempre positivo: el signo sale de 'side'
+    if amt > 0 and p.get('side') == 'short':
+        amt = -amt
+    entry_price = p.get('entryPrice') or p.get('info', {}).get('entryPrice', 0)
+    return {
+        'symbol': p['symbol'],  # Devolvemos el símbolo real de Binance
+        'amt': amt,
+        'entryPrice': float(entry_price or 0),
+    }
+
+
+def fill_from_event(event):
+    """
+    Ejecución de un ORDER_TRADE_UPDATE (x == TRADE) en el formato de fill del
+    simulador: PnL realizado (rp) y comisión (n) de ESTA ejecución. None si no es un fill.
+    """
+    if event.get('e') != 'ORDER_TRADE_UPDATE':
+        return None
+    o = event['o']
+    if o.get('x') != 'TRADE':
+        return None
+    # Comisión en BNB (descuento) no se puede sumar a un PnL en USDT
+    fee = float(o.get('n') or 0) if o.get('N') in (None, 'USDT') else 0.0
+    return {'symbol': o['s'], 'order': {'id': str(o['i'])}, 'side': (o.get('S') or '').lower(),
+            'qty': float(o.get('l') or 0), 'price': float(o.get('L') or 0), 'fee': fee,
+            'realized_pnl': float(o.get('rp') or 0), 'reason': o.get('ot') or o.get('o'),
+            'position': None,  # La posición resultante llega aparte (ACCOUNT_UPDATE)
+            'timestamp': o.get('T') or event.get('E')}
+
+
+class PositionCache:
+    """
+    Posiciones y órdenes abiertas en memoria, indexadas por símbolo normalizado.
+
+    Se carga una vez por REST y luego se mantiene con los eventos del user-data
+    stream (ACCOUNT_UPDATE / ORDER_TRADE_UPDATE). Cada entrada se reemplaza
+    completa (nunca se muta), así una lectura nunca ve un registro a medias.
+    """
+
+    def __init__(self):
+        self._positions = {}
+        self._orders = {}         # símbolo -> {orderId: orden}
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._recording = []      # Un buffer por load() en curso (eventos a re-aplicar)
+        self.ready = False
+        self.updated_at = 0.0
+
+    # --- LECTURA (O(1), sin peso de API) ---
+
+    def get(self, symbol):
+        return self._positions.get(normalize_symbol(symbol))
+
+    def open_orders(self, symbol):
+        return list(self._orders.get(normalize_symbol(symbol), {}).values())
+
+    def add_listener(self, callback):
+        """`callback(evento)` tras aplicar cada evento del stream (desde su hilo)."""
+        self._listeners.append(callback)
+
+    # --- CARGA / RECONCILIACIÓN POR REST ---
+
+    def load(self, exchange, symbols=()):
+        """
+        Snapshot completo por REST. Reemplaza lo que haya en memoria.
+        Los eventos que llegan mientras se descarga son más nuevos que el
+        snapshot: se guardan y se vuelven a aplicar encima al reemplazarlo.
+        """
+        recorded = []
+        with self._lock:
+            self._recording.append(recorded)
+        try:
+            self._load(exchange, symbols, recorded)
+        finally:
+            with self._lock:
+                self._recording.remove(recorded)
+
+    def _load(self, exchange, symbols, recorded):
+        positions = {}
+        for p in exchange.fetch_positions():
+            pos = position_from_ccxt(p)
+            positions[normalize_symbol(pos['symbol'])] = pos
+
+        orders = {}
+        for symbol in symbols:
+            key = normalize_symbol(symbol)
+            orders[key] = {str(o['id']): {
+                'id': str(o['id']),
+                'clientOrderId': o.get('clientOrderId'),
+                'type': (o.get('type') or '').upper(),
+                'side': o.get('side'),
+                'status': 'NEW',
+                'stopPrice': float(o.get('stopPrice') or 0),
+            } for o in exchange.fetch_open_orders(symbol)}
+
+        with self._lock:
+            self._positions = positions
+            if symbols:
+                self._orders.update(orders)
+            for event in recorded:
+                self._apply(event)
+            self.ready = True
+            self.updated_at = time.time()
+
+    # --- EVENTOS DEL USER-DATA STREAM ---
+
+    def apply_event(self, event):
+        with self._lock:
+            if not self._apply(event):
+                return
+            for recorded in self._recording:
+                recorded.append(event)
+            self.updated_at = time.time()
+
+        for callback in self._listeners:
+            callback(event)
+
+    def _apply(self, event):
+        """Aplica el evento (con el lock tomado). False si no es de posiciones/órdenes."""
+        kind = event.get('e')
+        if kind == 'ACCOUNT_UPDATE':
+            for p in event.get('a', {}).get('P', []):
+                if p.get('ps', 'BOTH') != 'BOTH':
+                    continue  # El bot opera en modo one-way
+                key = normalize_symbol(p['s'])
+                previous = self._positions.get(key)
+                self._positions[key] = {
+                    'symbol': previous['symbol'] if previous else p['s'],
+                    'amt': float(p['pa']),
+                    'entryPrice': float(p['ep']),
+                }
+
+        elif kind == 'ORDER_TRADE_UPDATE':
+            o = event['o']
+            key = normalize_symbol(o['s'])
+            book = dict(self._orders.get(key, {}))
+            order_id = str(o['i'])
+            if o.get('X') in _CLOSED_ORDER_STATUS:
+                book.pop(order_id, None)
+            else:
+                book[order_id] = {
+                    'id': order_id,
+                    'clientOrderId': o.get('c'),
+                    'type': o.get('o'),
+                    'side': (o.get('S') or '').lower(),
+                    'status': o.get('X'),
+                    'stopPrice': float(o.get('sp') or 0),
+                }
+            self._orders[key] = book
+        else:
+            return False
+        return True
+
+
+class UserDataStream:
+    """
+    User-data stream de Binance Futures (listenKey + WebSocket).
+
+    Mantiene el PositionCache al día (y la AccountCache, si se la pasamos),
+    renueva el listenKey cada 30 minutos y reconcilia por REST al (re)conectar
+    y cada POSITION_RECONCILE_SECONDS.
+    """
+
+    KEEPALIVE_SECONDS = 30 * 60
+
+    def __init__(self, exchange, cache, symbols=(), base_url=None, account=None):
+        self.exchange = exchange
+        self.cache = cache
+        self.account = account
+        self.symbols = list(symbols)
+        self.base_url = (base_url or BINANCE_FUTURES_WS).rstrip('/')
+        self.reconcile_seconds = getattr(settings, 'POSITION_RECONCILE_SECONDS', 300)
+        self.connected = False
+        self._stopping = False
+
+    async def _new_listen_key(self):
+        response = await asyncio.to_thread(self.exchange.fapiPrivatePostListenKey)
+        return response['listenKey']
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self.KEEPALIVE_SECONDS)
+            try:
+                await asyncio.to_thread(self.exchange.fapiPrivatePutListenKey)
+            except Exception as e:
+                print(f"[USER WS] ⚠️ No se pudo renovar el listenKey: {e}")
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_seconds)
+            await self.reconcile()
+
+    async def reconcile(self):
+        if self.account is not None:
+            # Pudimos perder eventos de saldo: la próxima lectura va a la API
+            self.account.invalidate()
+        try:
+            await asyncio.to_thread(self.cache.load, self.exchange, self.symbols)
+        except Exception as e:
+            print(f"[USER WS] ⚠️ Reconciliación REST fallida: {e}")
+
+    async def run(self):
+        import aiohttp
+
+        reconciler = asyncio.create_task(self._reconcile_loop())
+        delay = 1
+        try:
+            async with aiohttp.ClientSession() as session:
+                while not self._stopping:
+                    keepalive = None
+                    try:
+                        listen_key = await self._new_listen_key()
+                        async with session.ws_connect(f"{self.base_url}/ws/{listen_key}", heartbeat=30) as ws:
+                            self.connected = True
+                            delay = 1
+                            keepalive = asyncio.create_task(self._keepalive())
+                            # Lo ocurrido mientras estábamos desconectados
+                            await self.reconcile()
+                            print("[USER WS] 🔌 User-data stream conectado")
+
+                            async for msg in ws:
+                                if msg.type == aiohttp.WSMsgType.TEXT:
+                                    event = json.loads(msg.data)
+                                    if event.get('e') == 'listenKeyExpired':
+                                        break
+                                    if self.account is not None:
+                                        self.account.apply_event(event)
+                                    self.cache.apply_event(event)
+                                elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                    break
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        print(f"[USER WS] ⚠️ Conexión perdida: {e}")
+                    finally:
+                        self.connected = False
+                        if keepalive:
+                            keepalive.cancel()
+
+                    if self._stopping:
+                        break
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30)
+        finally:
+            reconciler.cancel()
+
+    def stop(self):
+        self._stopping = True
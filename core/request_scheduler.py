@@ -0,0 +1,322 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config.settings import settings
+from utils.metrics import metrics
+
+# Carriles por prioridad (menor = más urgente)
+ORDER, ACCOUNT, DATA = 0, 1, 2
+LANE_NAMES = ("order", "account", "data")
+
+
+def klines_weight(limit):
+    """Peso de /fapi/v1/klines según el límite pedido (tabla oficial de Binance Futures)."""
+    if limit < 100: return 1
+    if limit < 500: return 2
+    if limit <= 1000: return 5
+    return 10
+
+def _ohlcv_weight(args, kwargs):
+    # fetch_ohlcv(symbol, timeframe, since, limit): sin límite Binance devuelve 500
+    limit = kwargs.get('limit', args[3] if len(args) > 3 else None)
+    return klines_weight(limit or 500)
+
+def _open_orders_weight(args, kwargs):
+    # Sin símbolo Binance cobra 40
+    return 1 if kwargs.get('symbol', args[0] if args else None) else 40
+
+# Método ccxt -> (carril, peso IP, se puede agrupar con una lectura idéntica en vuelo)
+ENDPOINTS = {
+    'create_order': (ORDER, 1, False),
+    'create_orders': (ORDER, 5, False),
+    'cancel_order': (ORDER, 1, False),
+    'cancel_all_orders': (ORDER, 1, False),
+    'edit_order': (ORDER, 1, False),
+    'fetch_order': (ORDER, 1, True),
+    'fetch_open_orders': (ACCOUNT, _open_orders_weight, True),
+    'fetch_positions': (ACCOUNT, 5, True),
+    'fetch_balance': (ACCOUNT, 5, True),
+    'fetch_my_trades': (ACCOUNT, 5, True),
+    'set_leverage': (ACCOUNT, 1, False),
+    'set_margin_mode': (ACCOUNT, 1, False),
+    'fapiPrivatePostListenKey': (ACCOUNT, 1, False),
+    'fapiPrivatePutListenKey': (ACCOUNT, 1, False),
+    'fetch_ohlcv': (DATA, _ohlcv_weight, True),
+    'fetch_ticker': (DATA, 1, True),
+    'fetch_tickers': (DATA, 40, True),
+    'fetch_time': (DATA, 1, True),
+    'load_markets': (DATA, 1, True),
+    'fapiPublicGetExchangeInfo': (DATA, 1, True),
+}
+
+# Órdenes nuevas que cuentan para el límite de órdenes de Binance
+_NEW_ORDERS = {'create_order': lambda args, kwargs: 1,
+               'create_orders': lambda args, kwargs: len(args[0]) if args else len(kwargs.get('orders', ()))}
+
+
+class RateLimitBackoff(Exception):
+    """Binance nos limitó (429) o baneó la IP (418) y una orden no puede esperar tanto."""
+
+
+# Cabeceras de la última respuesta HTTP de ESTE hilo / tarea asyncio. El cliente
+# ccxt se comparte entre hilos y su last_response_headers es uno solo.
+_response_headers = contextvars.ContextVar('response_headers', default=None)
+
+
+def _header(headers, name):
+    if not headers:
+        return None
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class RequestScheduler:
+    """
+    Punto único de paso de las peticiones REST a Binance (todas las llamadas ccxt).
+
+    - Peso usado: estimación local por minuto + X-MBX-USED-WEIGHT-1M de cada
+      respuesta (es el de toda la IP: también ve al escáner y a otras instancias).
+    - Prioridad: cada carril tiene su techo de peso. Los datos se frenan primero,
+      después las consultas de cuenta; las órdenes solo esperan al límite de órdenes
+      de Binance o a un baneo. Cada carril tiene sus propios hilos (run()), así que
+      una orden nunca hace cola detrás de una descarga de velas.
+    - Lecturas idénticas en vuelo (mismo carril, método y argumentos) se agrupan: el
+      segundo pedido espera la respuesta del primero en vez de pagar otro peso.
+    - 429/418: se respeta Retry-After y nadie vuelve a pedir hasta que pase.
+    """
+
+    def __init__(self, weight_limit=None, order_limit_10s=None, lane_budget=None):
+        self.weight_limit = weight_limit or settings.RATE_LIMIT_WEIGHT_PER_MINUTE
+        self.order_limit_10s = order_limit_10s or settings.RATE_LIMIT_ORDERS_10S
+        # Fracción del peso por minuto que puede alcanzar cada carril antes de esperar
+        self.lane_budget = lane_budget or settings.RATE_LIMIT_LANE_BUDGET
+
+        self.window = None        # Minuto (epoch // 60) de used_weight
+        self.used_weight = 0
+        self.order_window = None  # Ventana de 10 s de orders_10s
+        self.orders_10s = 0
+        self.banned_until = 0.0
+        self.coalesced = 0
+        self.waits = [0, 0, 0]
+
+        self._cond = threading.Condition()
+        self._inflight = {}
+        self._local = threading.local()
+        self._executors = [ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"rest-{name}")
+                           for name, workers in zip(LANE_NAMES, settings.RATE_LIMIT_LANE_WORKERS)]
+
+    # --- PRESUPUESTO ---
+
+    def _roll(self, now):
+        minute = int(now // 60)
+        if minute != self.window:
+            self.window, self.used_weight = minute, 0
+        window = int(now // 10)
+        if window != self.order_window:
+            self.order_window, self.orders_10s = window, 0
+
+    def _try_reserve(self, lane, weight, orders):
+        """Reserva el peso si hay presupuesto. Retorna 0 o los segundos a esperar."""
+        now = time.time()
+        with self._cond:
+            self._roll(now)
+            if now < self.banned_until:
+                return self.banned_until - now
+            if orders and self.orders_10s + orders > self.order_limit_10s:
+                return (self.order_window + 1) * 10 - now
+            if lane != ORDER and self.used_weight + weight > self.weight_limit * self.lane_budget[lane]:
+                return (self.window + 1) * 60 - now + 0.05
+            self.used_weight += weight
+            self.orders_10s += orders
+            return 0.0
+
+    def acquire(self, lane, weight, orders=0):
+        """Bloquea el hilo hasta poder enviar (las órdenes no esperan más de RATE_LIMIT_ORDER_MAX_WAIT)."""
+        waited = 0.0
+        while True:
+            delay = self._try_reserve(lane, weight, orders)
+            if not delay:
+                break
+            if lane == ORDER and waited + delay > settings.RATE_LIMIT_ORDER_MAX_WAIT:
+                raise RateLimitBackoff(f"Límite de Binance: reintentar en {delay:.0f}s")
+            if not waited:
+                self.waits[lane] += 1
+            with self._cond:
+                self._cond.wait(delay)
+            waited += delay
+        if waited:
+            metrics.observe(f"ratelimit_wait_{LANE_NAMES[lane]}", waited)
+
+    async def acquire_async(self, lane, weight, orders=0):
+        """Igual que acquire() para clientes asíncronos (escáner): espera sin bloquear el loop."""
+        while True:
+            delay = self._try_reserve(lane, weight, orders)
+            if not delay:
+                return
+            self.waits[lane] += 1
+            await asyncio.sleep(delay)
+
+    def observe(self, headers):
+        """Ajusta el peso usado con lo que informa Binance (X-MBX-USED-WEIGHT-1M)."""
+        used = _header(headers, 'x-mbx-used-weight-1m')
+        orders = _header(headers, 'x-mbx-order-count-10s')
+        with self._cond:
+            self._roll(time.time())
+            if used is not None:
+                self.used_weight = max(self.used_weight, int(used))
+            if orders is not None:
+                self.orders_10s = max(self.orders_10s, int(orders))
+
+    def backoff(self, error, headers):
+        """429 (límite) o 418 (IP baneada): nadie pide nada hasta que pase Retry-After."""
+        import ccxt
+        retry_after = _header(headers, 'retry-after')
+        if retry_after is not None:
+            seconds = float(retry_after)
+        else:
+            seconds = 60.0 if isinstance(error, ccxt.RateLimitExceeded) else settings.RATE_LIMIT_BAN_SECONDS
+        with self._cond:
+            self.banned_until = max(self.banned_until, time.time() + seconds)
+        kind = "429" if isinstance(error, ccxt.RateLimitExceeded) else "418"
+        print(f"[RATE] ⛔ Binance respondió {kind}: pausa de {seconds:.0f}s en todas las peticiones")
+
+    # --- LLAMADAS ---
+
+    def call(self, exchange, name, func, args, kwargs):
+        lane, weight, coalesce = ENDPOINTS[name]
+        # Lo que pide un hilo del carril de órdenes (balance previo a la entrada...) hereda su prioridad
+        lane = min(lane, getattr(self._local, 'lane', DATA))
+        if callable(weight):
+            weight = weight(args, kwargs)
+        orders = _NEW_ORDERS[name](args, kwargs) if name in _NEW_ORDERS else 0
+
+        key = None
+        if coalesce:
+            try:
+                # Con el carril en la clave una orden nunca se cuelga de una lectura
+                # de menor prioridad que todavía espera presupuesto en acquire()
+                key = (id(exchange), lane, name, args, tuple(sorted(kwargs.items())))
+                hash(key)
+            except TypeError:
+                key = None  # Argumentos no hasheables (params con dicts): sin agrupar
+
+        if key is not None:
+            with self._cond:
+                leader = self._inflight.get(key)
+                if leader is None:
+                    future = self._inflight[key] = Future()
+            if leader is not None:
+                self.coalesced += 1
+                return leader.result()
+
+        try:
+            self.acquire(lane, weight, orders)
+            _response_headers.set(None)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                import ccxt
+                if isinstance(e, ccxt.DDoSProtection):
+                    self.backoff(e, self.response_headers())
+                raise
+        except BaseException as e:
+            if key is not None:
+                self._release(key, future, error=e)
+            raise
+        if key is not None:
+            self._release(key, future, result=result)
+        return result
+
+    def _release(self, key, future, result=None, error=None):
+        with self._cond:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def track(self, exchange):
+        """
+        Engancha on_rest_response del cliente ccxt (síncrono o async): cada respuesta
+        actualiza el peso usado y queda como cabecera de su propio hilo / tarea.
+        """
+        original = exchange.on_rest_response
+
+        def on_rest_response(code, reason, url, method, response_headers, *args):
+            _response_headers.set(response_headers)
+            self.observe(response_headers)
+            return original(code, reason, url, method, response_headers, *args)
+        exchange.on_rest_response = on_rest_response
+        return exchange
+
+    @staticmethod
+    def response_headers():
+        """Cabeceras de la última respuesta recibida en este hilo / tarea (None si no hubo)."""
+        return _response_headers.get()
+
+    def wrap(self, exchange):
+        """Cliente ccxt síncrono que pasa por el planificador (el ritmo ya no lo pone ccxt)."""
+        if isinstance(exchange, ScheduledExchange):
+            return exchange
+        exchange.enableRateLimit = False
+        return ScheduledExchange(self.track(exchange), self)
+
+    def _run_in_lane(self, lane, func, *args, **kwargs):
+        self._local.lane = lane
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._local.lane = DATA
+
+    async def run(self, lane, func, *args, **kwargs):
+        """Como asyncio.to_thread pero en los hilos del carril (prioridad heredada por las llamadas)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executors[lane],
+                                          functools.partial(self._run_in_lane, lane, func, *args, **kwargs))
+
+    def stats(self):
+        now = time.time()
+        with self._cond:
+            self._roll(now)
+            return {'used_weight': self.used_weight, 'weight_limit': self.weight_limit,
+                    'orders_10s': self.orders_10s, 'banned_for': max(0.0, self.banned_until - now),
+                    'coalesced': self.coalesced, 'inflight': len(self._inflight),
+                    'waits': dict(zip(LANE_NAMES, self.waits))}
+
+    def close(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False)
+
+
+class ScheduledExchange:
+    """
+    Proxy del exchange ccxt: los métodos de ENDPOINTS pasan por el planificador,
+    todo lo demás (markets, milliseconds(), options...) va directo al objeto real.
+    """
+
+    def __init__(self, exchange, scheduler):
+        object.__setattr__(self, '_exchange', exchange)
+        object.__setattr__(self, '_scheduler', scheduler)
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if name not in ENDPOINTS or not callable(attr):
+            return attr
+        exchange, scheduler = self._exchange, self._scheduler
+
+        def scheduled(*args, **kwargs):
+            return scheduler.call(exchange, name, attr, args, kwargs)
+        return scheduled
+
+    def __setattr__(self, name, value):
+        setattr(self._exchange, name, value)
+
+
+# Planificador del proceso (como metrics / bot_state)
+scheduler = RequestScheduler()
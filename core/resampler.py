@@ -0,0 +1,178 @@
+import numpy as np
+from config.settings import settings
+from core.candle_store import CandleStore, COLUMNS, TS, OPEN, HIGH, LOW, CLOSE, VOLUME, timeframe_to_ms
+
+DAY_MS = 86_400_000
+
+
+def check_timeframe(base_timeframe, timeframe, base_capacity):
+    """Valida que `timeframe` se pueda armar con velas de `base_timeframe`."""
+    base_ms, tf_ms = timeframe_to_ms(base_timeframe), timeframe_to_ms(timeframe)
+    if tf_ms <= base_ms or tf_ms % base_ms:
+        raise ValueError(f"{timeframe} no es múltiplo de {base_timeframe}")
+    if DAY_MS % tf_ms:
+        # Binance alinea las velas a las 00:00 UTC: semanas/meses no caen en múltiplos del epoch
+        raise ValueError(f"Timeframe no soportado para remuestreo: {timeframe} (debe dividir 1d)")
+    if tf_ms // base_ms > base_capacity:
+        raise ValueError(f"{timeframe}: una vela necesita más de {base_capacity} velas de {base_timeframe}")
+
+
+def _merge(acc, bar):
+    """Suma una vela base al acumulado del bucket (None = bucket vacío)."""
+    if acc is None:
+        return list(bar)
+    return [acc[TS], acc[OPEN], max(acc[HIGH], bar[HIGH]), min(acc[LOW], bar[LOW]),
+            bar[CLOSE], acc[VOLUME] + bar[VOLUME]]
+
+
+class BarAggregator:
+    """
+    Arma las velas de un timeframe mayor a partir de las velas base, sin API.
+
+    Estado del bucket en curso: las velas base ya cerradas (acumuladas) y la
+    vela base viva aparte. Una revisión de la vela viva solo reemplaza esa
+    parte, así que cada tick cuesta O(1) por timeframe.
+    """
+
+    def __init__(self, store, base_ms):
+        self.store = store
+        self.tf_ms = store.timeframe_ms
+        self.base_ms = base_ms
+        self.reset()
+
+    def reset(self):
+        self.bucket = None    # Timestamp de apertura del bucket en curso
+        self.closed = None    # Acumulado de las velas base cerradas del bucket
+        self.last = None      # Vela base viva
+        self.hole = False     # Quedó un hueco en el store derivado (hay que resembrarlo)
+        self._generation = None
+        self._seen_total = 0
+
+    @property
+    def needs_seed(self):
+        return not len(self.store) or self.hole
+
+    def sync(self, base):
+        """Alimenta solo las velas base nuevas o revisadas. Retorna velas nuevas del timeframe mayor."""
+        if base.generation != self._generation:
+            # El feed base se resembró: reconstruimos desde su ventana
+            self.reset()
+            self._generation = base.generation
+
+        if not len(base):
+            return 0
+        if self.bucket is None:
+            rows = self._bulk(base.tail(len(base)))
+        else:
+            rows = self._step(base.tail(min(base.total - self._seen_total + 1, len(base))))
+        self._seen_total = base.total
+
+        if not len(rows):
+            return 0
+        last_ts = self.store.last_timestamp
+        if last_ts is not None and rows[0][TS] - last_ts > self.tf_ms:
+            self.hole = True
+        return self.store.ingest(rows)
+
+    def _bulk(self, bars):
+        """Ventana completa de una vez (arranque o resiembra del feed base)."""
+        ts = bars[TS]
+        buckets = ts - ts % self.tf_ms
+        opens = np.flatnonzero(ts == buckets)
+        if not len(opens):
+            return []
+        # El primer bucket incompleto de la ventana daría una vela falsa: empezamos en un límite
+        bars, buckets = bars[:, opens[0]:], buckets[opens[0]:]
+        n = bars.shape[1]
+
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        ends = np.concatenate((starts[1:], [n])) - 1
+        rows = np.empty((len(starts), len(COLUMNS)))
+        rows[:, TS] = buckets[starts]
+        rows[:, OPEN] = bars[OPEN, starts]
+        rows[:, HIGH] = np.maximum.reduceat(bars[HIGH], starts)
+        rows[:, LOW] = np.minimum.reduceat(bars[LOW], starts)
+        rows[:, CLOSE] = bars[CLOSE, ends]
+        rows[:, VOLUME] = np.add.reduceat(bars[VOLUME], starts)
+
+        # Estado del último bucket para seguir vela a vela
+        current = bars[:, starts[-1]:].T.tolist()
+        self.bucket = buckets[-1]
+        self.closed = None
+        for bar in current[:-1]:
+            self.closed = _merge(self.closed, bar)
+        self.last = current[-1]
+        return rows
+
+    def _step(self, bars):
+        rows = []
+        for bar in bars.T.tolist():
+            ts = bar[TS]
+            if ts < self.last[TS]:
+                continue
+            bucket = ts - ts % self.tf_ms
+            if bucket != self.bucket:
+                self.bucket, self.closed = bucket, None
+            elif ts != self.last[TS]:
+                # Cerró la vela base anterior: pasa al acumulado
+                self.closed = _merge(self.closed, self.last)
+            self.last = bar
+
+            row = _merge(self.closed, bar)
+            row[TS] = bucket
+            if rows and rows[-1][TS] == bucket:
+                rows[-1] = row
+            else:
+                rows.append(row)
+        return rows
+
+
+class Resampler:
+    """
+    Un solo feed de velas base (ej. 1m) -> N timeframes (5m, 15m, 1h, 4h...) en memoria.
+
+    El feed base es el único que se descarga o streamea. Los timeframes mayores
+    solo piden su histórico al arrancar (o si quedó un hueco); después se
+    actualizan con las velas base, sin llamadas extra a la API.
+    """
+
+    def __init__(self, base, timeframes, capacity=None):
+        self.base = base
+        self.stores = {base.timeframe: base}
+        self.aggregators = {}
+        for timeframe in timeframes:
+            if timeframe in self.stores:
+                continue
+            check_timeframe(base.timeframe, timeframe, base.capacity)
+            store = CandleStore(base.symbol, timeframe, capacity or settings.CANDLE_HISTORY)
+            self.stores[timeframe] = store
+            self.aggregators[timeframe] = BarAggregator(store, base.timeframe_ms)
+
+    def __getitem__(self, timeframe):
+        return self.stores[timeframe]
+
+    @property
+    def pending_seed(self):
+        """Timeframes derivados que necesitan su histórico (arranque o hueco)."""
+        return [tf for tf, aggregator in self.aggregators.items() if aggregator.needs_seed]
+
+    def sync(self):
+        """Propaga las velas base nuevas/revisadas a todos los timeframes. Retorna velas nuevas por timeframe."""
+        return {tf: aggregator.sync(self.base) for tf, aggregator in self.aggregators.items()}
+
+    def seed(self, exchange, timeframes=None):
+        """
+        Histórico propio de cada timeframe derivado (una petición por timeframe).
+        Se puede llamar desde otro hilo: solo descarga. Retorna {tf: velas}.
+        """
+        return {tf: exchange.fetch_ohlcv(self.base.symbol, tf, limit=self.stores[tf].capacity)
+                for tf in (self.pending_seed if timeframes is None else timeframes)}
+
+    def apply_seed(self, fetched):
+        """Carga lo que trajo seed() y reconstruye el bucket en curso desde el feed base."""
+        for tf, bars in fetched.items():
+            store, aggregator = self.stores[tf], self.aggregators[tf]
+            store.clear()
+            store.ingest(bars)
+            aggregator.reset()
+            aggregator.sync(self.base)
@@ -1,23 +1,72 @@
 import math
 from config.settings import settings
+from core.account_cache import AccountCache
 from core.execution import ExecutionEngine
+from core.market_index import DEFAULT_MIN_NOTIONAL, load_market_index
+
+def calculate_position_size(balance, stop_loss_pct, params=None, min_notional=None, leverage=None):
+    """
+    Tamaño de la posición (USDT nocional) según el riesgo por operación.
+    Retorna None si no hay capital suficiente para la orden mínima.
+    Compartido por RiskManager (live/dry-run) y el backtest.
+    `min_notional` sale del MarketIndex; sin él se usa el estándar de Binance con colchón.
+    `leverage`: el del símbolo en el exchange (AccountCache); nunca supera p.LEVERAGE.
+    """
+    p = params or settings
+    leverage = min(leverage, p.LEVERAGE) if leverage else p.LEVERAGE
+    if min_notional is None:
+        min_notional = DEFAULT_MIN_NOTIONAL * getattr(p, 'MIN_NOTIONAL_MARGIN', 1.2)
+
+    # Paso A: ¿Cuánto dinero estoy dispuesto a perder? (Ej. 1% de 1000 = $10)
+    risk_amount = balance * p.RISK_PER_TRADE
+
+    # Paso B: Calcular el tamaño de la posición (Notional Value)
+    # Fórmula: Tamaño = Dinero en Riesgo / % Distancia al Stop Loss
+    # Ej: $10 / 0.01 (1%) = $1000 de tamaño de posición.
+    target_size_usdt = risk_amount / stop_loss_pct
+
+    # Paso C: Límite de Apalancamiento (Safety Cap)
+    # No queremos exceder el apalancamiento configurado (ej. 5x)
+    max_position_size = balance * leverage
+
+    if target_size_usdt > max_position_size:
+        target_size_usdt = max_position_size
+
+    # Paso D: Suelo Mínimo de Binance
+    if target_size_usdt < min_notional:
+        # Si el cálculo da muy poco, forzamos el mínimo si tenemos margen
+        if (min_notional / leverage) <= balance:
+            target_size_usdt = min_notional
+        else:
+            return None
+
+    return target_size_usdt
 
 class RiskManager:
-    def __init__(self, exchange):
+    def __init__(self, exchange, markets=None, execution=None, account=None):
         self.exchange = exchange
-        self.execution = ExecutionEngine(exchange)
+        # Saldo en memoria: el motor comparte la suya (la invalidan los eventos de la cuenta)
+        self.account = account or AccountCache(exchange)
+        # El motor comparte su ExecutionEngine: así el SL que pone la entrada es el que mueve el trailing
+        self.execution = execution or ExecutionEngine(exchange)
+        # Metadatos de precisión/mínimos (se carga al primer uso si no nos lo pasan)
+        self.markets = markets
 
-    def _get_available_balance(self):
+    def _get_available_balance(self, max_age=None):
         """
-        Si es LIVE: Consulta el saldo real de USDT en Binance Futures.
-        Si es DRY_RUN: Devuelve un saldo virtual.
+        Si es LIVE: saldo real de USDT en Binance Futures (AccountCache: solo pide
+        la cuenta si la foto venció o un fill/transferencia la invalidó).
+        Si es DRY_RUN: saldo del simulador (o un saldo virtual fijo sin simulador).
         """
-        if not settings.IS_LIVE:
-            return 20.0  # 💰 SALDO VIRTUAL
+        if not self.execution.routes_orders:
+            return settings.DRY_RUN_BALANCE  # 💰 SALDO VIRTUAL
 
         try:
-            balance = self.exchange.fetch_balance()
-            return balance['USDT']['free']
+            free = self.account.free(max_age)
+            # Varias instancias en una cuenta: cada una opera solo con su presupuesto
+            if settings.RISK_BUDGET:
+                return min(free, settings.RISK_BUDGET)
+            return free
         except Exception as e:
             print(f"[RISK] Error leyendo balance: {e}")
             return 0.0
@@ -31,37 +80,25 @@ class RiskManager:
             return None
 
         # 2. CALCULAR TAMAÑO DE POSICIÓN BASADO EN RIESGO
-        # Paso A: ¿Cuánto dinero estoy dispuesto a perder? (Ej. 1% de 1000 = $10)
         risk_amount = balance * settings.RISK_PER_TRADE
-        
-        # Paso B: Calcular el tamaño de la posición (Notional Value)
-        # Fórmula: Tamaño = Dinero en Riesgo / % Distancia al Stop Loss
-        # Ej: $10 / 0.01 (1%) = $1000 de tamaño de posición.
-        target_size_usdt = risk_amount / stop_loss_pct
-
-        # Paso C: Límite de Apalancamiento (Safety Cap)
-        # No queremos exceder el apalancamiento configurado (ej. 5x)
-        max_position_size = balance * settings.LEVERAGE
-        
-        if target_size_usdt > max_position_size:
-            target_size_usdt = max_position_size
-            # print(f"[RISK] Tamaño limitado por apalancamiento máximo ({settings.LEVERAGE}x)")
-
-        # Paso D: Suelo Mínimo de Binance (Min Notional)
-        MIN_BINANCE_ORDER = 6.0 
-        if target_size_usdt < MIN_BINANCE_ORDER:
-            # Si el cálculo da muy poco, forzamos el mínimo si tenemos margen
-            if (MIN_BINANCE_ORDER / settings.LEVERAGE) <= balance:
-                target_size_usdt = MIN_BINANCE_ORDER
-            else:
-                print(f"[RISK] Capital insuficiente para la orden mínima de Binance.")
-                return None
+        min_notional = self._get_markets().min_order_notional(settings.SYMBOL)
+        # Con menos apalancamiento en el exchange que en settings el margen no alcanzaría
+        leverage = self.account.leverage(settings.SYMBOL)
+        target_size_usdt = calculate_position_size(balance, stop_loss_pct, min_notional=min_notional,
+                                                   leverage=leverage)
+
+        if target_size_usdt is None:
+            print("[RISK] Capital insuficiente para la orden mínima de Binance.")
+            return None
 
         # 3. Convertir USDT a Cantidad de Cripto
         quantity = target_size_usdt / current_price
         
         # 4. Normalizar cantidad
         quantity = self._normalize_quantity(quantity)
+        if not quantity:
+            print("[RISK] Cantidad por debajo del mínimo del mercado.")
+            return None
 
         # 5. Ejecutar
         print(f"[RISK] Balance: {balance:.2f} | Risk: ${risk_amount:.2f} | Size: {target_size_usdt:.2f} USDT")
@@ -72,6 +109,9 @@ class RiskManager:
         order = self.execution.place_entry_order(settings.SYMBOL, side, quantity, current_price)
         
         if order:
+            # La entrada ya usa margen: la próxima lectura va a la API (haya stream o no)
+            self.account.invalidate()
+
             # Calcular precios de TP/SL
             if side == 'buy':
                 sl_price = current_price * (1 - stop_loss_pct)
@@ -81,8 +121,8 @@ class RiskManager:
                 tp_price = current_price * (1 - take_profit_pct)
 
             # Normalizar precios
-            sl_price = self.exchange.price_to_precision(settings.SYMBOL, sl_price)
-            tp_price = self.exchange.price_to_precision(settings.SYMBOL, tp_price)
+            sl_price = self._normalize_price(sl_price)
+            tp_price = self._normalize_price(tp_price)
 
             # Ejecutar OCO (SL/TP)
             self.execution.place_oco_orders(settings.SYMBOL, side, quantity, current_price, sl_price, tp_price)
@@ -93,16 +133,29 @@ class RiskManager:
             
         return None
 
+    def _get_markets(self):
+        if self.markets is None:
+            self.markets = load_market_index(self.exchange)
+        return self.markets
+
     def _normalize_quantity(self, quantity):
-        # Cargar mercados si no están cargados (vital para cambiar de moneda)
-        if not self.exchange.markets:
-            self.exchange.load_markets()
-            
+        markets = self._get_markets()
+        # Símbolo nuevo (cambio de moneda): refrescamos el índice una vez
+        if settings.SYMBOL not in markets:
+            try:
+                markets.refresh(self.exchange)
+            except Exception as e:
+                print(f"[RISK] Error refrescando mercados: {e}")
+
         try:
-            # Usar la precisión específica de SOL/USDT definida por Binance
-            market = self.exchange.market(settings.SYMBOL)
-            return self.exchange.amount_to_precision(settings.SYMBOL, quantity)
-        except Exception as e:
-            print(f"[RISK] Error normalizando cantidad: {e}")
+            return markets.floor_quantity(settings.SYMBOL, quantity)
+        except KeyError:
+            print(f"[RISK] Sin metadatos de mercado para {settings.SYMBOL}")
             # Fallback seguro: 2 decimales para SOL (usualmente acepta 2 o 3)
-            return round(quantity, 2)
\ No newline at end of file
+            return round(quantity, 2)
+
+    def _normalize_price(self, price):
+        try:
+            return self._get_markets().round_price(settings.SYMBOL, price)
+        except KeyError:
+            return round(price, 2)
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from config.settings import settings
+from core.api_connector import exchange_config
+from core.candle_store import CandleStore
+from core.request_scheduler import DATA, klines_weight, scheduler
+from core.strategy import create_strategy
+
+
+class WeightLimiter:
+    """
+    Cubeta de tokens por peso de petición (ventana de 1 minuto de Binance).
+    Si no hay peso disponible, la corrutina espera en vez de arriesgar un 429.
+    """
+
+    def __init__(self, weight_per_minute):
+        self.capacity = float(weight_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight):
+        async with self._lock:
+            self._refill()
+            while self.tokens < weight:
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= weight
+
+
+class MarketScanner:
+    """
+    Escanea un watchlist en paralelo con ccxt.async_support.
+
+    Cada símbolo tiene su propio CandleStore (descarga incremental) y su propia
+    instancia de la estrategia (la histéresis de current_mode es por símbolo).
+    Un semáforo limita la concurrencia y un WeightLimiter reparte el presupuesto
+    propio del escáner; además cada petición pasa por el planificador del proceso
+    (carril de datos), que cede el peso a las órdenes y respeta los baneos.
+    """
+
+    def __init__(self, symbols, timeframe=None, concurrency=None, weight_per_minute=None):
+        self.symbols = list(dict.fromkeys(symbols))  # Sin duplicados, orden estable
+        self.timeframe = timeframe or settings.TIMEFRAME
+        self.concurrency = concurrency or getattr(settings, 'SCAN_CONCURRENCY', 10)
+        self.weight_per_minute = weight_per_minute or getattr(settings, 'SCAN_WEIGHT_PER_MINUTE', 1200)
+
+        self.stores = {s: CandleStore(s, self.timeframe) for s in self.symbols}
+        self.strategies = {s: create_strategy() for s in self.symbols}
+        self.errors = {}
+
+        self._loop = None
+        self._exchange = None
+        self._semaphore = None
+        self._limiter = None
+
+    async def _ensure_client(self):
+        if self._exchange is None:
+            import ccxt.async_support as ccxt_async
+            self._exchange = scheduler.track(ccxt_async.binance(exchange_config()))
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._limiter = WeightLimiter(self.weight_per_minute)
+        return self._exchange
+
+    async def _fetch(self, symbol):
+        store = self.stores[symbol]
+        exchange = self._exchange
+        async with self._semaphore:
+            since, limit = store.next_request(exchange.milliseconds())
+            weight = klines_weight(limit)
+            await self._limiter.acquire(weight)
+            await scheduler.acquire_async(DATA, weight)
+            # Cada _fetch es su propia tarea: las cabeceras que ve son las de su respuesta
+            try:
+                if since is None:
+                    bars = await exchange.fetch_ohlcv(symbol, self.timeframe, limit=limit)
+                    store.clear()
+                else:
+                    bars = await exchange.fetch_ohlcv(symbol, self.timeframe, since=since, limit=limit)
+            except Exception as e:
+                import ccxt
+                if isinstance(e, ccxt.DDoSProtection):
+                    scheduler.backoff(e, scheduler.response_headers())
+                raise
+        return store.ingest(bars)
+
+    async def scan_async(self):
+        """
+        Descarga todos los símbolos a la vez y analiza cada uno.
+        Retorna dict símbolo -> Analysis. Los símbolos que
+        fallan quedan fuera del resultado y su error queda en self.errors.
+        """
+        await self._ensure_client()
+        outcomes = await asyncio.gather(*(self._fetch(s) for s in self.symbols), return_exceptions=True)
+
+        results = {}
+        self.errors = {}
+        for symbol, outcome in zip(self.symbols, outcomes):
+            if isinstance(outcome, Exception):
+                self.errors[symbol] = outcome
+                continue
+            if not len(self.stores[symbol]):
+                continue
+            results[symbol] = self.strategies[symbol].analyze(self.stores[symbol])
+        return results
+
+    def scan(self):
+        """Versión síncrona para el bucle principal (mantiene un event loop propio)."""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.scan_async())
+
+    async def aclose(self):
+        """Cierre para cuando el escáner corre dentro de un event loop ajeno."""
+        if self._exchange is not None:
+            await self._exchange.close()
+            self._exchange = None
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._exchange is not None:
+            self._loop.run_until_complete(self._exchange.close())
+            self._exchange = None
+        self._loop.close()
+        self._loop = None
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from config.settings import settings
+from core.candle_store import COLUMNS
+
+# Cabecera (float64) antes de las velas
+SEQ, SIZE, TOTAL, GENERATION, REVISION, CAPACITY, MARK_PRICE, UPDATED_AT = range(8)
+HEADER = 8
+
+
+def feed_name(symbol, timeframe, owner=None):
+    """Nombre del bloque de memoria compartida (por supervisor: no choca con uno viejo)."""
+    return f"ptb_{owner or os.getpid()}_{symbol.upper()}_{timeframe}"
+
+
+def _attach(name):
+    """
+    Se adjunta al bloque del supervisor. Los lectores son hijos suyos (spawn) y
+    comparten su resource_tracker: el bloque lo libera solo el supervisor.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedFeedWriter:
+    """
+    Ventana de velas de un símbolo/timeframe publicada en memoria compartida.
+
+    Un solo escritor (el supervisor) y N lectores (las instancias). Protocolo
+    seqlock: la secuencia queda impar mientras se escribe y par al terminar;
+    el lector copia y reintenta si la secuencia cambió. Sin locks entre procesos.
+    """
+
+    def __init__(self, symbol, timeframe, capacity=None, name=None):
+        self.symbol = symbol.upper()
+        self.timeframe = timeframe
+        self.capacity = int(capacity or settings.CANDLE_HISTORY)
+        self.name = name or feed_name(symbol, timeframe)
+        size = (HEADER + len(COLUMNS) * self.capacity) * 8
+        self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self._array = np.ndarray(HEADER + len(COLUMNS) * self.capacity, dtype=np.float64, buffer=self._shm.buf)
+        self._array[:] = 0.0
+        self._array[CAPACITY] = self.capacity
+        self.meta = self._array[:HEADER]
+        self.data = self._array[HEADER:].reshape(len(COLUMNS), self.capacity)
+        self._revision = None
+
+    def publish(self, store, mark_price=None):
+        """Copia la ventana del CandleStore si cambió. Retorna True si publicó."""
+        if store.revision == self._revision and mark_price is None:
+            return False
+        window = store.tail(self.capacity)
+        size = window.shape[1]
+
+        meta = self.meta
+        meta[SEQ] += 1  # Impar: escritura en curso
+        self.data[:, :size] = window
+        meta[SIZE] = size
+        meta[TOTAL] = store.total
+        meta[GENERATION] = store.generation
+        meta[REVISION] = store.revision
+        if mark_price is not None:
+            meta[MARK_PRICE] = mark_price
+        meta[UPDATED_AT] = time.time()
+        meta[SEQ] += 1  # Par: listo para leer
+
+        self._revision = store.revision
+        return True
+
+    def close(self):
+        self.meta = self.data = self._array = None
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedFeedReader:
+    """
+    Lado de la instancia: trae al CandleStore local solo las velas nuevas o
+    revisadas del bloque compartido (misma idea que IndicatorEngine.sync).
+    """
+
+    def __init__(self, name, poll_seconds=None):
+        self.name = name
+        self.poll_seconds = poll_seconds or getattr(settings, 'FEED_POLL_SECONDS', 0.05)
+        self._shm = _attach(name)
+        capacity = int(np.ndarray(HEADER, dtype=np.float64, buffer=self._shm.buf)[CAPACITY])
+        self._array = np.ndarray(HEADER + len(COLUMNS) * capacity, dtype=np.float64, buffer=self._shm.buf)
+        self.meta = self._array[:HEADER]
+        self.data = self._array[HEADER:].reshape(len(COLUMNS), capacity)
+
+        self.mark_price = 0.0
+        self.updated_at = 0.0
+        self._seq = None
+        self._total = None
+        self._generation = None
+
+    @property
+    def changed(self):
+        return self.meta[SEQ] != self._seq
+
+    async def wait(self, timeout):
+        """Espera (sondeo barato sobre la cabecera) a que el escritor publique algo."""
+        deadline = time.monotonic() + timeout
+        while not self.changed and time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_seconds)
+        return self.changed
+
+    def _read(self):
+        """Copia consistente (meta, velas) o None si el escritor aún no publicó."""
+        while True:
+            seq = self.meta[SEQ]
+            if seq == 0:
+                return None
+            if seq % 2:
+                time.sleep(0)  # Escritura en curso: cedemos y reintentamos
+                continue
+            meta = self.meta.copy()
+            bars = self.data[:, :int(meta[SIZE])].copy()
+            if self.meta[SEQ] == seq:
+                return meta, bars
+
+    def sync(self, store):
+        """Actualiza `store`. Retorna velas nuevas agregadas."""
+        snapshot = self._read()
+        if snapshot is None:
+            return 0
+        meta, bars = snapshot
+        self._seq = meta[SEQ]
+        self.mark_price = float(meta[MARK_PRICE])
+        self.updated_at = float(meta[UPDATED_AT])
+
+        total, generation = int(meta[TOTAL]), int(meta[GENERATION])
+        if generation != self._generation or self._total is None or not len(store):
+            # Primera lectura o el escritor resembró: copiamos la ventana completa
+            store.clear()
+            pending = bars.shape[1]
+        else:
+            # Velas nuevas + la última que ya teníamos (pudo revisarse)
+            pending = min(total - self._total + 1, bars.shape[1])
+        self._total, self._generation = total, generation
+        return store.ingest(bars[:, bars.shape[1] - pending:].T)
+
+    def close(self):
+        self.meta = self.data = self._array = None
+        self._shm.close()
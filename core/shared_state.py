@@ -1,36 +1,96 @@
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 
+
+class StateSnapshot:
+    """
+    Foto inmutable del estado del bot en un instante.
+
+    El motor la arma entera y la publica reemplazando una sola referencia
+    (asignación atómica): quien la lee (Telegram, métricas, dashboards) ve
+    siempre los campos de la MISMA actualización, sin locks ni contención.
+    """
+
+    __slots__ = ('version', 'published_at', 'symbol', 'mode', 'uptime', 'strategy_mode',
+                 'last_price', 'mark_price', 'strategy_name', 'rsi', 'adx',
+                 'daily_pnl', 'balance_total',
+                 'in_position', 'pos_type', 'entry_price', 'current_pnl_pct')
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StateSnapshot es inmutable: publicar una nueva con bot_state.publish()")
+
+    def __delattr__(self, name):
+        raise AttributeError("StateSnapshot es inmutable")
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"StateSnapshot(v{self.version}, {self.symbol}, {self.pos_type if self.in_position else 'FLAT'}, {self.last_price})"
+
+
 @dataclass
 class BotState:
+    """
+    Estado de trabajo del motor (solo lo escribe el event loop, campo por campo).
+    Los lectores de otros hilos usan `bot_state.snapshot`, no estos campos.
+    Excepción: strategy_mode y running son órdenes que llegan DESDE Telegram.
+    """
     # Información General
     symbol: str = "SOL/USDT"
     mode: str = "INIT"
     uptime: datetime = datetime.now()
-    
+
     # Controlar modo de BOT
     strategy_mode: str = "AUTO"
 
     # Datos de Mercado en tiempo real
     last_price: float = 0.0
+    mark_price: float = 0.0
     strategy_name: str = "ESPERANDO DATOS..."
-    
+
     # Indicadores (Para el comando /analizar)
     rsi: float = 0.0
     adx: float = 0.0
-    
+
     # Estado de la Cuenta
     daily_pnl: float = 0.0
     balance_total: float = 0.0
-    
+
     # Posición Actual
     in_position: bool = False
     pos_type: str = "NONE" # LONG o SHORT
     entry_price: float = 0.0
     current_pnl_pct: float = 0.0
-    
+
     # Control
     running: bool = True  # Para apagar el bot remotamente
 
+    # Última foto publicada (lectura sin locks desde cualquier hilo)
+    snapshot: StateSnapshot = field(default=None, init=False, repr=False, compare=False)
+    version: int = field(default=0, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.publish()
+
+    def publish(self):
+        """
+        Congela el estado actual en una StateSnapshot nueva y la publica.
+        Un solo escritor (el event loop): el contador de versión no necesita lock.
+        """
+        self.version += 1
+        values = {name: getattr(self, name) for name in _SNAPSHOT_FIELDS}
+        self.snapshot = StateSnapshot(version=self.version, published_at=time.time(), **values)
+        return self.snapshot
+
+
+_SNAPSHOT_FIELDS = tuple(f.name for f in fields(BotState)
+                         if f.name in StateSnapshot.__slots__ and f.name != 'version')
+
 # Instancia global que compartiremos
-bot_state = BotState()
\ No newline at end of file
+bot_state = BotState()
@@ -0,0 +1,10 @@
+"""
+Modos de Strategy y códigos de señal.
+
+Viven aparte de core.kernels (que importa numba y carga el código compilado)
+para que importarlos no cueste el arranque: los kernels se cargan recién al usarlos.
+"""
+
+MODE_AUTO, MODE_TREND, MODE_RANGE = 0, 1, -1
+MODES = {"FORCE_TREND": MODE_TREND, "FORCE_RANGE": MODE_RANGE}
+LONG, SHORT = 1, -1
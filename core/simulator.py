@@ -0,0 +1,440 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from config.settings import settings
+from core.position_cache import normalize_symbol
+
+# Tipos de orden condicional que soporta el simulador (los que usa el bot)
+STOP_MARKET = 'STOP_MARKET'
+TAKE_PROFIT_MARKET = 'TAKE_PROFIT_MARKET'
+TRIGGER_TYPES = (STOP_MARKET, TAKE_PROFIT_MARKET)
+
+
+class SimulatorError(Exception):
+    pass
+
+class InsufficientFunds(SimulatorError):
+    pass
+
+class OrderNotFound(SimulatorError):
+    pass
+
+
+def slipped_price(side, price, slippage):
+    """Precio de ejecución a mercado: la compra paga más, la venta recibe menos."""
+    return price * (1 + slippage) if side == 'buy' else price * (1 - slippage)
+
+def triggered(order_type, side, prices, stop_price):
+    """
+    ¿Se dispara la orden condicional con este/estos precio(s)? (escalar o array)
+    STOP_MARKET de venta / TAKE_PROFIT_MARKET de compra: precio <= stop.
+    STOP_MARKET de compra / TAKE_PROFIT_MARKET de venta: precio >= stop.
+    """
+    falling = (order_type == STOP_MARKET) == (side == 'sell')
+    return prices <= stop_price if falling else prices >= stop_price
+
+
+class SimulatedExchange:
+    """
+    Exchange local con la misma interfaz que el objeto ccxt que usa el bot
+    (create_order, fetch_balance, fetch_positions, fetch_open_orders,
+    cancel_order, cancel_all_orders, set_leverage).
+
+    Modela comisiones, deslizamiento (fijo en bps + fracción del rango de la
+    vela), órdenes STOP_MARKET / TAKE_PROFIT_MARKET, margen cruzado (el wallet
+    más el PnL no realizado de todas las posiciones respalda a cada una, con
+    apalancamiento por símbolo) y saldo. Los datos de mercado (fetch_ohlcv, markets...) se delegan al
+    exchange real si se le pasa uno. Los precios entran por on_price() (tick a
+    tick) o process_ticks() (arrays, vectorizado).
+    """
+
+    simulated = True
+    # Capacidades como ccxt: el OrderManager usa el batch igual que contra Binance
+    has = {'createOrders': True, 'editOrder': False, 'fetchPositions': True}
+
+    # Nunca se delegan al exchange real: en dry-run no puede salir una orden de verdad
+    _TRADING_PREFIXES = ('create', 'cancel', 'edit', 'fapiPrivate', 'private')
+
+    def __init__(self, market_data=None, balance=None, fee_rate=None, slippage_bps=None,
+                 range_slippage=None, leverage=None):
+        self.market_data = market_data
+        self.wallet = float(balance if balance is not None else getattr(settings, 'DRY_RUN_BALANCE', 20.0))
+        self.fee_rate = fee_rate if fee_rate is not None else getattr(settings, 'SIM_FEE_RATE', 0.0004)
+        bps = slippage_bps if slippage_bps is not None else getattr(settings, 'SIM_SLIPPAGE_BPS', 0.0)
+        self.slippage = bps / 10000.0
+        self.range_slippage = range_slippage if range_slippage is not None else getattr(settings, 'SIM_RANGE_SLIPPAGE', 0.0)
+        self.default_leverage = leverage or settings.LEVERAGE
+
+        self.leverage = {}     # símbolo -> apalancamiento
+        self.positions = {}    # símbolo -> {'symbol', 'amt', 'entryPrice'}
+        self.orders = {}       # símbolo -> {id: orden condicional abierta}
+        self.last_price = {}
+        self.bar_range = {}    # símbolo -> high - low de la última vela (deslizamiento)
+        self.realized_pnl = 0.0
+        self.fees_paid = 0.0
+        self.fills = 0
+        self.now_ms = None     # Reloj simulado (backtest); None = reloj real
+
+        self._next_id = 1
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    def __getattr__(self, name):
+        # Todo lo que no es de trading (velas, mercados, exchangeInfo...) va al exchange real
+        market_data = self.__dict__.get('market_data')
+        if market_data is None or name.startswith('_') or name.startswith(self._TRADING_PREFIXES):
+            raise AttributeError(name)
+        return getattr(market_data, name)
+
+    def add_listener(self, callback):
+        """`callback(fill)` tras cada ejecución (desde el hilo que la provocó)."""
+        self._listeners.append(callback)
+
+    def milliseconds(self):
+        if self.now_ms is not None:
+            return int(self.now_ms)
+        if self.market_data is not None:
+            return self.market_data.milliseconds()
+        return int(time.time() * 1000)
+
+    # --- CUENTA ---
+
+    def _unrealized(self):
+        total = 0.0
+        for key, pos in self.positions.items():
+            price = self.last_price.get(key, pos['entryPrice'])
+            total += (price - pos['entryPrice']) * pos['amt']
+        return total
+
+    def _used_margin(self, exclude=None):
+        used = 0.0
+        for key, pos in self.positions.items():
+            if key == exclude:
+                continue
+            price = self.last_price.get(key, pos['entryPrice'])
+            used += abs(pos['amt']) * price / self.leverage.get(key, self.default_leverage)
+        return used
+
+    def fetch_balance(self, params=None):
+        with self._lock:
+            total = self.wallet + self._unrealized()
+            used = self._used_margin()
+        usdt = {'free': total - used, 'used': used, 'total': total}
+        return {'USDT': usdt, 'free': {'USDT': usdt['free']}, 'used': {'USDT': used},
+                'total': {'USDT': total}, 'info': {'walletBalance': self.wallet}}
+
+    def set_leverage(self, leverage, symbol=None, params=None):
+        with self._lock:
+            self.leverage[normalize_symbol(symbol)] = int(leverage)
+        return {'leverage': int(leverage), 'symbol': symbol}
+
+    def fetch_positions(self, symbols=None, params=None):
+        wanted = {normalize_symbol(s) for s in symbols} if symbols else None
+        result = []
+        with self._lock:
+            for key, pos in self.positions.items():
+                if pos['amt'] == 0 or (wanted and key not in wanted):
+                    continue
+                price = self.last_price.get(key, pos['entryPrice'])
+                result.append({
+                    'symbol': pos['symbol'],
+                    'contracts': abs(pos['amt']),
+                    'side': 'long' if pos['amt'] > 0 else 'short',
+                    'entryPrice': pos['entryPrice'],
+                    'markPrice': price,
+                    'unrealizedPnl': (price - pos['entryPrice']) * pos['amt'],
+                    'leverage': self.leverage.get(key, self.default_leverage),
+                    'info': {'positionAmt': str(pos['amt']), 'entryPrice': str(pos['entryPrice'])},
+                })
+        return result
+
+    # --- ÓRDENES ---
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        with self._lock:
+            if symbol is None:
+                return [dict(o) for book in self.orders.values() for o in book.values()]
+            return [dict(o) for o in self.orders.get(normalize_symbol(symbol), {}).values()]
+
+    def cancel_order(self, id, symbol=None, params=None):
+        with self._lock:
+            for key, book in self.orders.items():
+                if symbol is not None and key != normalize_symbol(symbol):
+                    continue
+                order = book.pop(str(id), None)
+                if order:
+                    order['status'] = 'canceled'
+                    return order
+        raise OrderNotFound(f"Orden {id} no encontrada")
+
+    def cancel_all_orders(self, symbol=None, params=None):
+        with self._lock:
+            keys = [normalize_symbol(symbol)] if symbol else list(self.orders)
+            canceled = []
+            for key in keys:
+                for order in self.orders.pop(key, {}).values():
+                    order['status'] = 'canceled'
+                    canceled.append(order)
+        return canceled
+
+    def _new_order(self, symbol, order_type, side, amount, params):
+        with self._lock:
+            order_id = self._next_id
+            self._next_id += 1
+        return {
+            'id': str(order_id),
+            'clientOrderId': params.get('clientOrderId') or params.get('newClientOrderId'),
+            'symbol': symbol,
+            'type': order_type,
+            'side': side,
+            'amount': amount,
+            'filled': 0.0,
+            'average': None,
+            'price': None,
+            'stopPrice': float(params['stopPrice']) if params.get('stopPrice') is not None else None,
+            'reduceOnly': bool(params.get('reduceOnly') or params.get('closePosition')),
+            'closePosition': bool(params.get('closePosition')),
+            'status': 'open',
+            'timestamp': self.milliseconds(),
+            'fee': None,
+        }
+
+    def create_order(self, symbol, type, side, amount=None, price=None, params=None):
+        params = dict(params or {})
+        order_type = type.upper()
+        side = side.lower()
+        key = normalize_symbol(symbol)
+        amount = float(amount) if amount is not None else None
+
+        if order_type in TRIGGER_TYPES:
+            if params.get('stopPrice') is None:
+                raise SimulatorError(f"{order_type} requiere stopPrice")
+            if amount is None and not params.get('closePosition'):
+                raise SimulatorError(f"{order_type} requiere amount o closePosition")
+            order = self._new_order(symbol, order_type, side, amount, params)
+            with self._lock:
+                self.orders.setdefault(key, {})[order['id']] = order
+            return dict(order)
+
+        if order_type != 'MARKET':
+            raise SimulatorError(f"Tipo de orden no soportado por el simulador: {type}")
+        if not amount:
+            raise SimulatorError("Orden a mercado sin cantidad")
+
+        with self._lock:
+            last = self.last_price.get(key, price)
+            if last is None:
+                raise SimulatorError(f"Sin precio para {symbol}: alimentar on_price() antes de operar")
+            order = self._new_order(symbol, 'market', side, amount, params)
+            fill = self._fill(key, symbol, order, last, 'MARKET')
+        self._emit(fill)
+        return order
+
+    def create_orders(self, orders, params=None):
+        """Batch como /fapi/v1/batchOrders: un error por orden no aborta las demás."""
+        results = []
+        for o in orders:
+            try:
+                results.append(self.create_order(o['symbol'], o['type'], o['side'], o.get('amount'),
+                                                 o.get('price'), o.get('params')))
+            except SimulatorError as e:
+                results.append({'id': None, 'status': 'rejected', 'info': {'msg': str(e)}})
+        return results
+
+    # --- MOTOR DE EJECUCIÓN ---
+
+    def _slippage_for(self, key, price):
+        return self.slippage + self.range_slippage * self.bar_range.get(key, 0.0) / price
+
+    def _fill(self, key, symbol, order, price, reason):
+        """Ejecuta `order` a `price` (+ deslizamiento). Llamar con el lock tomado."""
+        pos = self.positions.get(key) or {'symbol': symbol, 'amt': 0.0, 'entryPrice': 0.0}
+        amt = pos['amt']
+        sign = 1.0 if order['side'] == 'buy' else -1.0
+
+        qty = order['amount']
+        if order['reduceOnly']:
+            # Solo puede reducir: nunca abre ni da vuelta la posición
+            if amt == 0 or (amt > 0) == (sign > 0):
+                order['status'] = 'expired'
+                return None
+            qty = abs(amt) if order['closePosition'] or qty is None else min(qty, abs(amt))
+
+        fill_price = slipped_price(order['side'], price, self._slippage_for(key, price))
+        delta = sign * qty
+        new_amt = amt + delta
+
+        # Margen: solo se valida lo que aumenta la exposición
+        if abs(new_amt) > abs(amt):
+            lev = self.leverage.get(key, self.default_leverage)
+            required = abs(new_amt) * fill_price / lev
+            available = self.wallet + self._unrealized() - self._used_margin(exclude=key)
+            if required > available:
+                order['status'] = 'rejected'
+                raise InsufficientFunds(f"Margen insuficiente: requiere {required:.2f}, disponible {available:.2f}")
+
+        realized = 0.0
+        if amt != 0 and (amt > 0) != (delta > 0):
+            closed = min(abs(delta), abs(amt))
+            realized = (fill_price - pos['entryPrice']) * closed * (1.0 if amt > 0 else -1.0)
+
+        if new_amt == 0:
+            entry = 0.0
+        elif amt == 0 or (amt > 0) != (new_amt > 0):
+            entry = fill_price  # Posición nueva o vuelta de lado
+        elif abs(new_amt) > abs(amt):
+            entry = (pos['entryPrice'] * abs(amt) + fill_price * abs(delta)) / abs(new_amt)
+        else:
+            entry = pos['entryPrice']
+
+        fee = qty * fill_price * self.fee_rate
+        self.wallet += realized - fee
+        self.realized_pnl += realized
+        self.fees_paid += fee
+        self.fills += 1
+        self.positions[key] = {'symbol': pos['symbol'], 'amt': new_amt, 'entryPrice': entry}
+
+        order.update({'filled': qty, 'amount': qty, 'average': fill_price, 'price': fill_price,
+                      'status': 'closed', 'fee': {'cost': fee, 'currency': 'USDT'}})
+
+        if new_amt == 0:
+            # Sin posición, los SL/TP de cierre quedan huérfanos: se cancelan
+            for oid, o in list(self.orders.get(key, {}).items()):
+                if o['reduceOnly']:
+                    del self.orders[key][oid]
+
+        return {'symbol': symbol, 'order': dict(order), 'side': order['side'], 'qty': qty,
+                'price': fill_price, 'fee': fee, 'realized_pnl': realized, 'reason': reason,
+                'position': new_amt, 'timestamp': self.milliseconds()}
+
+    def _emit(self, fill):
+        if fill is None:
+            return
+        for callback in self._listeners:
+            callback(fill)
+
+    def _trigger(self, key, price, prev_price=None):
+        """
+        Dispara las órdenes condicionales alcanzadas por `price`. SL antes que TP.
+        Si el precio venía del otro lado del stop (movimiento continuo) se ejecuta
+        en el stop; si ya lo había saltado (gap / primer tick) al precio del tick.
+        """
+        book = self.orders.get(key)
+        if not book:
+            return []
+        hits = [o for o in book.values() if triggered(o['type'], o['side'], price, o['stopPrice'])]
+        hits.sort(key=lambda o: o['type'] != STOP_MARKET)
+        fills = []
+        for order in hits:
+            if book.pop(order['id'], None) is None:
+                continue  # Cancelada por un fill anterior en este mismo tick
+            crossed = prev_price is not None and not triggered(order['type'], order['side'], prev_price, order['stopPrice'])
+            fill_at = order['stopPrice'] if crossed else price
+            try:
+                fills.append(self._fill(key, order['symbol'], order, fill_at, order['type']))
+            except InsufficientFunds as e:
+                print(f"[SIM] Orden {order['id']} rechazada al dispararse: {e}")
+        return fills
+
+    def on_price(self, symbol, price, timestamp=None, bar_range=None, gap=False):
+        """
+        Un tick de precio: actualiza el último precio y ejecuta lo que se dispare.
+        `gap=True` si el precio saltó hasta aquí (apertura de vela): se ejecuta al tick.
+        """
+        key = normalize_symbol(symbol)
+        with self._lock:
+            if timestamp is not None:
+                self.now_ms = timestamp
+            if bar_range is not None:
+                self.bar_range[key] = bar_range
+            prev_price = None if gap else self.last_price.get(key)
+            self.last_price[key] = price
+            fills = self._trigger(key, price, prev_price)
+        for fill in fills:
+            self._emit(fill)
+        return [f for f in fills if f]
+
+    def process_ticks(self, symbol, prices, timestamps=None):
+        """
+        Versión vectorizada para millones de ticks: con NumPy busca el primer tick
+        que dispara alguna orden, ejecuta y sigue desde ahí. Sin órdenes abiertas
+        el costo no depende de la cantidad de ticks.
+        """
+        key = normalize_symbol(symbol)
+        prices = np.asarray(prices, dtype=np.float64)
+        n = len(prices)
+        if not n:
+            return []
+
+        fills = []
+        start = 0
+        while start < n:
+            with self._lock:
+                book = list(self.orders.get(key, {}).values())
+            first = n
+            window = prices[start:]
+            for order in book:
+                hit = triggered(order['type'], order['side'], window, order['stopPrice'])
+                if hit.any():
+                    first = min(first, start + int(np.argmax(hit)))
+            if first == n:
+                break
+            ts = None if timestamps is None else int(timestamps[first])
+            if first > 0:
+                with self._lock:
+                    self.last_price[key] = float(prices[first - 1])
+            fills.extend(self.on_price(symbol, float(prices[first]), ts))
+            start = first + 1
+
+        with self._lock:
+            self.last_price[key] = float(prices[-1])
+            if timestamps is not None:
+                self.now_ms = int(timestamps[-1])
+        return fills
+
+    # --- PERSISTENCIA (dry-run entre reinicios) ---
+
+    def state(self):
+        with self._lock:
+            return {
+                'wallet': self.wallet,
+                'realized_pnl': self.realized_pnl,
+                'fees_paid': self.fees_paid,
+                'leverage': dict(self.leverage),
+                'positions': {k: dict(p) for k, p in self.positions.items() if p['amt'] != 0},
+                'orders': {k: {oid: dict(o) for oid, o in book.items()} for k, book in self.orders.items() if book},
+                'next_id': self._next_id,
+            }
+
+    def restore(self, state):
+        with self._lock:
+            self.wallet = float(state['wallet'])
+            self.realized_pnl = float(state.get('realized_pnl', 0.0))
+            self.fees_paid = float(state.get('fees_paid', 0.0))
+            self.leverage = dict(state.get('leverage', {}))
+            self.positions = {k: dict(p) for k, p in state.get('positions', {}).items()}
+            self.orders = {k: dict(book) for k, book in state.get('orders', {}).items()}
+            self._next_id = int(state.get('next_id', 1))
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        state = self.state()
+        with self._lock:
+            tmp = f"{path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+
+    def load(self, path):
+        """Restaura el estado guardado. Retorna False si no había archivo."""
+        try:
+            with open(path) as f:
+                self.restore(json.load(f))
+        except FileNotFoundError:
+            return False
+        return True
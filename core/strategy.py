@@ -1,120 +1,232 @@
-import pandas as pd
-import pandas_ta as ta
+import importlib
+import time
+
+import numpy as np
 from config.settings import settings
+from core.signal_codes import LONG, SHORT, MODES, MODE_AUTO
 from core.shared_state import bot_state
+from core.indicators import IndicatorEngine, compute_indicators
+from utils.metrics import metrics
+
+SIDES = {LONG: "LONG", SHORT: "SHORT"}
+
+
+# --- TIPOS QUE DEVUELVEN LAS ESTRATEGIAS ---
+
+class Signal:
+    """Entrada propuesta: lado, SL/TP (fracción del precio de entrada) y motivo."""
+    __slots__ = ('side', 'sl_pct', 'tp_pct', 'reason')
+
+    def __init__(self, side, sl_pct, tp_pct, reason):
+        self.side = side        # "LONG" / "SHORT"
+        self.sl_pct = sl_pct
+        self.tp_pct = tp_pct
+        self.reason = reason    # Para el diario y Telegram
+
+    def __repr__(self):
+        return f"Signal({self.side}, SL {self.sl_pct:.2%}, TP {self.tp_pct:.2%}, {self.reason})"
+
+
+class Analysis:
+    """
+    Resultado de analizar la última vela.
+    regime: sub-estrategia activa (ej. "TREND"); el motor avisa cuando cambia.
+    label: texto para /status. values: indicadores de la última vela (telemetría).
+    """
+    __slots__ = ('signal', 'regime', 'label', 'values')
+
+    def __init__(self, signal, regime, label, values=None):
+        self.signal = signal
+        self.regime = regime
+        self.label = label
+        self.values = values or {}
+
+
+class BatchSignals:
+    """
+    Señales de muchas velas (o símbolos x velas) de una vez, alineadas con la entrada:
+      - side: int8 (1 = LONG, -1 = SHORT, 0 = nada)
+      - sl_pct / tp_pct: float64 (NaN donde no hay señal)
+      - regime: int8, índice en `regimes` (nombres de los regímenes de la estrategia)
+    """
+    __slots__ = ('side', 'sl_pct', 'tp_pct', 'regime', 'regimes')
+
+    def __init__(self, side, sl_pct, tp_pct, regime, regimes):
+        self.side = side
+        self.sl_pct = sl_pct
+        self.tp_pct = tp_pct
+        self.regime = regime
+        self.regimes = regimes
+
+
+WAITING = Analysis(None, "WAITING_DATA", "WAITING_DATA")
+
+
+# --- REGISTRO DE ESTRATEGIAS ---
+
+STRATEGIES = {}
+
+def register_strategy(cls):
+    """Decorador: deja la estrategia disponible por su `name` (settings.STRATEGY)."""
+    STRATEGIES[cls.name] = cls
+    return cls
+
+def create_strategy(name=None, params=None):
+    """Instancia la estrategia `name` (por defecto settings.STRATEGY)."""
+    for module in settings.STRATEGY_PLUGINS:
+        importlib.import_module(module)  # Cada módulo se registra con @register_strategy
+    name = name or settings.STRATEGY
+    if name not in STRATEGIES:
+        raise ValueError(f"Estrategia desconocida: {name} (disponibles: {', '.join(sorted(STRATEGIES))})")
+    return STRATEGIES[name](params)
+
+
+class BaseStrategy:
+    """
+    Interfaz de una estrategia. Dos contratos:
+      - analyze(): en vivo, incremental, una vela por vez -> Analysis.
+      - evaluate(): por lotes sobre arrays de compute() -> BatchSignals.
+        Arrays (n,) = histórico de un símbolo; (símbolos, n) = varios a la vez.
+    Ambos deben dar la misma señal para la misma vela (backtest == vivo).
+    """
+
+    name = None
+    regimes = ("DEFAULT",)
+
+    def __init__(self, params=None):
+        self.params = params
+        # Timeframes mayores (ej. '4h'): mismos indicadores sobre las velas del Resampler
+        self.frames = {}
 
-class Strategy:
-    def __init__(self):
+    @property
+    def p(self):
+        # Sin params fijos leemos settings en cada llamada (Telegram puede cambiarlos)
+        return self.params or settings
+
+    def analyze(self, candles, frames=None):
+        raise NotImplementedError
+
+    def compute(self, arrays):
+        """Columnas que necesita evaluate() a partir de arrays OHLCV."""
+        return compute_indicators(arrays, self.p)
+
+    def evaluate(self, ind, strategy_mode=None):
+        raise NotImplementedError
+
+    def _sync_frames(self, frames):
+        for timeframe, store in (frames or {}).items():
+            engine = self.frames.get(timeframe)
+            if engine is None:
+                engine = self.frames[timeframe] = IndicatorEngine(self.params)
+            engine.sync(store)
+
+    def frame(self, timeframe, closed=True):
+        """
+        Indicadores de un timeframe mayor alineados con la vela actual.
+        closed=True: los de su última vela CERRADA (sin mirar el futuro, igual que
+        en un backtest); closed=False: los de su vela en curso. None si no hay datos.
+        """
+        engine = self.frames.get(timeframe)
+        if engine is None:
+            return None
+        return engine.prev_values if closed else engine.values
+
+
+# --- ESTRATEGIA INCLUIDA: TENDENCIA (EMA) / RANGO (RSI) CON HISTÉRESIS DE ADX ---
+
+@register_strategy
+class TrendRangeStrategy(BaseStrategy):
+    name = "trend_range"
+    regimes = ("RANGE", "TREND")  # Índice = is_trend
+
+    def __init__(self, params=None):
+        super().__init__(params)
         # Inicializamos en RANGE por seguridad
         # (Se sobrescribirá inmediatamente si usas FORCE_TREND)
         self.current_mode = "RANGE"
 
-    def analyze(self, df):
+        # Indicadores incrementales (O(1) por vela, no recalcula el histórico)
+        self.indicators = IndicatorEngine(params)
+
+    def analyze(self, candles, frames=None):
         """
         Analiza el mercado y decide qué estrategia usar basado en STRATEGY_MODE y ADX.
-        Retorna: (Señal, Nombre_Estrategia)
+        Recibe el CandleStore del símbolo: solo procesa las velas nuevas o revisadas.
+        `frames`: {timeframe: CandleStore} de timeframes mayores (ver frame()).
         """
+        p = self.p
         # --- 1. CALCULO DE INDICADORES ---
-        # ADX
-        adx_period = getattr(settings, 'ADX_PERIOD', 14)
-        adx_df = df.ta.adx(length=adx_period)
-        
-        # Validación de datos
-        if adx_df is None or adx_df.empty: return None, "WAITING_DATA"
-        
-        # Asignar columna ADX
-        df['ADX'] = adx_df[f'ADX_{adx_period}']
-
-        # EMAs (Tendencia)
-        df['EMA_FAST'] = df.ta.ema(length=settings.EMA_FAST)
-        df['EMA_SLOW'] = df.ta.ema(length=settings.EMA_SLOW)
-
-        # RSI + EMA (Rango)
-        df['RSI'] = df.ta.rsi(length=settings.RSI_LENGTH)
-        df['EMA_FILTER'] = df.ta.ema(length=settings.RSI_EMA_FILTER)
-
-        # Limpieza básica
-        df.dropna(inplace=True)
-        if len(df) < 2: return None, "WAITING_DATA"
-
-        last = df.iloc[-1]
-        prev = df.iloc[-2]
+        t0 = time.perf_counter()
+        self.indicators.sync(candles)
+        self._sync_frames(frames)
+        t_decision = time.perf_counter()
+        metrics.observe("indicators", t_decision - t0)
+
+        # Validación de datos (equivalente al dropna + mínimo 2 filas)
+        if not self.indicators.ready: return WAITING
+
+        last = self.indicators.values
+        prev = self.indicators.prev_values
         adx_value = last['ADX']
 
         # --- 2. SELECCIÓN DE MODO (EL INTERRUPTOR MAESTRO) ---
-        
+
         # Leemos el modo de la memoria
-        mode_settings = bot_state.strategy_mode
-        
-        mode_to_use = None
-
-        if mode_setting == "FORCE_TREND":
-            mode_to_use = "TREND"
-            
-        elif mode_setting == "FORCE_RANGE":
-            mode_to_use = "RANGE"
-            
-        else:
-            # === MODO AUTO (TU LÓGICA DE HISTÉRESIS) ===
-            
-            # 1. Romper hacia arriba: Entrar a Trend
-            if adx_value >= settings.ADX_THRESHOLD:
-                self.current_mode = "TREND"
-            
-            # 2. Romper hacia abajo: Volver a Range solo si baja del buffer
-            elif adx_value < (settings.ADX_THRESHOLD - 2):
-                self.current_mode = "RANGE"
-            
-            # Si estamos en zona muerta (18-20), mantenemos el modo anterior
-            mode_to_use = self.current_mode
+        mode_code = MODES.get(bot_state.strategy_mode, MODE_AUTO)
+
+        # FORCE_* ignora el ADX. En AUTO: histéresis (zona muerta 18-20 mantiene el modo anterior)
+        from core import kernels  # numba: se carga al primer análisis, no al importar
+        is_trend = kernels.regime(mode_code, self.current_mode == "TREND", adx_value, float(p.ADX_THRESHOLD))
+        if mode_code == MODE_AUTO:
+            self.current_mode = "TREND" if is_trend else "RANGE"
 
         # --- 3. EJECUCIÓN DE LA ESTRATEGIA ACTIVA ---
-        
+        # TREND: cruce de EMAs. RANGE: RSI + filtro EMA (misma regla compilada que el backtest)
+        regime = self.regimes[is_trend]
+        # Etiqueta visual para saber si es forzado o natural
+        suffix = "(FORCED)" if mode_code != MODE_AUTO else f"(ADX {adx_value:.1f})"
+        label = f"{regime} {suffix}"
+
+        code = kernels.rule(is_trend, last['close'], last['EMA_FAST'], last['EMA_SLOW'],
+                            prev['EMA_FAST'], prev['EMA_SLOW'], last['RSI'], last['EMA_FILTER'],
+                            float(p.RSI_LONG_THRESHOLD), float(p.RSI_SHORT_THRESHOLD))
         signal = None
-        strategy_name = "WAITING..."
-
-        if mode_to_use == "TREND":
-            # === MODO TENDENCIA (EMA CROSS) ===
-            # Etiqueta visual para saber si es forzado o natural
-            suffix = "(FORCED)" if mode_setting == "FORCE_TREND" else f"(ADX {adx_value:.1f})"
-            strategy_name = f"TREND {suffix}"
-            
-            signal = self._check_ema_cross(last, prev)
-
-        else:
-            # === MODO RANGO (RSI + EMA) ===
-            suffix = "(FORCED)" if mode_setting == "FORCE_RANGE" else f"(ADX {adx_value:.1f})"
-            strategy_name = f"RANGE {suffix}"
-            
-            signal = self._check_rsi_reversion(last)
-
-        # Retornamos TUPLA para compatibilidad con tu main.py actual
-        return signal, strategy_name
-
-    def _check_ema_cross(self, last, prev):
-        """Estrategia 1: Cruce de EMAs"""
-        # Cruce Alcista
-        if prev['EMA_FAST'] <= prev['EMA_SLOW'] and last['EMA_FAST'] > last['EMA_SLOW']:
-            return "LONG"
-        
-        # Cruce Bajista
-        if prev['EMA_FAST'] >= prev['EMA_SLOW'] and last['EMA_FAST'] < last['EMA_SLOW']:
-            return "SHORT"
-            
-        return None
-
-    def _check_rsi_reversion(self, last):
-        """Estrategia 2: RSI + EMA Filter"""
-        rsi = last['RSI']
-        price = last['close']
-        ema_filter = last['EMA_FILTER']
-
-        # Lógica LONG
-        if rsi < settings.RSI_LONG_THRESHOLD and price > ema_filter:
-            return "LONG"
-        
-        # Lógica SHORT
-        if rsi > settings.RSI_SHORT_THRESHOLD and price < ema_filter:
-            return "SHORT"
-            
-        return None
\ No newline at end of file
+        if code:
+            sl_pct, tp_pct = (p.TREND_SL, p.TREND_TP) if is_trend else (p.RANGE_SL, p.RANGE_TP)
+            signal = Signal(SIDES[code], sl_pct, tp_pct, label)
+
+        metrics.observe("decision", time.perf_counter() - t_decision)
+        return Analysis(signal, regime, label, last)
+
+    def evaluate(self, ind, strategy_mode=None):
+        """Las mismas reglas que analyze() sobre todo el histórico (o varios símbolos) de una vez."""
+        p = self.p
+        signal, is_trend = vector_signals(ind, strategy_mode, p)
+
+        active = signal != 0
+        sl_pct = np.where(active, np.where(is_trend, p.TREND_SL, p.RANGE_SL), np.nan)
+        tp_pct = np.where(active, np.where(is_trend, p.TREND_TP, p.RANGE_TP), np.nan)
+        return BatchSignals(signal, sl_pct, tp_pct, is_trend.astype(np.int8), self.regimes)
+
+
+# --- VERSIÓN VECTORIZADA (Backtest / Optimizador) ---
+
+def vector_signals(ind, strategy_mode=None, params=None):
+    """
+    Aplica las mismas reglas que TrendRangeStrategy.analyze() a TODO el histórico de una vez.
+    `ind` es el dict de compute_indicators() (arrays alineados por vela); con
+    arrays (símbolos, velas) evalúa todas las filas en una sola llamada al kernel.
+    Retorna (signal, is_trend), con la forma de la entrada:
+      - signal: int8 por vela (1 = LONG, -1 = SHORT, 0 = nada)
+      - is_trend: bool por vela (True si la vela se evaluó en modo TREND)
+    """
+    from core import kernels
+
+    p = params or settings
+    mode_setting = strategy_mode or settings.STRATEGY_MODE
+    c = kernels.contiguous
+    kernel = kernels.signals_2d if np.ndim(ind['close']) == 2 else kernels.signals
+    return kernel(c(ind['close']), c(ind['ADX']), c(ind['EMA_FAST']), c(ind['EMA_SLOW']),
+                           c(ind['RSI']), c(ind['EMA_FILTER']),
+                           MODES.get(mode_setting, MODE_AUTO), float(p.ADX_THRESHOLD),
+                           float(p.RSI_LONG_THRESHOLD), float(p.RSI_SHORT_THRESHOLD))
@@ -0,0 +1,382 @@
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+from config.settings import settings
+
+# Campos de cada instancia en config/instances.json
+INSTANCE_KEYS = ('name', 'symbol', 'timeframe', 'mode', 'account', 'budget', 'params')
+MODES = ("LIVE", "DRY_RUN")
+MAX_BACKOFF = 300
+
+
+# --- CONFIGURACIÓN ---
+
+def load_instances(path):
+    """
+    Lee y valida las instancias. Formato:
+        {"instances": [{"name": "sol-trend", "symbol": "SOLUSDT", "timeframe": "1h",
+                        "mode": "DRY_RUN", "account": "main", "budget": 50,
+                        "params": {"STRATEGY_MODE": "FORCE_TREND", "EMA_FAST": 9}}]}
+    """
+    with open(path) as f:
+        raw = json.load(f)
+    instances = raw.get('instances', []) if isinstance(raw, dict) else raw
+    if not instances:
+        raise ValueError(f"{path}: sin instancias")
+
+    names = set()
+    live_slots = set()
+    for inst in instances:
+        unknown = [k for k in inst if k not in INSTANCE_KEYS]
+        if unknown:
+            raise ValueError(f"Instancia {inst.get('name')}: campos desconocidos {unknown}")
+        name = inst.get('name')
+        if not name or not str(name).replace('-', '').replace('_', '').isalnum():
+            raise ValueError(f"Nombre de instancia inválido: {name!r} (letras, números, - y _)")
+        if name in names:
+            raise ValueError(f"Instancia repetida: {name}")
+        names.add(name)
+
+        inst['symbol'] = inst.get('symbol', settings.SYMBOL).replace("/", "").upper()
+        inst['timeframe'] = inst.get('timeframe', settings.TIMEFRAME)
+        inst['mode'] = inst.get('mode', settings.TRADING_MODE).upper()
+        inst['params'] = dict(inst.get('params') or {})
+        if inst['mode'] not in MODES:
+            raise ValueError(f"Instancia {name}: mode debe ser uno de {MODES}")
+
+        bad = [k for k in inst['params'] if not hasattr(settings, k) or k in _MANAGED]
+        if bad:
+            raise ValueError(f"Instancia {name}: parámetros inválidos o administrados por el supervisor: {bad}")
+
+        if inst['mode'] == "LIVE":
+            # Binance (modo one-way) tiene UNA posición neta por símbolo y cuenta
+            slot = (inst.get('account'), inst['symbol'])
+            if slot in live_slots:
+                raise ValueError(f"Instancia {name}: otra instancia LIVE ya opera {inst['symbol']} en esa cuenta")
+            live_slots.add(slot)
+            if inst.get('account'):
+                for var in _credential_vars(inst['account']):
+                    if not os.getenv(var):
+                        raise ValueError(f"Instancia {name}: falta la variable de entorno {var}")
+    return instances
+
+
+def _credential_vars(account):
+    suffix = account.upper().replace('-', '_')
+    return f"BINANCE_API_KEY_{suffix}", f"BINANCE_SECRET_KEY_{suffix}"
+
+
+# Los fija el supervisor: no se pueden pisar desde "params"
+_MANAGED = ('SYMBOL', 'TIMEFRAME', 'BASE_TIMEFRAME', 'TRADING_MODE', 'WATCHLIST', 'MARKET_STREAM', 'OHLCV_ARCHIVE',
+            'JOURNAL_PATH', 'SIM_STATE_PATH', 'METRICS_PORT', 'RISK_BUDGET')
+
+
+def instance_overrides(inst, index):
+    """Settings propios de la instancia (cada una corre en su proceso: no se pisan)."""
+    state_dir = os.path.join(settings.SUPERVISOR_STATE_DIR, inst['name'])
+    overrides = {
+        'SYMBOL': inst['symbol'],
+        'TIMEFRAME': inst['timeframe'],
+        'BASE_TIMEFRAME': None,  # El feed compartido ya es el de su timeframe
+        'TRADING_MODE': inst['mode'],
+        # Datos de mercado: solo por la memoria compartida del supervisor
+        'WATCHLIST': [],
+        'MARKET_STREAM': False,
+        'OHLCV_ARCHIVE': False,
+        'JOURNAL_PATH': os.path.join(state_dir, "journal.db"),
+        'SIM_STATE_PATH': os.path.join(state_dir, "simulator.json"),
+        'METRICS_PORT': settings.METRICS_PORT + 1 + index,
+        'RISK_BUDGET': inst.get('budget'),
+    }
+    if inst.get('budget') and inst['mode'] != "LIVE":
+        overrides['DRY_RUN_BALANCE'] = float(inst['budget'])
+    overrides.update(inst['params'])
+    return overrides
+
+
+# --- PROCESO DE CADA INSTANCIA ---
+
+def run_instance(inst, index, feed, stop_event, messages):
+    """Punto de entrada del proceso hijo: un TradingEngine con su configuración."""
+    name = inst['name']
+    # Ctrl+C llega a todo el grupo de procesos: el apagado lo coordina el supervisor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for key, value in instance_overrides(inst, index).items():
+        setattr(settings, key, value)
+    if inst.get('account'):
+        api_var, secret_var = _credential_vars(inst['account'])
+        os.environ['BINANCE_API_KEY'] = os.environ[api_var]
+        os.environ['BINANCE_SECRET_KEY'] = os.environ[secret_var]
+    os.makedirs(os.path.dirname(settings.JOURNAL_PATH), exist_ok=True)
+
+    # Imports después de fijar settings: todo lo que se construye ya ve esta instancia
+    from utils.telegram_bot import set_message_sink
+    from core.engine import TradingEngine
+    from core.shared_feed import SharedFeedReader
+    from core.shared_state import bot_state
+
+    set_message_sink(lambda text: messages.put((name, text)))
+
+    def watch_stop():
+        stop_event.wait()
+        bot_state.running = False  # Lo recoge el watchdog del motor
+    threading.Thread(target=watch_stop, name="supervisor-stop", daemon=True).start()
+
+    print(f"[{name}] ▶️ {inst['symbol']} {inst['timeframe']} ({inst['mode']}) PID {os.getpid()}")
+    engine = TradingEngine(feed=SharedFeedReader(feed))
+    asyncio.run(engine.run())
+    # El motor también termina ante un error crítico: sin pedido de parada es una caída
+    sys.exit(0 if stop_event.is_set() else 1)
+
+
+# --- SUPERVISOR ---
+
+class Supervisor:
+    """
+    Corre N instancias (símbolo x timeframe x parámetros x cuenta) en procesos
+    separados con UN solo feed de mercado: el supervisor descarga las velas
+    (WebSocket + REST incremental) y las publica en memoria compartida; las
+    instancias no piden velas a la API.
+
+    Cada instancia tiene su presupuesto de riesgo, diario y estado. Si un proceso
+    cae, se reinicia con backoff exponencial sin tocar a los demás.
+    """
+
+    def __init__(self, instances):
+        self.instances = instances
+        self.capacity = max(int(inst['params'].get('CANDLE_HISTORY', settings.CANDLE_HISTORY))
+                            for inst in instances)
+        self.feed_keys = sorted({(inst['symbol'], inst['timeframe']) for inst in instances})
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop_event = self._ctx.Event()
+        self._messages = self._ctx.Queue()
+        self.exchange = None
+        self.stores = {}
+        self.feeds = {}
+        self.archives = {}
+        self.streams = []
+        self.workers = {inst['name']: {'inst': inst, 'index': i, 'process': None, 'restart_at': 0.0,
+                                       'failures': collections.deque(), 'gave_up': False}
+                        for i, inst in enumerate(instances)}
+        self._stopped = None
+        self._forwarder = None
+        self._tasks = []
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+    def notify(self, text):
+        from utils.telegram_bot import send_message
+        send_message(text)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except NotImplementedError:
+                pass
+
+        try:
+            await self._setup()
+            for name in self.workers:
+                self._start(name)
+            self._forwarder = threading.Thread(target=self._forward_messages, name="supervisor-messages", daemon=True)
+            self._forwarder.start()
+
+            timeframes = collections.defaultdict(list)
+            for symbol, timeframe in self.feed_keys:
+                timeframes[timeframe].append(symbol)
+            for timeframe, symbols in timeframes.items():
+                self._tasks.append(asyncio.create_task(self._guard(f"feed {timeframe}", self._feed(timeframe, symbols))))
+            self._tasks.append(asyncio.create_task(self._guard("monitor", self._monitor())))
+
+            self.notify(f"🧭 <b>Supervisor iniciado</b>: {len(self.workers)} instancias, "
+                        f"{len(self.feed_keys)} feeds compartidos")
+            await self._stopped.wait()
+        finally:
+            await self._shutdown()
+
+    async def _guard(self, name, coro):
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"CRITICAL ERROR (supervisor {name}): {e}")
+            self.notify(f"🚨 <b>ERROR CRÍTICO (supervisor {name}):</b> {e}")
+            self.stop()
+
+    async def _setup(self):
+        from core.api_connector import BinanceConnector
+        from core.candle_store import CandleStore
+        from core.market_index import load_market_index
+        from core.ohlcv_archive import OHLCVArchive
+        from core.shared_feed import SharedFeedWriter, feed_name
+
+        # Mercados y snapshot frescos en disco: las instancias arrancan desde ahí sin load_markets
+        connector = await asyncio.to_thread(BinanceConnector, False)
+        self.exchange = connector.get_exchange()
+        await asyncio.to_thread(load_market_index, self.exchange)
+
+        for symbol, timeframe in self.feed_keys:
+            key = (symbol, timeframe)
+            store = CandleStore(symbol, timeframe, self.capacity)
+            if settings.OHLCV_ARCHIVE:
+                self.archives[key] = OHLCVArchive(symbol, timeframe)
+                self.archives[key].warm(store)
+            # Semilla antes de lanzar instancias: arrancan con la ventana completa
+            store.apply(await asyncio.to_thread(store.fetch, self.exchange))
+            self.stores[key] = store
+            self.feeds[key] = SharedFeedWriter(symbol, timeframe, self.capacity, feed_name(symbol, timeframe))
+            self.feeds[key].publish(store)
+            print(f"[SUPERVISOR] 📡 Feed {symbol} {timeframe}: {len(store)} velas")
+
+    # --- FEED COMPARTIDO ---
+
+    async def _feed(self, timeframe, symbols):
+        from core.market_stream import MarketStream
+
+        stream = None
+        wake = asyncio.Event()
+        if settings.MARKET_STREAM:
+            loop = asyncio.get_running_loop()
+            stream = MarketStream(symbols, timeframe)
+            stream.add_listener(lambda: loop.call_soon_threadsafe(wake.set))
+            self.streams.append(stream)
+            self._tasks.append(asyncio.create_task(self._guard(f"stream {timeframe}", stream.run())))
+
+        while True:
+            if stream:
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=settings.REST_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+                update = stream.drain()
+            else:
+                await asyncio.sleep(60)
+                update = None
+
+            for symbol in symbols:
+                key = (symbol, timeframe)
+                store = self.stores[key]
+                try:
+                    if update is None or update.backfill:
+                        store.apply(await asyncio.to_thread(store.fetch, self.exchange))
+                    if update is not None:
+                        store.ingest(update.klines.get(symbol))
+                except Exception as e:
+                    print(f"[SUPERVISOR] Error actualizando {symbol} {timeframe}: {e}")
+                    continue
+
+                mark = update.mark_prices.get(symbol) if update is not None else None
+                self.feeds[key].publish(store, mark)
+                if key in self.archives:
+                    try:
+                        self.archives[key].archive_closed(store)
+                    except (OSError, ValueError) as e:
+                        print(f"[ARCHIVE] ⚠️ No se pudo guardar velas de {symbol}: {e}")
+
+    # --- INSTANCIAS ---
+
+    def _start(self, name):
+        from core.shared_feed import feed_name
+
+        worker = self.workers[name]
+        inst = worker['inst']
+        process = self._ctx.Process(
+            target=run_instance, name=f"instance-{name}", daemon=False,
+            args=(inst, worker['index'], feed_name(inst['symbol'], inst['timeframe']),
+                  self._stop_event, self._messages),
+        )
+        process.start()
+        worker['process'] = process
+        worker['restart_at'] = 0.0
+
+    async def _monitor(self):
+        """Aislamiento de fallos: solo se reinicia la instancia caída, con backoff."""
+        while True:
+            now = time.monotonic()
+            for name, worker in self.workers.items():
+                process = worker['process']
+                if worker['gave_up'] or process is None:
+                    if worker['restart_at'] and now >= worker['restart_at'] and not worker['gave_up']:
+                        self._start(name)
+                    continue
+                if process.is_alive():
+                    continue
+
+                code = process.exitcode
+                worker['process'] = None
+                failures = worker['failures']
+                failures.append(now)
+                while failures and now - failures[0] > 3600:
+                    failures.popleft()
+
+                if len(failures) > settings.INSTANCE_MAX_RESTARTS:
+                    worker['gave_up'] = True
+                    self.notify(f"⛔ <b>[{name}]</b> cayó {len(failures)} veces en una hora (exit {code}): queda APAGADA")
+                    continue
+                delay = min(MAX_BACKOFF, settings.INSTANCE_RESTART_BACKOFF * 2 ** (len(failures) - 1))
+                worker['restart_at'] = now + delay
+                self.notify(f"⚠️ <b>[{name}]</b> terminó (exit {code}). Reinicio en {delay:.0f}s")
+            await asyncio.sleep(1)
+
+    def _forward_messages(self):
+        """Una sola cola de Telegram para todas las instancias (respeta el límite por chat)."""
+        from utils.telegram_bot import send_message
+        while True:
+            item = self._messages.get()
+            if item is None:
+                return
+            name, text = item
+            send_message(f"<b>[{name}]</b> {text}")
+
+    def status(self):
+        return {name: {'pid': w['process'].pid if w['process'] else None,
+                       'alive': bool(w['process'] and w['process'].is_alive()),
+                       'restarts_last_hour': len(w['failures']),
+                       'gave_up': w['gave_up']}
+                for name, w in self.workers.items()}
+
+    async def _shutdown(self):
+        from utils.telegram_bot import flush_messages
+
+        self._stop_event.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for stream in self.streams:
+            stream.stop()
+
+        def join_all():
+            deadline = time.monotonic() + 30
+            for worker in self.workers.values():
+                process = worker['process']
+                if process is None:
+                    continue
+                process.join(max(0.1, deadline - time.monotonic()))
+                if process.is_alive():
+                    print(f"[SUPERVISOR] ⚠️ {process.name} no terminó a tiempo: terminate()")
+                    process.terminate()
+                    process.join(5)
+        await asyncio.to_thread(join_all)
+
+        # Recién con los lectores cerrados liberamos la memoria compartida
+        for feed in self.feeds.values():
+            feed.close()
+        self._messages.put(None)
+        if self._forwarder is not None:
+            await asyncio.to_thread(self._forwarder.join, 5)
+        await asyncio.to_thread(flush_messages, 10)
@@ -0,0 +1,55 @@
+import argparse
+import time
+
+from config.settings import settings
+from core.backtest import load_ohlcv, DRY_RUN_BALANCE
+from core.optimizer import parse_values, grid, random_sample, validate_space, optimize, write_results
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimizador de parámetros (grid / random search) sobre el backtest")
+    parser.add_argument("data", help="Archivo OHLCV (.csv o .parquet) o carpeta del archivo local (database/ohlcv/SOLUSDT/1h)")
+    parser.add_argument("--param", action="append", default=[], metavar="NOMBRE=VALORES",
+                        help="Ej: EMA_FAST=5,9,12 o RSI_LONG_THRESHOLD=25:40:5 (repetible)")
+    parser.add_argument("--random", type=int, default=0, help="Evaluar N combinaciones al azar en vez del grid completo")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--mode", default=settings.STRATEGY_MODE,
+                        choices=["AUTO", "FORCE_TREND", "FORCE_RANGE"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--balance", type=float, default=DRY_RUN_BALANCE)
+    parser.add_argument("--fee", type=float, default=0.0)
+    parser.add_argument("--sort", default="total_pnl",
+                        choices=["total_pnl", "final_balance", "win_rate", "profit_factor", "max_drawdown"])
+    parser.add_argument("--out", default="optimization_results.csv")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    space = {}
+    for spec in args.param:
+        name, _, values = spec.partition("=")
+        space[name.strip().upper()] = parse_values(values)
+    if not space:
+        parser.error("Indica al menos un --param")
+    validate_space(space)
+
+    combos = random_sample(space, args.random, args.seed) if args.random else grid(space)
+    print(f"🧪 Optimizando {len(combos)} combinaciones | Modo: {args.mode}")
+
+    t0 = time.perf_counter()
+    arrays = load_ohlcv(args.data)
+
+    def progress(done, total):
+        if done == total or done % max(1, total // 20) == 0:
+            print(f"   {done}/{total} ({time.perf_counter() - t0:.1f}s)", flush=True)
+
+    results = optimize(arrays, combos, strategy_mode=args.mode, workers=args.workers,
+                       initial_balance=args.balance, fee_rate=args.fee, sort_by=args.sort,
+                       progress=progress)
+    write_results(results, args.out)
+
+    print(f"✅ Terminado en {time.perf_counter() - t0:.1f}s -> {args.out}")
+    for rank, (combo, stats) in enumerate(results[:args.top], start=1):
+        params = " ".join(f"{k}={v}" for k, v in combo.items())
+        print(f"#{rank:<3} {args.sort}={stats[args.sort]:.4f} | trades={stats['trades']} | {params}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import argparse
+import asyncio
+
+from config.settings import settings
+from core.supervisor import Supervisor, load_instances
+
+def main():
+    parser = argparse.ArgumentParser(description="Varias instancias del bot (símbolo x timeframe x parámetros x cuenta) con un solo feed de mercado")
+    parser.add_argument("config", nargs="?", default=settings.SUPERVISOR_CONFIG,
+                        help="JSON de instancias (ver config/instances.example.json)")
+    parser.add_argument("--check", action="store_true", help="Solo valida la configuración y muestra el plan")
+    args = parser.parse_args()
+
+    instances = load_instances(args.config)
+    feeds = {(inst['symbol'], inst['timeframe']) for inst in instances}
+    print(f"🧭 {len(instances)} instancias | {len(feeds)} feeds compartidos")
+    for inst in instances:
+        budget = f"{inst['budget']} USDT" if inst.get('budget') else "saldo completo"
+        params = ", ".join(f"{k}={v}" for k, v in inst['params'].items()) or "-"
+        print(f"   {inst['name']:<16} {inst['symbol']:<10} {inst['timeframe']:<4} {inst['mode']:<8} "
+              f"cuenta={inst.get('account') or 'default'} presupuesto={budget} | {params}")
+    if args.check:
+        return
+
+    asyncio.run(Supervisor(instances).run())
+
+if __name__ == "__main__":
+    main()
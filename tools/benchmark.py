@@ -0,0 +1,453 @@
+"""
+Benchmarks reproducibles de los caminos calientes del bot, sin red.
+
+Todo corre contra un exchange local determinista (velas sintéticas con semilla
+fija, N posiciones) y el simulador de órdenes. Por caso reporta throughput,
+latencia p50/p95/p99 y pico de memoria (tracemalloc, en una pasada aparte para
+no contaminar los tiempos), y compara contra una línea base guardada.
+
+Uso:
+    python -m tools.benchmark                     # todo + comparación con la línea base
+    python -m tools.benchmark --quick             # sin los casos de 1M velas
+    python -m tools.benchmark --only analyze      # solo los casos cuyo nombre contiene "analyze"
+    python -m tools.benchmark --save-baseline     # guarda estos resultados como línea base
+
+Sale con código 1 si algún caso empeoró más que --tolerance respecto de la base.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from config.settings import settings
+from core.candle_store import CandleStore, COLUMNS, TS, timeframe_to_ms
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+SEED = 42
+SYMBOL = settings.SYMBOL
+
+
+# --- DATOS Y EXCHANGE LOCAL ---
+
+def synthetic_ohlcv(n, timeframe="1h", seed=SEED, start_ms=1_600_000_000_000, price=100.0):
+    """Paseo aleatorio con semilla fija: array (n, 6) en el orden de fetch_ohlcv."""
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.concatenate(([price], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.003, n)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    ts = start_ms + np.arange(n, dtype=np.float64) * timeframe_to_ms(timeframe)
+    volume = rng.uniform(100, 1000, n)
+    return np.column_stack([ts, open_, high, low, close, volume])
+
+
+def synthetic_positions(n, symbol=SYMBOL, seed=SEED):
+    """N posiciones con forma de ccxt.fetch_positions; la nuestra queda al final (peor caso)."""
+    rng = np.random.default_rng(seed)
+    positions = []
+    for i in range(n - 1):
+        contracts = float(rng.uniform(0, 10)) if i % 5 == 0 else 0.0
+        positions.append({'symbol': f"C{i:04d}/USDT:USDT", 'contracts': contracts, 'side': 'long',
+                          'entryPrice': float(rng.uniform(1, 100)),
+                          'info': {'positionAmt': str(contracts), 'entryPrice': '0'}})
+    positions.append({'symbol': f"{symbol[:-4]}/USDT:USDT", 'contracts': 1.5, 'side': 'short',
+                      'entryPrice': 100.0, 'info': {'positionAmt': '-1.5', 'entryPrice': '100.0'}})
+    return positions
+
+
+class MockExchange:
+    """
+    Exchange local con la interfaz de ccxt que usa el bot (velas, reloj, posiciones).
+    Devuelve listas de listas como ccxt, así se mide también la conversión.
+    """
+
+    has = {}
+
+    def __init__(self, bars, positions=(), timeframe="1h"):
+        self.bars = bars
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+        self.cursor = len(bars)  # bars[cursor - 1] es la vela viva
+        self.positions = list(positions)
+
+    def milliseconds(self):
+        return int(self.bars[self.cursor - 1, TS]) + self.timeframe_ms // 2
+
+    def fetch_ohlcv(self, symbol, timeframe=None, since=None, limit=500):
+        end = self.cursor
+        if since is None:
+            start = max(0, end - limit)
+        else:
+            start = int(np.searchsorted(self.bars[:end, TS], since, side='left'))
+            end = min(end, start + limit)
+        return self.bars[start:end].tolist()
+
+    def fetch_positions(self, symbols=None, params=None):
+        return self.positions
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        return []
+
+
+def filled_store(bars, capacity=None):
+    store = CandleStore(SYMBOL, settings.TIMEFRAME, capacity=capacity or len(bars))
+    store.ingest(bars)
+    return store
+
+
+def market_index(symbols=(SYMBOL,)):
+    from core.market_index import MarketIndex
+    return MarketIndex({s: ('0.01', '0.001', 0.01, 1e6, 5e3, 5.0) for s in symbols}, time.time())
+
+
+# --- CASOS ---
+# Cada caso arma su estado y retorna `step()`; `batch` = operaciones por llamada a step.
+
+class Case:
+    def __init__(self, name, prepare, iterations, batch=1, heavy=False, requires=None):
+        self.name = name
+        self.prepare = prepare
+        self.iterations = iterations
+        self.batch = batch
+        self.heavy = heavy
+        self.requires = requires
+
+
+def case_candles_seed():
+    exchange = MockExchange(synthetic_ohlcv(settings.CANDLE_HISTORY))
+    store = CandleStore(SYMBOL, settings.TIMEFRAME)
+
+    def step():
+        store.clear()
+        store.apply(store.fetch(exchange))
+    return step
+
+
+def case_candles_update():
+    bars = synthetic_ohlcv(settings.CANDLE_HISTORY + 2000)
+    exchange = MockExchange(bars)
+    exchange.cursor = settings.CANDLE_HISTORY
+    store = CandleStore(SYMBOL, settings.TIMEFRAME)
+    store.update(exchange)
+
+    def step():
+        # Una vela nueva por iteración (la vela viva se revisa en la misma petición)
+        exchange.cursor = min(len(bars), exchange.cursor + 1)
+        store.update(exchange)
+    return step
+
+
+def case_candles_frame():
+    store = filled_store(synthetic_ohlcv(settings.CANDLE_HISTORY))
+    return store.to_frame
+
+
+def case_analyze_cold(n):
+    def prepare():
+        from core.strategy import TrendRangeStrategy
+        store = filled_store(synthetic_ohlcv(n))
+        # Estrategia nueva cada vez: recorre las n velas (arranque / resiembra)
+        return lambda: TrendRangeStrategy().analyze(store)
+    return prepare
+
+
+def case_analyze_tick():
+    from core.strategy import TrendRangeStrategy
+    bars = synthetic_ohlcv(settings.CANDLE_HISTORY)
+    store = filled_store(bars)
+    strategy = TrendRangeStrategy()
+    strategy.analyze(store)
+    live = bars[-1].copy()
+    prices = live[4] * (1 + np.random.default_rng(SEED).normal(0, 0.001, 4096))
+    state = {'i': 0}
+
+    def step():
+        # Revisión de la vela viva (lo que llega por WebSocket) + análisis O(1)
+        live[4] = prices[state['i'] % len(prices)]
+        state['i'] += 1
+        store.ingest(live[None, :])
+        strategy.analyze(store)
+    return step
+
+
+def case_resample_tick():
+    from core.resampler import Resampler
+    # Base 1m alineada a 4h (como las velas de Binance) y 4 timeframes derivados
+    start = 1_600_000_000_000 - 1_600_000_000_000 % 14_400_000
+    bars = synthetic_ohlcv(settings.BASE_HISTORY + 5000, "1m", start_ms=start)
+    base = CandleStore(SYMBOL, "1m", settings.BASE_HISTORY)
+    base.ingest(bars[:settings.BASE_HISTORY])
+    resampler = Resampler(base, ["5m", "15m", "1h", "4h"])
+    resampler.sync()
+    state = {'i': 2 * settings.BASE_HISTORY}
+
+    def step():
+        # Vela base nueva o revisión de la viva (mitad y mitad) + propagación
+        i = state['i'] // 2 % len(bars)
+        state['i'] += 1
+        base.ingest(bars[i][None, :])
+        resampler.sync()
+    return step
+
+
+def case_vector_signals(n):
+    def prepare():
+        from core.strategy import create_strategy
+        strategy = create_strategy()
+        bars = synthetic_ohlcv(n)
+        cols = {name: bars[:, i] for i, name in enumerate(COLUMNS)}
+        # Contrato por lotes: indicadores + señales de todo el histórico en una llamada
+        return lambda: strategy.evaluate(strategy.compute(cols), settings.STRATEGY_MODE)
+    return prepare
+
+
+def case_positions_rest(n):
+    def prepare():
+        from core.execution import ExecutionEngine
+        execution = ExecutionEngine(MockExchange(synthetic_ohlcv(2), synthetic_positions(n)))
+        execution.routes_orders = True
+        return lambda: execution.get_position_details(SYMBOL)
+    return prepare
+
+
+def case_positions_cache(n):
+    def prepare():
+        from core.execution import ExecutionEngine
+        from core.position_cache import PositionCache
+        exchange = MockExchange(synthetic_ohlcv(2), synthetic_positions(n))
+        cache = PositionCache()
+        cache.load(exchange)
+        execution = ExecutionEngine(exchange, cache)
+        execution.routes_orders = True
+        return lambda: execution.get_position_details(SYMBOL)
+    return prepare
+
+
+def case_normalize_quantity():
+    from core.risk_manager import RiskManager
+    risk = RiskManager(MockExchange(synthetic_ohlcv(2)), markets=market_index())
+    quantities = np.random.default_rng(SEED).uniform(0.05, 500, 1000).tolist()
+
+    def step():
+        for q in quantities:
+            risk._normalize_quantity(q)
+    return step
+
+
+def _simulated_account(price):
+    from core.simulator import SimulatedExchange
+    sim = SimulatedExchange(None, balance=10_000, slippage_bps=0)
+    sim.on_price(SYMBOL, price)
+    return sim
+
+
+def case_order_cycle():
+    from core.risk_manager import RiskManager
+    price = 100.0
+    sim = _simulated_account(price)
+    risk = RiskManager(sim, markets=market_index())
+
+    def step():
+        # Entrada + SL/TP en batch contra el simulador, luego cierre a mercado
+        risk.calculate_and_execute('LONG', price, 0.02, 0.04)
+        position = sim.fetch_positions()[0]
+        sim.create_order(SYMBOL, 'market', 'sell', abs(float(position['contracts'])), params={'reduceOnly': True})
+    return step
+
+
+def case_loop_tick():
+    from core.execution import ExecutionEngine
+    from core.exits import tick_path
+    from core.shared_state import bot_state
+    from core.strategy import TrendRangeStrategy
+
+    bars = synthetic_ohlcv(settings.CANDLE_HISTORY)
+    store = filled_store(bars)
+    strategy = TrendRangeStrategy()
+    strategy.analyze(store)
+
+    live = bars[-1].copy()
+    sim = _simulated_account(float(live[4]))
+    sim.create_order(SYMBOL, 'market', 'buy', 1.0)
+    # SL/TP lejos: se evalúan en cada tick pero no se ejecutan
+    sim.create_order(SYMBOL, 'STOP_MARKET', 'sell', params={'stopPrice': live[4] * 0.5, 'closePosition': True})
+    sim.create_order(SYMBOL, 'TAKE_PROFIT_MARKET', 'sell', params={'stopPrice': live[4] * 2, 'closePosition': True})
+    execution = ExecutionEngine(sim)
+    prices = live[4] * (1 + np.random.default_rng(SEED).normal(0, 0.001, 4096))
+    state = {'i': 0, 'prev': float(live[4])}
+
+    def step():
+        # market_data -> signals -> positions, como una pasada del motor
+        price = float(prices[state['i'] % len(prices)])
+        state['i'] += 1
+        high_delta = price if price > live[2] else None
+        low_delta = price if price < live[3] else None
+        live[2] = max(live[2], price); live[3] = min(live[3], price); live[4] = price
+        store.ingest(live[None, :])
+
+        analysis = strategy.analyze(store)
+        bot_state.strategy_name = analysis.label
+        for point in tick_path(state['prev'], high_delta, low_delta, price):
+            sim.on_price(SYMBOL, point)
+        state['prev'] = price
+        position = execution.get_position_details(SYMBOL)
+        bot_state.in_position = bool(position and position['amt'])
+        bot_state.last_price = price
+        bot_state.publish()
+    return step
+
+
+def _has_module(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+CASES = [
+    Case("candles_seed_300", case_candles_seed, 500),
+    Case("candles_update", case_candles_update, 2000),
+    Case("candles_frame_300", case_candles_frame, 500, requires="pandas"),
+    Case("analyze_cold_300", case_analyze_cold(300), 50),
+    Case("analyze_cold_10k", case_analyze_cold(10_000), 5),
+    Case("analyze_cold_1m", case_analyze_cold(1_000_000), 1, heavy=True),
+    Case("analyze_tick", case_analyze_tick, 5000),
+    Case("resample_tick", case_resample_tick, 5000),
+    Case("vector_signals_10k", case_vector_signals(10_000), 5),
+    Case("vector_signals_1m", case_vector_signals(1_000_000), 1, heavy=True),
+    Case("positions_rest_500", case_positions_rest(500), 2000),
+    Case("positions_cache_500", case_positions_cache(500), 20000),
+    Case("normalize_quantity", case_normalize_quantity, 50, batch=1000),
+    Case("order_cycle_sim", case_order_cycle, 500),
+    Case("loop_tick", case_loop_tick, 5000),
+]
+
+
+# --- MEDICIÓN ---
+
+def run_case(case, memory_iterations=3):
+    with contextlib.redirect_stdout(io.StringIO()):
+        step = case.prepare()
+        step()  # Calentamiento (imports, caches)
+
+        samples = np.empty(case.iterations)
+        t_start = time.perf_counter()
+        for i in range(case.iterations):
+            t0 = time.perf_counter()
+            step()
+            samples[i] = time.perf_counter() - t0
+        elapsed = time.perf_counter() - t_start
+
+        # Pico de memoria en pasada aparte (tracemalloc frena la ejecución)
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        for _ in range(min(memory_iterations, case.iterations)):
+            step()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    per_op = samples / case.batch
+    p50, p95, p99 = np.percentile(per_op, [50, 95, 99])
+    return {
+        'iterations': case.iterations,
+        'ops_per_sec': case.iterations * case.batch / elapsed,
+        'p50_us': float(p50 * 1e6),
+        'p95_us': float(p95 * 1e6),
+        'p99_us': float(p99 * 1e6),
+        'peak_kib': peak / 1024,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Casos que empeoraron más que `tolerance` en p50 o en pico de memoria."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('cases', {}).get(name)
+        if not base:
+            continue
+        for field in ('p50_us', 'peak_kib'):
+            old, new = base.get(field), result[field]
+            # Ruido de medición: ignoramos diferencias absolutas mínimas
+            floor = 1.0 if field == 'p50_us' else 16.0
+            if old and new > old * (1 + tolerance) and new - old > floor:
+                regressions.append((name, field, old, new))
+    return regressions
+
+
+def machine_info():
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'system': platform.system(), 'cpus': os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de los caminos calientes del bot")
+    parser.add_argument("--only", action="append", default=[], help="Filtra casos por nombre (repetible)")
+    parser.add_argument("--quick", action="store_true", help="Omite los casos pesados (1M velas)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.30,
+                        help="Empeoramiento admitido antes de marcar regresión (0.30 = 30%%)")
+    parser.add_argument("--json", help="Guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    if baseline and baseline.get('machine') != machine_info():
+        print(f"⚠️ Línea base tomada en otra máquina/entorno: {baseline.get('machine')}")
+
+    cases = [c for c in CASES if not args.only or any(f in c.name for f in args.only)]
+    if args.quick:
+        cases = [c for c in cases if not c.heavy]
+
+    header = f"{'caso':<22} {'n':>6} {'ops/s':>12} {'p50 µs':>10} {'p95 µs':>10} {'p99 µs':>10} {'pico KiB':>10} {'vs base':>8}"
+    print(header)
+    print("-" * len(header))
+
+    results = {}
+    for case in cases:
+        if case.requires and not _has_module(case.requires):
+            print(f"{case.name:<22} omitido (falta {case.requires})")
+            continue
+        r = run_case(case)
+        results[case.name] = r
+        base = baseline.get('cases', {}).get(case.name)
+        delta = f"{(r['p50_us'] / base['p50_us'] - 1) * 100:+.0f}%" if base and base.get('p50_us') else "-"
+        print(f"{case.name:<22} {r['iterations']:>6} {r['ops_per_sec']:>12,.0f} {r['p50_us']:>10.1f} "
+              f"{r['p95_us']:>10.1f} {r['p99_us']:>10.1f} {r['peak_kib']:>10.1f} {delta:>8}", flush=True)
+
+    report = {'machine': machine_info(), 'created_at': time.time(), 'cases': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        # Conservamos casos de la base que no se corrieron esta vez (--only / --quick)
+        report['cases'] = {**baseline.get('cases', {}), **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Línea base guardada en {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if not baseline:
+        print("ℹ️ Sin línea base: correr con --save-baseline para fijarla")
+    for name, field, old, new in regressions:
+        print(f"❌ REGRESIÓN {name}: {field} {old:.1f} -> {new:.1f} (+{(new / old - 1) * 100:.0f}%)")
+    if baseline and not regressions:
+        print(f"✅ Sin regresiones (tolerancia {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Compara los indicadores propios contra pandas_ta (la versión fijada en
+requirements.txt), que es lo que calculaba la estrategia original con
+df.ta.adx / df.ta.ema / df.ta.rsi.
+
+Sobre velas sintéticas con semilla fija revisa los tres caminos: IndicatorEngine
+vela a vela (update), sembrado con los kernels y seguido vela a vela (feed +
+update, cortando también a mitad de la siembra) y el vectorizado del backtest
+(compute_indicators). Exige el mismo resultado bit a bit, NaN incluidos.
+
+Uso:
+    python -m tools.check_indicators              # 2000 velas, parámetros de settings
+    python -m tools.check_indicators --bars 500 --seed 7
+
+Sale con código 1 si alguna columna difiere.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from config.settings import settings
+from tools.benchmark import synthetic_ohlcv
+
+
+def reference(bars, params=None):
+    """Columnas de IndicatorEngine calculadas con pandas_ta, como la estrategia original."""
+    import pandas as pd
+    import pandas_ta  # noqa: F401  (registra el accessor df.ta)
+
+    p = params or settings
+    adx_period = getattr(p, 'ADX_PERIOD', 14)
+    df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    return {
+        'close': df['close'].to_numpy(),
+        'ADX': df.ta.adx(length=adx_period)[f'ADX_{adx_period}'].to_numpy(),
+        'EMA_FAST': df.ta.ema(length=p.EMA_FAST).to_numpy(),
+        'EMA_SLOW': df.ta.ema(length=p.EMA_SLOW).to_numpy(),
+        'RSI': df.ta.rsi(length=p.RSI_LENGTH).to_numpy(),
+        'EMA_FILTER': df.ta.ema(length=p.RSI_EMA_FILTER).to_numpy(),
+    }
+
+
+def incremental(bars, params=None, seeded=0):
+    """
+    IndicatorEngine vela a vela (el camino en vivo). Con `seeded` las primeras
+    velas entran de una vez por feed() (los kernels) y se comparan las siguientes.
+    """
+    from core.indicators import IndicatorEngine
+
+    engine = IndicatorEngine(params)
+    if seeded:
+        engine.feed(bars[:seeded].T)
+    rows = {key: [] for key in engine.KEYS}
+    for ts, _, high, low, close, _ in bars[seeded:].tolist():
+        values = engine.update(ts, high, low, close)
+        for key in engine.KEYS:
+            rows[key].append(values[key])
+    return seeded, {key: np.asarray(column, dtype=np.float64) for key, column in rows.items()}
+
+
+def feed_then_update(seeded):
+    return lambda bars, params=None: incremental(bars, params, seeded=seeded)
+
+
+def vectorized(bars, params=None):
+    """compute_indicators sobre todo el histórico (backtest / optimizador)."""
+    from core.indicators import compute_indicators
+
+    columns = {'high': bars[:, 2], 'low': bars[:, 3], 'close': bars[:, 4]}
+    return 0, compute_indicators(columns, params)
+
+
+def compare(expected, actual, start=0):
+    """(columna, velas distintas, máxima diferencia) de cada columna que no coincide desde `start`."""
+    failures = []
+    for key, want in expected.items():
+        want = want[start:]
+        got = np.asarray(actual[key], dtype=np.float64)
+        if np.array_equal(want, got, equal_nan=True):
+            continue
+        differs = ~((want == got) | (np.isnan(want) & np.isnan(got)))
+        with np.errstate(invalid='ignore'):
+            max_diff = np.nanmax(np.abs(want - got)) if np.any(want == want) else float('nan')
+        failures.append((key, int(differs.sum()), max_diff))
+    return failures
+
+
+CHECKS = [
+    ("update", incremental),
+    ("feed@5", feed_then_update(5)),        # Corta dentro de la siembra de ATR/EMAs
+    ("feed@30", feed_then_update(30)),
+    ("feed@1000", feed_then_update(1000)),
+    ("vector", vectorized),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indicadores propios vs pandas_ta")
+    parser.add_argument("--bars", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Con menos velas pandas_ta no calcula (retorna None)
+    minimum = max(getattr(settings, 'ADX_PERIOD', 14), settings.EMA_FAST, settings.EMA_SLOW,
+                  settings.RSI_LENGTH, settings.RSI_EMA_FILTER) + 1
+    if args.bars < minimum:
+        parser.error(f"--bars debe ser al menos {minimum}")
+
+    bars = synthetic_ohlcv(args.bars, settings.TIMEFRAME, seed=args.seed)
+    expected = reference(bars)
+
+    failed = False
+    for name, compute in CHECKS:
+        start, actual = compute(bars)
+        failures = compare(expected, actual, start)
+        if not failures:
+            print(f"✅ {name:<10} idéntico a pandas_ta ({args.bars} velas)")
+        for key, count, max_diff in failures:
+            failed = True
+            print(f"❌ {name:<10} {key}: {count} velas distintas (máx. diferencia {max_diff:.6g})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
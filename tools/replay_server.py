@@ -0,0 +1,73 @@
+"""
+Servidor WebSocket local que reproduce mensajes grabados de Binance Futures.
+Sirve como sustituto de fstream.binance.com para probar MarketStream sin red.
+
+Formato del archivo (JSONL): un mensaje por línea, tal cual lo envía Binance
+({"stream": ..., "data": {...}}). Opcionalmente cada línea puede traer "_t"
+(ms desde el inicio de la grabación) para respetar los tiempos originales.
+
+Uso:
+    python -m tools.replay_server grabacion.jsonl --port 8765 --speed 10
+    MARKET_STREAM_URL=ws://127.0.0.1:8765 python main.py
+"""
+import argparse
+import asyncio
+import json
+
+from aiohttp import web
+
+
+def load_messages(path):
+    messages = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                messages.append(json.loads(line))
+    return messages
+
+
+def make_app(messages, speed=1.0, loop_forever=False, interval_ms=100):
+    async def stream_handler(request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        print(f"[REPLAY] Cliente conectado: {request.query_string}")
+
+        while True:
+            last_t = 0
+            for i, msg in enumerate(messages):
+                t = msg.get('_t', i * interval_ms)
+                await asyncio.sleep(max(0, t - last_t) / 1000.0 / speed)
+                last_t = t
+                if ws.closed:
+                    return ws
+                payload = {k: v for k, v in msg.items() if k != '_t'}
+                await ws.send_str(json.dumps(payload))
+            if not loop_forever:
+                break
+
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/stream', stream_handler)
+    app.router.add_get('/ws', stream_handler)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay local de streams de Binance Futures")
+    parser.add_argument("recording", help="Archivo JSONL con los mensajes grabados")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiplicador de velocidad")
+    parser.add_argument("--loop", action="store_true", help="Repetir la grabación indefinidamente")
+    args = parser.parse_args()
+
+    messages = load_messages(args.recording)
+    print(f"[REPLAY] {len(messages)} mensajes en ws://{args.host}:{args.port}/stream (x{args.speed})")
+    web.run_app(make_app(messages, args.speed, args.loop), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
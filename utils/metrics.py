@@ -0,0 +1,168 @@
+import bisect
+import collections
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.settings import settings
+
+# Límites de los buckets en segundos (de 100 µs a 10 s: del indicador O(1) al RTT de una orden)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_NAME = "bot_stage_seconds"
+
+
+class Histogram:
+    """
+    Histograma acumulativo estilo Prometheus más una ventana de las últimas
+    muestras para percentiles exactos (/perf). observe() es O(log buckets).
+    """
+
+    def __init__(self, buckets=BUCKETS, window=1024):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # El último es +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = collections.deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+
+    def percentiles(self, qs=(0.5, 0.95, 0.99)):
+        samples = sorted(self.recent)
+        if not samples:
+            return {q: 0.0 for q in qs}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in qs}
+
+
+class Metrics:
+    """
+    Registro de tiempos por etapa del ciclo (fetch, indicadores, decisión,
+    posiciones, RTT de órdenes, notificaciones) y de indicadores instantáneos
+    (gauges) que se leen recién al exportar: medir no frena el hot path.
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.histograms = {}
+        self.gauges = {}  # nombre -> (ayuda, función sin argumentos)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(window=self.window)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def timed(self, stage, func):
+        """Envuelve `func` para medirla (útil con asyncio.to_thread)."""
+        def wrapper(*args, **kwargs):
+            with self.timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def register_gauge(self, name, help_text, func):
+        self.gauges[name] = (help_text, func)
+
+    def summary(self):
+        """etapa -> {count, mean, p50, p95, p99, max} (segundos)."""
+        with self._lock:
+            items = [(stage, h.count, h.sum, h.max, h.percentiles()) for stage, h in self.histograms.items()]
+        return {stage: {'count': count, 'mean': total / count if count else 0.0,
+                        'p50': pcts[0.5], 'p95': pcts[0.95], 'p99': pcts[0.99], 'max': peak}
+                for stage, count, total, peak, pcts in sorted(items)}
+
+    def render_prometheus(self):
+        lines = [f"# HELP {METRIC_NAME} Duración por etapa del ciclo del bot.",
+                 f"# TYPE {METRIC_NAME} histogram"]
+        with self._lock:
+            items = [(stage, list(h.counts), h.sum, h.count) for stage, h in sorted(self.histograms.items())]
+        for stage, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {total:.9f}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {count}')
+
+        for name, (help_text, func) in sorted(self.gauges.items()):
+            try:
+                value = float(func())
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """Texto para /perf (HTML de Telegram)."""
+        summary = self.summary()
+        if not summary:
+            return "⏱️ <b>PERF</b>\nSin muestras todavía."
+        rows = [f"{stage[:14]:<14} {s['count']:>6} {s['p50'] * 1000:>8.2f} {s['p95'] * 1000:>8.2f} {s['max'] * 1000:>8.1f}"
+                for stage, s in summary.items()]
+        header = f"{'etapa':<14} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+        return "⏱️ <b>PERF</b> (últimas muestras)\n<pre>" + "\n".join([header] + rows) + "</pre>"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Sin una línea de log por cada scrape
+
+
+def start_metrics_server(registry=None, host=None, port=None):
+    """
+    Expone /metrics (formato de texto de Prometheus) en un hilo propio.
+    Escucha solo en localhost por defecto. Retorna el servidor o None si falla.
+    """
+    registry = registry or metrics
+    host = host or settings.METRICS_HOST
+    port = settings.METRICS_PORT if port is None else port
+
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        print(f"[METRICS] ⚠️ No se pudo abrir {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[METRICS] 📈 http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+# Registro global compartido (como bot_state)
+metrics = Metrics(getattr(settings, 'METRICS_WINDOW', 1024))
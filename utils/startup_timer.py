@@ -0,0 +1,52 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """
+    Cronómetro de arranque por fases (imports, exchange, mercados, ...).
+    Las fases pueden solaparse (corren en hilos a la vez): el total es el
+    tiempo real desde el inicio del proceso hasta quedar listo para operar.
+    """
+
+    def __init__(self, started_at=None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.phases = []
+        self.ready_at = None
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def timed(self, name, func):
+        """Envuelve `func` para medirla (útil con asyncio.to_thread)."""
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def ready(self):
+        """Marca el instante en que el bot ya puede operar. Retorna False si ya estaba marcado."""
+        if self.ready_at is not None:
+            return False
+        self.ready_at = time.perf_counter()
+        return True
+
+    @property
+    def total(self):
+        end = self.ready_at if self.ready_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    def report(self):
+        parts = " | ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases)
+        return f"⏱️ Arranque: {parts} | Total {self.total:.2f}s"
@@ -1,19 +1,260 @@
+import collections
+import re
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
 from config.settings import settings
+from utils.metrics import metrics
 
-def send_message(message):
+TELEGRAM_MAX_LEN = 4096  # Límite de caracteres por mensaje de Telegram
+
+_TAG = re.compile(r"<(/?)([a-zA-Z-]+)[^>]*>")
+
+
+def truncate_html(text, limit=TELEGRAM_MAX_LEN):
+    """
+    Recorta un mensaje HTML sin dejar una etiqueta o entidad a medias y
+    cerrando las que quedaron abiertas (si no, Telegram rechaza todo con 400).
+    """
+    if len(text) <= limit:
+        return text
+    cut = limit - 1
+    while True:
+        head = text[:cut]
+        # Nada de '<b' o '&amp' cortados al final
+        if head.rfind("<") > head.rfind(">"):
+            head = head[:head.rfind("<")]
+        if head.rfind("&") > head.rfind(";"):
+            head = head[:head.rfind("&")]
+        open_tags = []
+        for match in _TAG.finditer(head):
+            closing, name = match.group(1), match.group(2).lower()
+            if not closing:
+                open_tags.append(name)
+            elif name in open_tags:
+                del open_tags[len(open_tags) - 1 - open_tags[::-1].index(name)]
+        result = head + "…" + "".join(f"</{name}>" for name in reversed(open_tags))
+        if len(result) <= limit:
+            return result
+        cut -= len(result) - limit
+
+
+class TelegramNotifier:
+    """
+    Cola de salida hacia Telegram con un hilo trabajador propio.
+
+    - send() nunca bloquea: encola y vuelve (una caída de Telegram no frena órdenes).
+    - Las ráfagas se agrupan en un solo mensaje (hasta 4096 caracteres).
+    - Respeta el límite por chat (1 msg/s y N por minuto) y los 429 de Telegram.
+    - Memoria acotada: con la cola llena se descarta el más viejo (o el nuevo).
+    """
+
+    def __init__(self, token, chat_id, max_queue=200, coalesce_window=0.5,
+                 min_interval=1.0, max_per_minute=20, drop_policy="oldest"):
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.max_queue = max_queue
+        self.coalesce_window = coalesce_window
+        self.min_interval = min_interval
+        self.max_per_minute = max_per_minute
+        self.drop_policy = drop_policy
+
+        self.dropped = 0
+        self.sent = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._history = {}  # chat -> deque de timestamps de envío (último minuto)
+        self._session = None
+        self._thread = None
+
+    # --- PRODUCTORES (cualquier hilo) ---
+
+    def send(self, text, chat_id=None):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                if self.drop_policy == "newest":
+                    return False
+                self._queue.popleft()
+            self._queue.append((chat_id or self.chat_id, text))
+            self._cond.notify_all()
+        self._ensure_worker()
+        return True
+
+    def flush(self, timeout=10):
+        """Espera a que la cola se vacíe (para el apagado). Retorna True si se vació."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # --- TRABAJADOR ---
+
+    def _ensure_worker(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="telegram-notifier", daemon=True)
+            self._thread.start()
+
+    def _get_session(self):
+        if self._session is None:
+            # Conexión persistente (keep-alive): evita el handshake TLS por mensaje
+            self._session = requests.Session()
+            self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        return self._session
+
+    def _take_batch(self):
+        """Saca de la cola todo lo que entra en un mensaje para el mismo chat."""
+        chat, first = self._queue.popleft()
+        parts = []
+        if self.dropped:
+            parts.append(f"⚠️ <i>{self.dropped} mensajes descartados (cola llena)</i>")
+            self.dropped = 0
+        parts.append(first)
+        length = sum(len(p) + 2 for p in parts)
+
+        while self._queue and self._queue[0][0] == chat:
+            nxt = self._queue[0][1]
+            if length + len(nxt) + 2 > TELEGRAM_MAX_LEN:
+                break
+            self._queue.popleft()
+            parts.append(nxt)
+            length += len(nxt) + 2
+
+        # Solo un mensaje suelto más largo que el límite llega a pasarse
+        return chat, truncate_html("\n\n".join(parts))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+
+            # Ventana de agrupación: dejamos llegar el resto de la ráfaga
+            time.sleep(self.coalesce_window)
+
+            with self._cond:
+                if not self._queue:
+                    continue
+                chat, text = self._take_batch()
+                self._busy = True
+            try:
+                self._deliver(chat, text)
+            except Exception as e:
+                print(f"❌ ERROR CONEXIÓN TELEGRAM: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _wait_rate_limit(self, chat):
+        history = self._history.setdefault(chat, collections.deque())
+        while True:
+            now = time.monotonic()
+            while history and now - history[0] > 60:
+                history.popleft()
+            wait = 0.0
+            if history:
+                wait = max(wait, self.min_interval - (now - history[-1]))
+            if len(history) >= self.max_per_minute:
+                wait = max(wait, 60 - (now - history[0]))
+            if wait <= 0:
+                history.append(now)
+                return
+            time.sleep(wait)
+
+    def _deliver(self, chat, text, attempts=3):
+        payload = {
+            "chat_id": chat,
+            "text": text,
+            "parse_mode": "HTML"  # <--- CAMBIO IMPORTANTE
+        }
+        delay = 1.0
+        for attempt in range(attempts):
+            self._wait_rate_limit(chat)
+            try:
+                with metrics.timer("notify"):
+                    response = self._get_session().post(self.url, json=payload, timeout=10)
+            except requests.RequestException as e:
+                print(f"❌ ERROR CONEXIÓN TELEGRAM: {e}")
+                time.sleep(delay)
+                delay *= 2
+                continue
+
+            if response.status_code == 200:
+                self.sent += 1
+                return True
+
+            if response.status_code == 429:
+                # Telegram nos dice cuánto esperar
+                try:
+                    retry_after = response.json().get("parameters", {}).get("retry_after", delay)
+                except ValueError:
+                    retry_after = delay
+                time.sleep(float(retry_after))
+                continue
+
+            print(f"❌ ERROR TELEGRAM: {response.status_code} - {response.text}")
+            return False
+
+        print("❌ ERROR TELEGRAM: mensaje descartado tras varios reintentos")
+        return False
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+def get_notifier():
+    global _notifier
     if not settings.TELEGRAM_TOKEN or not settings.TELEGRAM_CHAT_ID:
+        return None
+    if _notifier is None:
+        with _notifier_lock:
+            if _notifier is None:
+                _notifier = TelegramNotifier(
+                    settings.TELEGRAM_TOKEN,
+                    settings.TELEGRAM_CHAT_ID,
+                    max_queue=getattr(settings, 'TELEGRAM_QUEUE_SIZE', 200),
+                    coalesce_window=getattr(settings, 'TELEGRAM_COALESCE_SECONDS', 0.5),
+                    min_interval=getattr(settings, 'TELEGRAM_MIN_INTERVAL', 1.0),
+                    max_per_minute=getattr(settings, 'TELEGRAM_MAX_PER_MINUTE', 20),
+                    drop_policy=getattr(settings, 'TELEGRAM_DROP_POLICY', "oldest"),
+                )
+    return _notifier
+
+_sink = None
+
+def set_message_sink(func):
+    """
+    Desvía send_message a `func(texto)` (instancias del supervisor: los mensajes
+    salen por la única cola de Telegram del proceso padre). None restaura el envío directo.
+    """
+    global _sink
+    _sink = func
+
+def send_message(message):
+    """Encola el mensaje y vuelve de inmediato (el envío lo hace el hilo de Telegram)."""
+    if _sink is not None:
+        _sink(message)
         return
+    notifier = get_notifier()
+    if notifier is None:
+        return
+    notifier.send(message)
 
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": settings.TELEGRAM_CHAT_ID,
-        "text": message,
-        "parse_mode": "HTML"  # <--- CAMBIO IMPORTANTE
-    }
-    try:
-        response = requests.post(url, json=payload, timeout=30)
-        if response.status_code != 200:
-            print(f"❌ ERROR TELEGRAM: {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"❌ ERROR CONEXIÓN TELEGRAM: {e}")
\ No newline at end of file
+def flush_messages(timeout=10):
+    """Bloquea hasta enviar lo pendiente (usar solo al apagar)."""
+    notifier = get_notifier()
+    if notifier is None:
+        return True
+    return notifier.flush(timeout)
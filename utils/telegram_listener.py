@@ -4,6 +4,7 @@ from datetime import datetime
 import time
 from config.settings import settings
 from core.shared_state import bot_state
+from utils.metrics import metrics
 
 # Inicializamos el bot a nivel global para que los decoradores (@bot) funcionen bien
 if settings.TELEGRAM_TOKEN:
@@ -31,19 +32,23 @@ def start_telegram_listener():
             types.BotCommand("scan", "🔍 Escanear mercado (RSI/ADX)"),
             types.BotCommand("balance", "💰 Ver saldo y PnL diario"),
             types.BotCommand("status", "📊 Estado del sistema"),
+            types.BotCommand("perf", "⏱️ Latencia por etapa"),
             types.BotCommand("stop", "🛑 Apagado de emergencia")
         ])
     except Exception as e:
         print(f"⚠️ No se pudo configurar el menú visual: {e}")
 
     # --- 2. DEFINICIÓN DE COMANDOS ---
+    # Cada comando toma UNA foto (bot_state.snapshot) y arma la respuesta con ella:
+    # nunca mezcla campos de dos actualizaciones distintas del motor.
 
     # COMANDO: /status
     @bot.message_handler(commands=['status', 'bot'])
     def cmd_status(message):
+        state = bot_state.snapshot
         # Calculamos uptime si existe la variable, si no, mostramos "N/A"
         try:
-            uptime_val = str(datetime.now() - bot_state.uptime).split('.')[0]
+            uptime_val = str(datetime.now() - state.uptime).split('.')[0]
         except:
             uptime_val = "Calculando..."
 
@@ -51,39 +56,42 @@ def start_telegram_listener():
             f"🤖 <b>SYSTEM STATUS</b>\n"
             f"━━━━━━━━━━━━━━\n"
             f"⏱️ Uptime: <code>{uptime_val}</code>\n"
-            f"⚙️ Modo: <b>{bot_state.mode}</b>\n"
-            f"🧠 Estrategia: <b>{bot_state.strategy_name}</b>\n"
-            f"💲 Precio: <code>{bot_state.last_price}</code>"
+            f"⚙️ Modo: <b>{state.mode}</b>\n"
+            f"🧠 Estrategia: <b>{state.strategy_name}</b>\n"
+            f"💲 Precio: <code>{state.last_price}</code>\n"
+            f"🎯 Mark: <code>{state.mark_price}</code>"
         )
         bot.reply_to(message, msg, parse_mode="HTML")
 
     # COMANDO: /balance
     @bot.message_handler(commands=['balance', 'wallet'])
     def cmd_balance(message):
+        state = bot_state.snapshot
         msg = (
             f"💰 <b>BILLETERA (Futuros)</b>\n"
             f"━━━━━━━━━━━━━━\n"
-            f"💵 Total: <b>${bot_state.balance_total:.2f} USDT</b>\n"
-            f"📉 PnL Diario: <b>{bot_state.daily_pnl:.2f} USDT</b>"
+            f"💵 Total: <b>${state.balance_total:.2f} USDT</b>\n"
+            f"📉 PnL Diario: <b>{state.daily_pnl:.2f} USDT</b>"
         )
         bot.reply_to(message, msg, parse_mode="HTML")
 
     # COMANDO: /posicion
     @bot.message_handler(commands=['posicion', 'pos'])
     def cmd_pos(message):
-        if not bot_state.in_position:
+        state = bot_state.snapshot
+        if not state.in_position:
             bot.reply_to(message, "😴 <b>Sin posiciones abiertas.</b>\nEl bot está buscando oportunidades...", parse_mode="HTML")
             return
 
-        emoji = "🟢" if bot_state.pos_type == "LONG" else "🔴"
-        pnl_raw = bot_state.current_pnl_pct * 100
+        emoji = "🟢" if state.pos_type == "LONG" else "🔴"
+        pnl_raw = state.current_pnl_pct * 100
         
         msg = (
             f"{emoji} <b>POSICIÓN ACTIVA</b>\n"
             f"━━━━━━━━━━━━━━\n"
-            f"Tipo: <b>{bot_state.pos_type}</b> ({settings.SYMBOL})\n"
-            f"Entrada: <code>${bot_state.entry_price:,.4f}</code>\n"
-            f"Actual: <code>${bot_state.last_price:,.4f}</code>\n"
+            f"Tipo: <b>{state.pos_type}</b> ({settings.SYMBOL})\n"
+            f"Entrada: <code>${state.entry_price:,.4f}</code>\n"
+            f"Actual: <code>${state.last_price:,.4f}</code>\n"
             f"PnL: <b>{pnl_raw:.2f}%</b>"
         )
         bot.reply_to(message, msg, parse_mode="HTML")
@@ -91,9 +99,10 @@ def start_telegram_listener():
     # COMANDO: /scan
     @bot.message_handler(commands=['analizar', 'scan'])
     def cmd_scan(message):
+        state = bot_state.snapshot
         # Interpretación visual rápida
-        rsi = bot_state.rsi
-        adx = bot_state.adx
+        rsi = state.rsi
+        adx = state.adx
         
         rsi_status = "Sobreventa" if rsi < 35 else "Sobrecompra" if rsi > 65 else "Neutral"
         adx_status = "Tendencia Fuerte" if adx > 25 else "Rango / Débil"
@@ -104,11 +113,16 @@ def start_telegram_listener():
             f"📊 <b>Indicadores:</b>\n"
             f"• RSI: <code>{rsi:.1f}</code> ({rsi_status})\n"
             f"• ADX: <code>{adx:.1f}</code> ({adx_status})\n"
-            f"• Precio: <code>{bot_state.last_price}</code>\n\n"
-            f"<i>Estrategia: {bot_state.strategy_name}</i>"
+            f"• Precio: <code>{state.last_price}</code>\n\n"
+            f"<i>Estrategia: {state.strategy_name}</i>"
         )
         bot.reply_to(message, msg, parse_mode="HTML")
 
+    # COMANDO: /perf
+    @bot.message_handler(commands=['perf', 'latencia'])
+    def cmd_perf(message):
+        bot.reply_to(message, metrics.report(), parse_mode="HTML")
+
     # COMANDO: /stop
     @bot.message_handler(commands=['stop'])
     def cmd_stop(message):